@@ -0,0 +1,101 @@
+"""
+Startup time benchmark for the UVSim CLI and a headless batch worker.
+
+Run with: python startup_benchmark.py [--runs N]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+current_dir = os.path.dirname(__file__)
+src_dir = os.path.abspath(os.path.join(current_dir, '../src'))
+
+# A program that halts immediately so only startup cost is measured
+HALT_PROGRAM = "+4300\n"
+
+# Imports the core engine and runs one program, the way a batch worker starts up
+WORKER_SCRIPT = """
+import asyncio
+import sys
+sys.path.insert(0, {src_dir!r})
+from cpu import CPU
+from input_handler import CLIInputHandler
+from memory import Memory
+
+memory = Memory(250)
+memory.load_program(["+4300"])
+cpu = CPU(memory, CLIInputHandler(), output_callback=lambda message: None)
+
+async def run():
+    while cpu.program_counter < memory.max_size:
+        await cpu.execute_instruction()
+
+asyncio.run(run())
+if "kivy" in sys.modules:
+    raise SystemExit("kivy was imported by the core engine")
+"""
+
+
+def time_command(command, stdin_text, runs):
+    """
+    Runs a command several times in a fresh interpreter and times each run.
+
+    Args:
+        command (list of str): The command to execute.
+        stdin_text (str): Text piped to the command's standard input.
+        runs (int): How many times to run the command.
+
+    Returns:
+        list of float: The wall time of each run in seconds.
+
+    Raises:
+        RuntimeError: If the command exits with a non-zero status.
+    """
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        completed = subprocess.run(command, input=stdin_text, capture_output=True, text=True, cwd=src_dir)
+        timings.append(time.perf_counter() - start)
+        if completed.returncode != 0:
+            raise RuntimeError(f"{' '.join(command)} failed: {completed.stderr.strip()}")
+    return timings
+
+
+def report(name, timings):
+    """
+    Prints the min, median and max of a list of timings in milliseconds.
+
+    Args:
+        name (str): The label for this benchmark.
+        timings (list of float): Timings in seconds.
+    """
+    print(f"{name:<28} min {min(timings) * 1000:8.1f} ms   "
+          f"median {statistics.median(timings) * 1000:8.1f} ms   "
+          f"max {max(timings) * 1000:8.1f} ms")
+
+
+def main():
+    """
+    Times the bare interpreter, `python UVSim.py` and a batch worker cold start.
+    """
+    parser = argparse.ArgumentParser(description="Measure UVSim startup time.")
+    parser.add_argument("--runs", type=int, default=10, help="number of runs per benchmark")
+    args = parser.parse_args()
+
+    with tempfile.NamedTemporaryFile('w', suffix=".txt", delete=False) as program_file:
+        program_file.write(HALT_PROGRAM)
+    try:
+        report("python (baseline)", time_command([sys.executable, "-c", "pass"], "", args.runs))
+        report("python UVSim.py", time_command([sys.executable, "UVSim.py"], program_file.name + "\n", args.runs))
+        report("batch worker cold start",
+               time_command([sys.executable, "-c", WORKER_SCRIPT.format(src_dir=src_dir)], "", args.runs))
+    finally:
+        os.remove(program_file.name)
+
+
+if __name__ == "__main__":
+    main()
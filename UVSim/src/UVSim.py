@@ -1,13 +1,45 @@
+import argparse
 import asyncio
+import json
+import sys
+import time
+import tracemalloc
 
+try:
+    import resource
+except ImportError:
+    # Windows has no resource module, so peak memory is only reported with --trace-memory
+    resource = None
+
+from accumulator import OVERFLOW_POLICIES
+from batch_runner import RunResult
+from concurrent_runner import FileInputHandler, ProgramJob, run_concurrently
 from cpu import CPU
-from input_handler import CLIInputHandler
+from events import run_scripted
+from file_io import read_program_file
+from input_handler import CLIInputHandler, ScriptedInputHandler
 from memory import Memory
+from result_cache import ResultCache, make_key
+from simulator import Simulator
+from tracing import enable_from_environment, span
 
 """
 CLI for UVSim
+
+Run with no arguments to be prompted for a program and its inputs. Pass one or more program
+paths to run them without prompts, printing one NDJSON result line per program:
+    python UVSim.py program.txt --inputs 5,7 --max-steps 10000
+With --concurrency, the programs run together on one event loop, and --input-files reads each
+program's inputs from PROGRAM.in (a FIFO is read as data arrives):
+    python UVSim.py a.txt b.txt --concurrency 32 --input-files
+Those results add queue_wait, input_wait and reads (the inputs read); --engine and
+--trace-memory only apply when programs run one at a time. --cache FILE keeps results in a SQLite file and skips programs already run with the same
+inputs, budget and overflow policy. Each result's peak_memory is the process's peak resident set size in bytes. --trace-memory
+reports the peak of Python allocations during that program instead, at a large cost in speed.
 """
 
+ENGINES = ("batch", "events")
+
 async def run_program(cpu):
     """
     Executes a program loaded into the CPU until a halt instruction or error occurs.
@@ -19,15 +51,16 @@ async def run_program(cpu):
         Exception: If an error occurs during program execution, it is caught and printed.
     """
     try:
-        while cpu.program_counter < cpu.memory.max_size:
-            await cpu.execute_instruction()
+        with span("CPU run"):
+            while cpu.program_counter < cpu.memory.max_size:
+                await cpu.execute_instruction()
     except Exception as e:
         print(f"Error during execution: {e}")
 
 
-def main():
+def run_interactive():
     """
-    The main entry point for the program execution.
+    Runs one program, prompting for its path and inputs.
 
     - Prompts the user for a file path containing the program to execute.
     - Loads the program into memory.
@@ -46,8 +79,9 @@ def main():
     file_path = input("Enter the program file path: ")
 
     # Load the program from the specified file
-    with open(file_path, 'r') as file:
-        program = [line.strip() for line in file.readlines()]
+    with span("read program file", path=file_path):
+        with open(file_path, 'r') as file:
+            program = [line.strip() for line in file.readlines()]
 
     if not program:
         print("Failed to load the program. Please check the file and try again.")
@@ -76,5 +110,195 @@ def main():
         print(f"An unexpected error occurred: {e}")
 
 
+def peak_rss():
+    """
+    Returns the peak resident set size of the process so far.
+
+    Returns:
+        int: The peak in bytes, or None where the resource module is not available.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def run_file(path, args, simulator, cache=None):
+    """
+    Runs one program file without prompts and measures the run.
+
+    Args:
+        path (str): The program file.
+        args: The parsed command line options.
+        simulator: A Simulator reused by the batch engine.
+        cache (ResultCache): Results of earlier runs, checked once the program is loaded, or
+            None.
+
+    Returns:
+        dict: The run's result and metrics, ready to print as one NDJSON line. With a cache,
+            "cached" says whether the result came from it.
+    """
+    if args.trace_memory:
+        tracemalloc.reset_peak()
+    start = time.perf_counter()
+    cached = False
+    try:
+        program = read_program_file(path)
+        if args.engine == "batch":
+            simulator.load(program)
+            memory = simulator.memory
+        else:
+            memory = Memory(args.memory_size)
+            memory.load_program(program)
+        key = None if cache is None else make_key(memory, args.inputs, args.max_steps, args.overflow)
+        result = None if key is None else cache.get(key)
+        cached = result is not None
+        if result is None:
+            if args.engine == "batch":
+                result = simulator.run(args.inputs, args.max_steps)
+            else:
+                result = asyncio.run(run_scripted(memory, args.inputs, args.max_steps, args.overflow))
+            if key is not None:
+                cache.put(key, result)
+    except (OSError, ValueError) as e:
+        result = RunResult([], 0, None, str(e))
+    wall_time = time.perf_counter() - start
+    record = {"program": path}
+    record.update(result.to_dict())
+    if cache is not None:
+        record["cached"] = cached
+    peak_memory = tracemalloc.get_traced_memory()[1] if args.trace_memory else peak_rss()
+    record.update({"wall_time": round(wall_time, 6), "peak_memory": peak_memory})
+    return record
+
+
+async def run_files_concurrently(args, write):
+    """
+    Runs every program file together, writing each result as soon as its program finishes.
+
+    Args:
+        args: The parsed command line options.
+        write: A callable given each result record.
+
+    Returns:
+        bool: Whether any program failed to load or ended with an error.
+    """
+    def report(record):
+        # The same peak_memory as run_file reports, so both modes share one record schema
+        record["peak_memory"] = peak_rss()
+        write(record)
+
+    failed = False
+    jobs = []
+    for path in args.programs:
+        try:
+            program = read_program_file(path)
+        except (OSError, ValueError) as e:
+            failed = True
+            record = {"program": path}
+            record.update(RunResult([], 0, None, str(e)).to_dict())
+            record.update({"queue_wait": 0.0, "wall_time": 0.0, "input_wait": 0.0, "reads": 0})
+            report(record)
+            continue
+        if args.input_files:
+            input_handler = FileInputHandler(path + ".in")
+        else:
+            input_handler = ScriptedInputHandler(args.inputs)
+        jobs.append(ProgramJob(path, program, input_handler, args.max_steps))
+    records = await run_concurrently(jobs, args.concurrency, args.memory_size, args.overflow, report)
+    return failed or any(record["error"] is not None for record in records)
+
+
+def parse_arguments(argv):
+    """
+    Parses the command line.
+
+    Args:
+        argv (list of str): The arguments after the script name.
+
+    Returns:
+        The parsed options, with `inputs` converted to a list of strings.
+    """
+    parser = argparse.ArgumentParser(description="Run BasicML programs. With no programs, prompts interactively.")
+    parser.add_argument("programs", nargs="*", help="program files to run without prompts")
+    parser.add_argument("--inputs", default="", help="comma separated READ inputs, used for every program")
+    parser.add_argument("--max-steps", type=int, help="the most instructions each program may execute")
+    parser.add_argument("--engine", choices=ENGINES,
+                        help="batch (the default) reuses one simulator; events runs on the event iterator")
+    parser.add_argument("--memory-size", type=int, default=250, help="words of memory, defaults to 250")
+    parser.add_argument("--overflow", choices=OVERFLOW_POLICIES, default="wrap",
+                        help="how out of range arithmetic is handled")
+    parser.add_argument("--concurrency", type=int,
+                        help="run the programs together on one event loop, at most this many at once")
+    parser.add_argument("--input-files", action="store_true",
+                        help="read each program's inputs from PROGRAM.in, one per line; implies --concurrency 64")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="report each program's peak Python allocations instead of the process's peak RSS; slow")
+    parser.add_argument("--cache", metavar="FILE",
+                        help="a SQLite file of earlier results; programs already run with the same inputs are not run again")
+    args = parser.parse_args(argv)
+    args.inputs = [value.strip() for value in args.inputs.split(",") if value.strip()]
+    if args.input_files and args.concurrency is None:
+        args.concurrency = 64
+    if args.concurrency is not None:
+        # Concurrent runs share one event loop and batch CPUs, so these options cannot apply
+        if args.engine is not None:
+            parser.error("--engine cannot be used with --concurrency or --input-files")
+        if args.trace_memory:
+            parser.error("--trace-memory cannot be used with --concurrency or --input-files")
+        if args.cache is not None:
+            parser.error("--cache cannot be used with --concurrency or --input-files")
+    if args.input_files and args.inputs:
+        parser.error("--inputs cannot be used with --input-files")
+    if args.engine is None:
+        args.engine = "batch"
+    return args
+
+
+def main(argv=None):
+    """
+    The main entry point: prompts for a program when given none, otherwise runs each program
+    given and prints its result and metrics (steps, cycles, wall time, peak memory) as NDJSON.
+
+    Args:
+        argv (list of str): The arguments after the script name, defaults to sys.argv.
+
+    Returns:
+        int: 0 if every program ran without error, otherwise 1.
+    """
+    enable_from_environment()
+    args = parse_arguments(sys.argv[1:] if argv is None else argv)
+    if not args.programs:
+        run_interactive()
+        return 0
+
+    def write(record):
+        sys.stdout.write(json.dumps(record) + "\n")
+        sys.stdout.flush()
+
+    if args.concurrency is not None:
+        failed = asyncio.run(run_files_concurrently(args, write))
+        return 1 if failed else 0
+
+    simulator = Simulator(args.memory_size, args.overflow)
+    cache = None if args.cache is None else ResultCache(path=args.cache)
+    failed = False
+    if args.trace_memory:
+        tracemalloc.start()
+    try:
+        for path in args.programs:
+            record = run_file(path, args, simulator, cache)
+            failed = failed or record["error"] is not None
+            write(record)
+    finally:
+        if args.trace_memory:
+            tracemalloc.stop()
+        simulator.close()
+        if cache is not None:
+            cache.close()
+    return 1 if failed else 0
+
+
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -1,21 +1,81 @@
 """
 Accumulator Module
 """
+# Words are signed 6 digit integers
+WORD_MAX = 999999
+WORD_MIN = -WORD_MAX
+WORD_MODULUS = WORD_MAX + 1
+
+OVERFLOW_POLICIES = ("wrap", "saturate", "trap")
+
+
+def fit_word(value, overflow_policy="wrap"):
+    """
+    Fits an integer into a signed 6 digit word according to an overflow policy.
+
+    Args:
+        value (int): The value to fit.
+        overflow_policy (str): "wrap" keeps the low 6 digits and the sign, "saturate" clamps
+            to the largest word of the same sign, and "trap" raises an error.
+
+    Returns:
+        int: The value as a signed 6 digit word.
+
+    Raises:
+        OverflowError: If the value does not fit and the policy is "trap".
+    """
+    if WORD_MIN <= value <= WORD_MAX:
+        return value
+    if overflow_policy == "wrap":
+        magnitude = abs(value) % WORD_MODULUS
+        return magnitude if value > 0 else -magnitude
+    if overflow_policy == "saturate":
+        return WORD_MAX if value > 0 else WORD_MIN
+    raise OverflowError(f"Value '{value}' does not fit in a 6 digit word")
+
+
 class Accumulator:
     """
     Represents the accumulator in a machine code simulator.
 
     The accumulator is used to store the current working value during program execution
-    and perform basic arithmetic operations.
+    and perform basic arithmetic operations. Every result is kept as a signed 6 digit
+    integer, with out of range results handled by the overflow policy.
 
     Attributes:
     value (int): The current value stored in the accumulator.
+    overflow_policy (str): One of "wrap", "saturate" or "trap".
     """
-    def __init__(self):
+    __slots__ = ("value", "overflow_policy")
+
+    def __init__(self, overflow_policy="wrap"):
         """
         Initializes the accumulator with a default value of 0.
+
+        Args:
+            overflow_policy (str): How out of range results are handled, defaults to "wrap".
+
+        Raises:
+            ValueError: If the overflow policy is not recognised.
         """
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Invalid overflow policy '{overflow_policy}', expected one of {', '.join(OVERFLOW_POLICIES)}")
         self.value = 0
+        self.overflow_policy = overflow_policy
+
+    def fit(self, value):
+        """
+        Fits a value into a word using this accumulator's overflow policy.
+
+        Args:
+            value (int): The value to fit.
+
+        Returns:
+            int: The value as a signed 6 digit word.
+        """
+        if WORD_MIN <= value <= WORD_MAX:
+            return value
+        return fit_word(value, self.overflow_policy)
 
     def add(self, value):
         """
@@ -24,7 +84,7 @@ class Accumulator:
         Args:
             value (int): The value to add to the accumulator.
         """
-        self.value += value
+        self.value = self.fit(self.value + value)
 
     def subtract(self, value):
         """
@@ -33,4 +93,28 @@ class Accumulator:
         Args:
             value (int): The value to subtract from the accumulator.
         """
-        self.value -= value
+        self.value = self.fit(self.value - value)
+
+    def multiply(self, value):
+        """
+        Multiplies the accumulator's current value by a value.
+
+        Args:
+            value (int): The value to multiply the accumulator by.
+        """
+        self.value = self.fit(self.value * value)
+
+    def divide(self, value):
+        """
+        Divides the accumulator's current value by a value, truncating toward zero.
+
+        Args:
+            value (int): The divisor.
+
+        Raises:
+            ValueError: If the divisor is zero.
+        """
+        if value == 0:
+            raise ValueError("Cannot divide by zero")
+        quotient = abs(self.value) // abs(value)
+        self.value = quotient if (self.value < 0) == (value < 0) else -quotient
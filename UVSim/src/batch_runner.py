@@ -0,0 +1,164 @@
+"""
+Headless execution of BasicML programs for batch jobs such as grading
+"""
+import asyncio
+import hashlib
+
+from cpu import CPU
+from input_handler import ScriptedInputHandler
+
+
+class BatchCPU(CPU):
+    """
+    A CPU that records WRITE values as integers instead of formatting output messages.
+
+    Attributes:
+        outputs (list of int): The values written by the program, in order.
+    """
+    __slots__ = ("outputs",)
+
+    def __init__(self, memory, input_handler, overflow_policy="wrap"):
+        """
+        Initializes the CPU with no output callback.
+
+        Args:
+            memory: The memory object holding the loaded program.
+            input_handler: An object for handling input asynchronously.
+            overflow_policy: How arithmetic results outside a 6 digit word are handled.
+        """
+        super().__init__(memory, input_handler, output_callback=self._discard_message,
+                         overflow_policy=overflow_policy)
+        self.outputs = []
+
+    @staticmethod
+    def _discard_message(message):
+        """
+        Ignores status messages such as "Awaiting user input...".
+
+        Args:
+            message (str): The message to ignore.
+        """
+
+    def handle_write(self, address):
+        """
+        Records the value stored at a specific memory address.
+
+        Args:
+            address: The memory address to read the value from.
+        """
+        self.outputs.append(self.memory.get_value(address))
+
+
+class RunResult:
+    """
+    The outcome of running a program to completion.
+
+    Attributes:
+        outputs (list of int): The values written by the program, in order.
+        steps (int): The number of instructions executed.
+        state_hash (str): A hash of the final memory, accumulator and program counter.
+        error (str): The error that stopped the program, or None if it halted normally.
+        cycles (int): The simulated cycles used, from the CPU's cycle cost model.
+    """
+    def __init__(self, outputs, steps, state_hash, error=None, cycles=0):
+        """
+        Initializes the result.
+
+        Args:
+            outputs (list of int): The values written by the program.
+            steps (int): The number of instructions executed.
+            state_hash (str): A hash of the final machine state.
+            error (str): The error message, defaults to None.
+            cycles (int): The simulated cycles used, defaults to 0.
+        """
+        self.outputs = outputs
+        self.steps = steps
+        self.state_hash = state_hash
+        self.error = error
+        self.cycles = cycles
+
+    def to_dict(self):
+        """
+        Converts the result to a JSON serializable dictionary.
+
+        Returns:
+            dict: The result's attributes.
+        """
+        return {"outputs": self.outputs, "steps": self.steps, "cycles": self.cycles,
+                "state_hash": self.state_hash, "error": self.error}
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Builds a result from a dictionary created by `to_dict`.
+
+        Args:
+            data (dict): The result's attributes.
+
+        Returns:
+            RunResult: The rebuilt result.
+        """
+        return cls(data["outputs"], data["steps"], data["state_hash"], data["error"], data.get("cycles", 0))
+
+    def __eq__(self, other):
+        return isinstance(other, RunResult) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return f"RunResult({self.to_dict()!r})"
+
+
+def state_hash(cpu):
+    """
+    Hashes the machine state so two runs can be compared without keeping all of memory.
+
+    Args:
+        cpu: The CPU whose memory, accumulator and program counter are hashed.
+
+    Returns:
+        str: A hex SHA-256 digest.
+    """
+    words = " ".join(map(str, cpu.memory.memory))
+    state = f"{words}|{cpu.accumulator.value}|{cpu.program_counter}"
+    return hashlib.sha256(state.encode()).hexdigest()
+
+
+async def run_to_completion(cpu, max_steps=None):
+    """
+    Executes instructions until the program halts, runs off the end of memory or errors.
+
+    Args:
+        cpu: The CPU to run. Its `instruction_count` stays accurate even when an error is raised.
+        max_steps (int): The most instructions to execute, or None for no limit.
+
+    Raises:
+        RuntimeError: If the program is still running after `max_steps` instructions.
+    """
+    max_size = cpu.memory.max_size
+    while cpu.program_counter < max_size:
+        if max_steps is not None and cpu.instruction_count >= max_steps:
+            raise RuntimeError(f"Step budget of {max_steps} instructions exceeded")
+        await cpu.execute_instruction()
+
+
+def run_program(memory, inputs=(), max_steps=None, overflow_policy="wrap"):
+    """
+    Runs a program already loaded into memory, feeding it a fixed input sequence.
+
+    Errors raised by the program are captured in the result rather than propagated.
+
+    Args:
+        memory: The memory object holding the loaded program. It is modified by the run.
+        inputs (iterable): The values supplied to READ instructions, in order.
+        max_steps (int): The most instructions to execute, or None for no limit.
+        overflow_policy (str): How arithmetic results outside a 6 digit word are handled.
+
+    Returns:
+        RunResult: The program's outputs, step and cycle counts and final state hash.
+    """
+    cpu = BatchCPU(memory, ScriptedInputHandler(inputs), overflow_policy)
+    error = None
+    try:
+        asyncio.run(run_to_completion(cpu, max_steps))
+    except Exception as e:
+        error = str(e)
+    return RunResult(cpu.outputs, cpu.instruction_count, state_hash(cpu), error, cpu.cycles)
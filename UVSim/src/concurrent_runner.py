@@ -0,0 +1,277 @@
+"""
+Runs many programs on one event loop, so programs waiting for input do not hold up the rest.
+
+Each program gets its own CPU and input handler, usually a StreamInputHandler reading a
+socket or a pipe. At most `concurrency` programs run at once; the others wait their turn.
+A program that never waits for input gives the loop back every SLICE_STEPS instructions,
+so a long computation cannot starve programs whose input has just arrived.
+"""
+import asyncio
+import os
+import stat
+import time
+
+from batch_runner import BatchCPU, RunResult, state_hash
+from input_handler import InputHandler, StreamInputHandler
+from memory import Memory
+
+SLICE_STEPS = 1000
+
+
+class TimedInputHandler(InputHandler):
+    """
+    Wraps an input handler, adding up the time spent waiting for it.
+
+    Attributes:
+        handler (InputHandler): The wrapped handler.
+        wait_time (float): The seconds spent in `get_input` so far.
+        reads (int): The number of inputs returned so far.
+    """
+    def __init__(self, handler):
+        """
+        Initializes the wrapper.
+
+        Args:
+            handler (InputHandler): The handler to time.
+        """
+        self.handler = handler
+        self.wait_time = 0.0
+        self.reads = 0
+
+    async def get_input(self):
+        """
+        Returns the wrapped handler's next input.
+
+        Returns:
+            str: The input.
+        """
+        start = time.perf_counter()
+        try:
+            value = await self.handler.get_input()
+        finally:
+            self.wait_time += time.perf_counter() - start
+        self.reads += 1
+        return value
+
+
+class FileInputHandler(InputHandler):
+    """
+    Reads inputs one per line from a file or FIFO, opened when the program first reads.
+
+    Attributes:
+        path (str): The file to read.
+    """
+    def __init__(self, path):
+        """
+        Initializes the handler without opening the file.
+
+        Args:
+            path (str): The file to read.
+        """
+        self.path = path
+        self._stream = None
+        self._transport = None
+
+    async def get_input(self):
+        """
+        Waits for the next line of the file.
+
+        Returns:
+            str: The line, without surrounding whitespace.
+
+        Raises:
+            OSError: If the file cannot be opened.
+            ValueError: If the file ends before a line arrives.
+        """
+        if self._stream is None:
+            reader, self._transport = await open_input_stream(self.path)
+            self._stream = StreamInputHandler(reader)
+        return await self._stream.get_input()
+
+    def close(self):
+        """
+        Closes the FIFO, if one was opened, so a writer that never came does not keep it open.
+        """
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+
+
+class ProgramJob:
+    """
+    A program to run, with the handler that supplies its inputs.
+
+    Attributes:
+        name (str): The name reported with the program's result, such as its file path.
+        program (list of str): The program's instructions.
+        input_handler (InputHandler): Supplies the program's READ inputs.
+        max_steps (int): The most instructions to execute, or None for no limit.
+    """
+    __slots__ = ("name", "program", "input_handler", "max_steps")
+
+    def __init__(self, name, program, input_handler, max_steps=None):
+        self.name = name
+        self.program = program
+        self.input_handler = input_handler
+        self.max_steps = max_steps
+
+
+async def _run_sliced(cpu, max_steps):
+    """
+    Executes a program to completion, yielding to the event loop every SLICE_STEPS instructions.
+
+    Args:
+        cpu: The CPU to run.
+        max_steps (int): The most instructions to execute, or None for no limit.
+
+    Raises:
+        RuntimeError: If the program is still running after `max_steps` instructions.
+    """
+    max_size = cpu.memory.max_size
+    while cpu.program_counter < max_size:
+        if max_steps is not None and cpu.instruction_count >= max_steps:
+            raise RuntimeError(f"Step budget of {max_steps} instructions exceeded")
+        await cpu.execute_instruction()
+        if cpu.instruction_count % SLICE_STEPS == 0:
+            await asyncio.sleep(0)
+
+
+async def run_job(job, slots, memory_size=250, overflow_policy="wrap"):
+    """
+    Runs one job once a concurrency slot is free, measuring it.
+
+    Args:
+        job (ProgramJob): The job to run.
+        slots (asyncio.Semaphore): Limits how many jobs run at once.
+        memory_size (int): The number of words of memory, defaults to 250.
+        overflow_policy (str): How arithmetic results outside a 6 digit word are handled.
+
+    Returns:
+        dict: The program name, the `RunResult` fields, the seconds spent queued for a slot
+            (queue_wait), running (wall_time) and waiting for input within the run
+            (input_wait), and the number of inputs read (reads).
+    """
+    queued = time.perf_counter()
+    async with slots:
+        start = time.perf_counter()
+        input_handler = TimedInputHandler(job.input_handler)
+        try:
+            memory = Memory(memory_size)
+            memory.load_program(job.program)
+            cpu = BatchCPU(memory, input_handler, overflow_policy)
+        except ValueError as e:
+            result = RunResult([], 0, None, str(e))
+        else:
+            error = None
+            try:
+                await _run_sliced(cpu, job.max_steps)
+            except Exception as e:
+                error = str(e)
+            finally:
+                job.input_handler.close()
+            result = RunResult(cpu.outputs, cpu.instruction_count, state_hash(cpu), error, cpu.cycles)
+        finished = time.perf_counter()
+    record = {"program": job.name}
+    record.update(result.to_dict())
+    record.update({"queue_wait": round(start - queued, 6), "wall_time": round(finished - start, 6),
+                   "input_wait": round(input_handler.wait_time, 6), "reads": input_handler.reads})
+    return record
+
+
+async def run_concurrently(jobs, concurrency=64, memory_size=250, overflow_policy="wrap", on_result=None):
+    """
+    Runs jobs together on the current event loop, at most `concurrency` at a time.
+
+    Args:
+        jobs (list of ProgramJob): The jobs to run.
+        concurrency (int): The most jobs running at once, defaults to 64.
+        memory_size (int): The number of words of memory per job, defaults to 250.
+        overflow_policy (str): How arithmetic results outside a 6 digit word are handled.
+        on_result: A callable given each job's record as soon as the job finishes, or None.
+
+    Returns:
+        list of dict: Each job's record from `run_job`, in job order.
+
+    Raises:
+        ValueError: If `concurrency` is less than 1.
+    """
+    if concurrency < 1:
+        raise ValueError("Concurrency must be at least 1")
+    slots = asyncio.Semaphore(concurrency)
+
+    async def run_and_report(job):
+        record = await run_job(job, slots, memory_size, overflow_policy)
+        if on_result is not None:
+            on_result(record)
+        return record
+
+    return await asyncio.gather(*(run_and_report(job) for job in jobs))
+
+
+class _FifoProtocol(asyncio.StreamReaderProtocol):
+    """
+    Feeds a FIFO's data to a stream, holding a write end open until the first data arrives.
+
+    A FIFO with no writer reads as ended, so without the held write end a program that
+    reads before its writer starts would see the end of its input at once.
+    """
+    def __init__(self, reader, write_fd):
+        super().__init__(reader)
+        self._write_fd = write_fd
+
+    def _release_writer(self):
+        if self._write_fd is not None:
+            os.close(self._write_fd)
+            self._write_fd = None
+
+    def data_received(self, data):
+        # A writer has connected, so let the end of its data end the stream
+        self._release_writer()
+        super().data_received(data)
+
+    def connection_lost(self, exc):
+        self._release_writer()
+        super().connection_lost(exc)
+
+
+async def open_input_stream(path):
+    """
+    Opens a file of inputs, one per line, as an asyncio stream.
+
+    Pipes and FIFOs are opened without waiting for a writer and read as data arrives, so
+    another process can feed a program slowly without blocking the loop or a thread. Regular
+    files are read whole.
+
+    Args:
+        path (str): The file to read.
+
+    Returns:
+        tuple: The `asyncio.StreamReader`, and the transport reading the FIFO, which the
+            caller closes when done, or None for a regular file.
+
+    Raises:
+        OSError: If the file cannot be opened.
+    """
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader()
+    if not stat.S_ISFIFO(os.stat(path).st_mode):
+        with open(path, 'rb') as file:
+            reader.feed_data(file.read())
+        reader.feed_eof()
+        return reader, None
+    read_fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+    try:
+        # Succeeds at once since this process is now a reader
+        write_fd = os.open(path, os.O_WRONLY | os.O_NONBLOCK)
+    except OSError:
+        os.close(read_fd)
+        raise
+    pipe = os.fdopen(read_fd, 'rb', 0)
+    protocol = _FifoProtocol(reader, write_fd)
+    try:
+        transport, _ = await loop.connect_read_pipe(lambda: protocol, pipe)
+    except BaseException:
+        pipe.close()
+        protocol._release_writer()
+        raise
+    return reader, transport
@@ -0,0 +1,136 @@
+"""
+Virtualized output console for the GUI
+"""
+from kivy.clock import Clock
+from kivy.metrics import dp
+from kivy.uix.recycleboxlayout import RecycleBoxLayout
+from kivy.uix.recycleview import RecycleView
+
+from scrollback import ScrollbackBuffer
+from tracing import span
+
+
+class ConsoleView(RecycleView):
+    """
+    Shows console output from a ScrollbackBuffer, creating widgets only for visible lines.
+
+    Writes go into the buffer straight away; the widget catches up once per frame, so a
+    burst of WRITE output causes one update instead of one re-layout per line.
+
+    Attributes:
+        buffer (ScrollbackBuffer): The lines being shown.
+    """
+    def __init__(self, max_lines=5000, spill_path=None, **kwargs):
+        """
+        Initializes the console.
+
+        Args:
+            max_lines (int): The most lines kept, defaults to 5000.
+            spill_path (str): A file to append every line to, defaults to None.
+            **kwargs: Additional arguments passed to the parent RecycleView initializer.
+        """
+        super().__init__(viewclass='Label', **kwargs)
+        self.buffer = ScrollbackBuffer(max_lines, spill_path)
+        self._shown_lines = 0
+        self._sync_trigger = Clock.create_trigger(self._sync)
+
+        layout = RecycleBoxLayout(
+            orientation='vertical',
+            default_size=(None, dp(20)),
+            default_size_hint=(1, None),
+            size_hint_y=None,
+        )
+        layout.bind(minimum_height=layout.setter('height'))
+        self.add_widget(layout)
+
+    def write(self, text):
+        """
+        Appends text to the console.
+
+        Args:
+            text (str): The text to append, which may hold several lines.
+        """
+        self.buffer.append(text)
+        self._sync_trigger()
+
+    def search(self, query):
+        """
+        Scrolls to the next line containing some text, wrapping around to the top.
+
+        Args:
+            query (str): The text to look for.
+
+        Returns:
+            int: The matching line number, or None if no line matches.
+        """
+        matches = self.buffer.search(query)
+        if not matches:
+            return None
+        self._sync()
+        current = self._visible_line()
+        line_number = next((match for match in matches if match > current), matches[0])
+        self.scroll_to_line(line_number)
+        return line_number
+
+    def scroll_to_line(self, line_number):
+        """
+        Scrolls so a line is in view.
+
+        Args:
+            line_number (int): The line to show.
+        """
+        index = line_number - self.buffer.first_line_number
+        if len(self.data) > 1:
+            self.scroll_y = 1 - index / (len(self.data) - 1)
+
+    def clear(self):
+        """
+        Removes every line from the console.
+        """
+        self.buffer.clear()
+        self._shown_lines = 0
+        self.data = []
+
+    def close(self):
+        """
+        Closes the buffer's spill file.
+        """
+        self.buffer.close()
+
+    def _visible_line(self):
+        """
+        Returns the line number at the top of the view.
+
+        Returns:
+            int: The line number.
+        """
+        index = round((1 - self.scroll_y) * max(len(self.data) - 1, 0))
+        return self.buffer.first_line_number + index
+
+    def refresh_views(self, *args):
+        """
+        Lays out the visible lines after the data or size changed, traced as "console layout".
+        """
+        with span("console layout", lines=len(self.data)):
+            super().refresh_views(*args)
+
+    def _sync(self, *args):
+        """
+        Brings the RecycleView data up to date with the buffer.
+        """
+        buffer = self.buffer
+        new_lines = buffer.total_lines - self._shown_lines
+        if new_lines <= 0:
+            return
+        with span("console sync", new_lines=new_lines):
+            at_bottom = self.scroll_y <= 0.01
+            if new_lines >= buffer.max_lines:
+                self.data = [{'text': line} for line in buffer.lines()]
+            else:
+                overflow = len(self.data) + new_lines - buffer.max_lines
+                if overflow > 0:
+                    del self.data[:overflow]
+                self.data.extend([{'text': line} for line in buffer.lines(self._shown_lines)])
+            self._shown_lines = buffer.total_lines
+            if at_bottom:
+                self.scroll_y = 0
@@ -2,6 +2,8 @@
 The CPU class will handle program execution and instruction processing.
 """
 from accumulator import Accumulator
+from cycle_model import build_cost_table
+from tracing import span
 
 
 class CPU:
@@ -15,9 +17,14 @@ class CPU:
         instruction_register: Stores the current instruction being processed.
         input_handler: Handles asynchronous input from the user or system.
         output_callback: A callback function for handling output messages.
+        cycle_costs: A tuple giving the simulated cycle cost of each opcode.
+        instruction_count: The number of instructions executed.
+        cycles: The number of simulated cycles used.
     """
+    __slots__ = ("memory", "accumulator", "program_counter", "instruction_register", "input_handler",
+                 "output_callback", "cycle_costs", "instruction_count", "cycles")
 
-    def __init__(self, memory, input_handler, output_callback=None):
+    def __init__(self, memory, input_handler, output_callback=None, overflow_policy="wrap", cycle_costs=None):
         """
         Initializes the CPU with memory, input handler, and optional output callback.
 
@@ -25,13 +32,30 @@ class CPU:
             memory: An object for storing and retrieving memory values.
             input_handler: An object for handling user input asynchronously.
             output_callback: A callable for outputting messages, defaults to None.
+            overflow_policy: How arithmetic results outside a 6 digit word are handled,
+                one of "wrap", "saturate" or "trap". Defaults to "wrap".
+            cycle_costs: A dict of opcode (or opcode name) to cycle cost, overriding the
+                defaults in `cycle_model.DEFAULT_CYCLE_COSTS`. Defaults to None.
         """
         self.memory = memory
-        self.accumulator = Accumulator()
+        self.accumulator = Accumulator(overflow_policy)
         self.program_counter = 0
         self.instruction_register = None
         self.input_handler = input_handler
         self.output_callback = output_callback
+        self.cycle_costs = build_cost_table(cycle_costs)
+        self.instruction_count = 0
+        self.cycles = 0
+
+    def reset(self):
+        """
+        Returns the CPU to its starting state without touching memory.
+        """
+        self.accumulator.value = 0
+        self.program_counter = 0
+        self.instruction_register = None
+        self.instruction_count = 0
+        self.cycles = 0
 
     async def handle_read(self, address):
         """
@@ -42,14 +66,16 @@ class CPU:
 
         Raises:
             ValueError: If the input cannot be converted to an integer.
+            OverflowError: If the input does not fit in a word and the overflow policy is "trap".
         """
         self.output_callback("Awaiting user input...")
-        input_value = await self.input_handler.get_input()
+        with span("READ wait", address=address):
+            input_value = await self.input_handler.get_input()
         try:
             int_value = int(input_value)
         except ValueError:
             raise ValueError(f"Invalid input '{input_value}', expected an integer.")
-        self.memory.set_value(address, int_value)
+        self.memory.set_value(address, self.accumulator.fit(int_value))
 
     def handle_write(self, address):
         """
@@ -104,13 +130,16 @@ class CPU:
 
     def handle_divide(self, address):
         """
-        Divides the accumulator value by a value from memory.
+        Divides the accumulator value by a value from memory, truncating toward zero.
 
         Args:
             address: The memory address to retrieve the divisor from.
+
+        Raises:
+            ValueError: If the divisor is zero.
         """
         value = self.memory.get_value(address)
-        self.accumulator.value = self.accumulator.value / value
+        self.accumulator.divide(value)
 
     def handle_multiply(self, address):
         """
@@ -120,7 +149,7 @@ class CPU:
             address: The memory address to retrieve the multiplier from.
         """
         value = self.memory.get_value(address)
-        self.accumulator.value = self.accumulator.value * value
+        self.accumulator.multiply(value)
 
     def handle_branch(self, address):
         """
@@ -162,14 +191,29 @@ class CPU:
         self.program_counter = self.memory.max_size
         self.output_callback("Program finished")
 
+    def execute_extended(self, opcode, operand):
+        """
+        Executes an opcode outside the base instruction set. Subclasses that add opcodes
+        override this and move the program counter themselves.
+
+        Args:
+            opcode (int): The opcode.
+            operand (int): The operand address.
+
+        Raises:
+            ValueError: Always, since the base CPU has no extra opcodes.
+        """
+        raise ValueError("Invalid Instruction, please edit")
+
     async def execute_instruction(self):
         """
         Fetches, decodes, and executes the current instruction.
 
         Raises:
             ValueError: If the instruction is invalid or the operand address is out of range.
+            OverflowError: If a result does not fit in a word and the overflow policy is "trap".
         """
-        self.instruction_register = self.memory.get_value(self.program_counter)
+        self.instruction_register = self.memory.fetch(self.program_counter)
         opcode = self.instruction_register // 1000
         operand = self.instruction_register % 1000
         if operand >= 250:
@@ -194,16 +238,15 @@ class CPU:
                 self.handle_multiply(operand)
             case 40:
                 self.handle_branch(operand)
-                return
             case 41:
                 self.handle_branch_neg(operand)
-                return
             case 42:
                 self.handle_branch_zero(operand)
-                return
             case 43:
                 self.handle_halt()
-                return
             case _:
-                raise ValueError("Invalid Instruction, please edit")
-        self.program_counter += 1  # Move to the next instruction
+                self.execute_extended(opcode, operand)
+        self.instruction_count += 1
+        self.cycles += self.cycle_costs[opcode]
+        if opcode < 40:
+            self.program_counter += 1  # Move to the next instruction; branches and halt set it themselves
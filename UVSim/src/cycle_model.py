@@ -0,0 +1,177 @@
+"""
+Per-opcode cycle costs and simulated time reports.
+
+Cycle counts depend only on the program and its inputs, never on the host machine, so
+they can be used to grade efficiency and compare program variants.
+"""
+
+OPCODE_NAMES = {
+    10: "READ",
+    11: "WRITE",
+    20: "LOAD",
+    21: "STORE",
+    30: "ADD",
+    31: "SUBTRACT",
+    32: "DIVIDE",
+    33: "MULTIPLY",
+    40: "BRANCH",
+    41: "BRANCHNEG",
+    42: "BRANCHZERO",
+    43: "HALT",
+}
+
+DEFAULT_CYCLE_COSTS = {
+    10: 10,
+    11: 10,
+    20: 1,
+    21: 1,
+    30: 1,
+    31: 1,
+    32: 20,
+    33: 8,
+    40: 2,
+    41: 2,
+    42: 2,
+    43: 1,
+}
+
+OPCODE_COUNT = 100
+
+
+def build_cost_table(costs=None):
+    """
+    Builds a table indexed by opcode, so the CPU can look costs up without a dictionary.
+
+    Every CPU using the default costs shares one table.
+
+    Args:
+        costs (dict): Maps opcodes or opcode names to cycle costs. Opcodes not given keep
+            their default cost.
+
+    Returns:
+        tuple of int: The cost of each opcode from 0 to 99.
+
+    Raises:
+        ValueError: If an opcode or name is unknown or a cost is negative.
+    """
+    if not costs:
+        return _DEFAULT_COST_TABLE
+    merged = dict(DEFAULT_CYCLE_COSTS)
+    codes_by_name = {name: code for code, name in OPCODE_NAMES.items()}
+    for key, cost in costs.items():
+        code = codes_by_name.get(str(key).upper(), key)
+        if code not in OPCODE_NAMES:
+            raise ValueError(f"Unknown opcode '{key}'")
+        if not isinstance(cost, int) or cost < 0:
+            raise ValueError(f"Cycle cost for '{key}' must be a non-negative integer")
+        merged[code] = cost
+    return _table_from(merged)
+
+
+def _table_from(costs):
+    """
+    Lays out a dict of opcode to cost as a tuple indexed by opcode.
+
+    Args:
+        costs (dict): Maps opcodes to cycle costs.
+
+    Returns:
+        tuple of int: The cost of each opcode from 0 to 99.
+    """
+    table = [0] * OPCODE_COUNT
+    for code, cost in costs.items():
+        table[code] = cost
+    return tuple(table)
+
+
+_DEFAULT_COST_TABLE = _table_from(DEFAULT_CYCLE_COSTS)
+
+
+class CycleReport:
+    """
+    Runs a CPU to completion while breaking its simulated cycles down by opcode and by PC.
+
+    Attributes:
+        cpu: The CPU to run, with a program loaded.
+        instructions_by_pc (list of int): Instructions executed at each address.
+        cycles_by_pc (list of int): Cycles spent at each address.
+        instructions_by_opcode (list of int): Instructions executed per opcode.
+        cycles_by_opcode (list of int): Cycles spent per opcode.
+        opcode_names (dict): Maps opcodes to the names used in the summaries.
+    """
+    def __init__(self, cpu, opcode_names=None):
+        """
+        Initializes empty counters sized to the CPU's memory.
+
+        Args:
+            cpu: The CPU to run.
+            opcode_names (dict, optional): Names for opcodes the CPU adds, such as the
+                synchronization opcodes of a SharedCPU.
+        """
+        self.cpu = cpu
+        self.opcode_names = {**OPCODE_NAMES, **(opcode_names or {})}
+        size = cpu.memory.max_size
+        self.instructions_by_pc = [0] * size
+        self.cycles_by_pc = [0] * size
+        self.instructions_by_opcode = [0] * OPCODE_COUNT
+        self.cycles_by_opcode = [0] * OPCODE_COUNT
+
+    async def run(self):
+        """
+        Executes the program until it halts, attributing each instruction's cycles.
+        """
+        cpu = self.cpu
+        max_size = cpu.memory.max_size
+        costs = cpu.cycle_costs
+        while cpu.program_counter < max_size:
+            address = cpu.program_counter
+            await cpu.execute_instruction()
+            opcode = cpu.instruction_register // 1000
+            cost = costs[opcode]
+            self.instructions_by_pc[address] += 1
+            self.cycles_by_pc[address] += cost
+            self.instructions_by_opcode[opcode] += 1
+            self.cycles_by_opcode[opcode] += cost
+
+    def by_opcode(self):
+        """
+        Summarizes the run per opcode.
+
+        Every opcode that ran is listed, so the cycles add up to the CPU's total. Opcodes
+        without a name are listed as "OPCODE nn".
+
+        Returns:
+            dict: Maps opcode names to {"instructions": n, "cycles": n}, for opcodes that ran.
+        """
+        return {self.opcode_names.get(code, f"OPCODE {code}"): {"instructions": count,
+                                                                "cycles": self.cycles_by_opcode[code]}
+                for code, count in enumerate(self.instructions_by_opcode) if count}
+
+    def by_pc(self):
+        """
+        Summarizes the run per address.
+
+        Returns:
+            dict: Maps addresses to {"instructions": n, "cycles": n}, for addresses that ran.
+        """
+        return {address: {"instructions": count, "cycles": self.cycles_by_pc[address]}
+                for address, count in enumerate(self.instructions_by_pc) if count}
+
+    def format(self):
+        """
+        Formats the breakdowns as a text report.
+
+        Returns:
+            str: A table per opcode followed by a table per address.
+        """
+        total = self.cpu.cycles or 1
+        lines = [f"{self.cpu.instruction_count} instructions, {self.cpu.cycles} cycles", "",
+                 f"{'opcode':<12}{'instructions':>14}{'cycles':>10}{'share':>9}"]
+        for name, counts in self.by_opcode().items():
+            lines.append(f"{name:<12}{counts['instructions']:>14}{counts['cycles']:>10}"
+                         f"{100 * counts['cycles'] / total:>8.1f}%")
+        lines += ["", f"{'address':<12}{'instructions':>14}{'cycles':>10}{'share':>9}"]
+        for address, counts in self.by_pc().items():
+            lines.append(f"{address:<12}{counts['instructions']:>14}{counts['cycles']:>10}"
+                         f"{100 * counts['cycles'] / total:>8.1f}%")
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,342 @@
+"""
+Breakpoints, watchpoints and step/continue control for a CPU, usable from the CLI or GUI.
+
+Nothing is checked while no breakpoints or watchpoints are set: `continue_execution` runs
+the plain fetch/execute loop, and memory is only wrapped while watchpoints exist.
+
+Run this file with a program path to debug it from the command line.
+"""
+import asyncio
+import sys
+
+WATCH_KINDS = ("read", "write", "access")
+
+
+class StopEvent:
+    """
+    Describes why execution stopped.
+
+    Attributes:
+        reason (str): "breakpoint", "read", "write", "step" or "halt".
+        program_counter (int): The program counter when execution stopped.
+        address (int): The breakpoint or watched address involved, or None.
+    """
+    def __init__(self, reason, program_counter, address=None):
+        self.reason = reason
+        self.program_counter = program_counter
+        self.address = address
+
+    def __repr__(self):
+        return f"StopEvent({self.reason!r}, program_counter={self.program_counter}, address={self.address})"
+
+
+class WatchedMemory:
+    """
+    Wraps a Memory object and reports reads and writes of watched addresses.
+
+    Only installed on the CPU while at least one watchpoint exists.
+
+    Attributes:
+        inner: The wrapped Memory object.
+        debugger (Debugger): The debugger that owns the watchpoints.
+    """
+    def __init__(self, inner, debugger):
+        self.inner = inner
+        self.debugger = debugger
+
+    @property
+    def max_size(self):
+        return self.inner.max_size
+
+    @property
+    def memory(self):
+        return self.inner.memory
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+    def get_value(self, address):
+        """
+        Reads a word, recording a hit if the address has a read watchpoint.
+
+        Args:
+            address (int): The address to read.
+
+        Returns:
+            int: The value stored at the address.
+        """
+        if address in self.debugger.read_watchpoints:
+            self.debugger.record_hit("read", address)
+        return self.inner.get_value(address)
+
+    def fetch(self, address):
+        """
+        Fetches an instruction word, which is not a data read and never hits a watchpoint.
+
+        Args:
+            address (int): The address of the instruction.
+
+        Returns:
+            int: The word stored at the address.
+        """
+        return self.inner.fetch(address)
+
+    def set_value(self, address, value):
+        """
+        Writes a word, recording a hit if the address has a write watchpoint.
+
+        Args:
+            address (int): The address to write.
+            value (int): The value to store.
+        """
+        if address in self.debugger.write_watchpoints:
+            self.debugger.record_hit("write", address)
+        self.inner.set_value(address, value)
+
+
+class Debugger:
+    """
+    Controls a CPU one instruction at a time or until a breakpoint or watchpoint is hit.
+
+    Attributes:
+        cpu: The CPU being debugged.
+        breakpoints (set of int): Program counter values to stop at before executing.
+        read_watchpoints (set of int): Addresses whose data reads stop execution.
+        write_watchpoints (set of int): Addresses whose writes stop execution.
+    """
+    def __init__(self, cpu):
+        """
+        Initializes the debugger with no breakpoints or watchpoints.
+
+        Args:
+            cpu: The CPU to debug.
+        """
+        self.cpu = cpu
+        self.breakpoints = set()
+        self.read_watchpoints = set()
+        self.write_watchpoints = set()
+        self._hits = []
+        self._watched_memory = None
+
+    def add_breakpoint(self, address):
+        """
+        Stops execution before the instruction at an address runs.
+
+        Args:
+            address (int): The instruction address.
+
+        Raises:
+            ValueError: If the address is outside memory.
+        """
+        self._check_address(address)
+        self.breakpoints.add(address)
+
+    def remove_breakpoint(self, address):
+        """
+        Removes a breakpoint, if one is set.
+
+        Args:
+            address (int): The instruction address.
+        """
+        self.breakpoints.discard(address)
+
+    def add_watchpoint(self, address, kind="write"):
+        """
+        Stops execution after an instruction reads or writes an address.
+
+        Args:
+            address (int): The data address to watch.
+            kind (str): "read", "write" or "access" (both), defaults to "write".
+
+        Raises:
+            ValueError: If the address is outside memory or the kind is not recognised.
+        """
+        self._check_address(address)
+        if kind not in WATCH_KINDS:
+            raise ValueError(f"Invalid watchpoint kind '{kind}', expected one of {', '.join(WATCH_KINDS)}")
+        if kind in ("read", "access"):
+            self.read_watchpoints.add(address)
+        if kind in ("write", "access"):
+            self.write_watchpoints.add(address)
+        self._update_memory_wrapper()
+
+    def remove_watchpoint(self, address):
+        """
+        Removes read and write watchpoints on an address, if any are set.
+
+        Args:
+            address (int): The data address.
+        """
+        self.read_watchpoints.discard(address)
+        self.write_watchpoints.discard(address)
+        self._update_memory_wrapper()
+
+    def record_hit(self, kind, address):
+        """
+        Notes that a watched address was accessed, called by WatchedMemory.
+
+        Args:
+            kind (str): "read" or "write".
+            address (int): The address accessed.
+        """
+        self._hits.append((kind, address))
+
+    def is_halted(self):
+        """
+        Returns whether the program has halted or run off the end of memory.
+
+        Returns:
+            bool: True if no more instructions will run.
+        """
+        return self.cpu.program_counter >= self.cpu.memory.max_size
+
+    async def step(self):
+        """
+        Executes exactly one instruction, ignoring breakpoints.
+
+        Returns:
+            StopEvent: A watchpoint event if one was hit, otherwise a "step" or "halt" event.
+        """
+        if self.is_halted():
+            return StopEvent("halt", self.cpu.program_counter)
+        watched = self._watched_memory
+        await self.cpu.execute_instruction()
+        if watched is not None and self._hits:
+            kind, address = self._hits[0]
+            self._hits.clear()
+            return StopEvent(kind, self.cpu.program_counter, address)
+        if self.is_halted():
+            return StopEvent("halt", self.cpu.program_counter)
+        return StopEvent("step", self.cpu.program_counter)
+
+    async def continue_execution(self):
+        """
+        Runs until a breakpoint or watchpoint is hit or the program halts.
+
+        The instruction at the current program counter always runs, so continuing from a
+        breakpoint moves past it.
+
+        Returns:
+            StopEvent: Why execution stopped.
+        """
+        cpu = self.cpu
+        max_size = cpu.memory.max_size
+        if not self.breakpoints and self._watched_memory is None:
+            # Nothing to check for, so run the plain fetch/execute loop
+            while cpu.program_counter < max_size:
+                await cpu.execute_instruction()
+            return StopEvent("halt", cpu.program_counter)
+
+        breakpoints = self.breakpoints
+        event = await self.step()
+        while event.reason == "step":
+            if cpu.program_counter in breakpoints:
+                return StopEvent("breakpoint", cpu.program_counter, cpu.program_counter)
+            event = await self.step()
+        return event
+
+    def _update_memory_wrapper(self):
+        """
+        Installs the WatchedMemory wrapper while watchpoints exist and removes it otherwise.
+        """
+        watching = bool(self.read_watchpoints or self.write_watchpoints)
+        if watching and self._watched_memory is None:
+            self._watched_memory = WatchedMemory(self.cpu.memory, self)
+            self.cpu.memory = self._watched_memory
+        elif not watching and self._watched_memory is not None:
+            self.cpu.memory = self._watched_memory.inner
+            self._watched_memory = None
+            self._hits.clear()
+
+    def _check_address(self, address):
+        """
+        Validates an address.
+
+        Args:
+            address (int): The address to check.
+
+        Raises:
+            ValueError: If the address is outside memory.
+        """
+        if not 0 <= address < self.cpu.memory.max_size:
+            raise ValueError(f"Invalid address '{address}'. expected an address between 0 and {self.cpu.memory.max_size - 1}")
+
+
+DEBUGGER_HELP = """Commands:
+  b ADDR    set a breakpoint        rb ADDR   remove a breakpoint
+  w ADDR    watch writes            r ADDR    watch reads
+  a ADDR    watch reads and writes  rw ADDR   remove a watchpoint
+  s         step one instruction    c         continue
+  p         print registers         m ADDR    print a memory word
+  q         quit"""
+
+
+async def run_debugger_cli(debugger, read_command=input):
+    """
+    Runs an interactive debugging session on the command line.
+
+    Args:
+        debugger (Debugger): The debugger wrapping a CPU with a loaded program.
+        read_command: A callable returning the next command line, defaults to `input`.
+    """
+    cpu = debugger.cpu
+    commands = {"b": debugger.add_breakpoint, "rb": debugger.remove_breakpoint,
+                "w": lambda address: debugger.add_watchpoint(address, "write"),
+                "r": lambda address: debugger.add_watchpoint(address, "read"),
+                "a": lambda address: debugger.add_watchpoint(address, "access"),
+                "rw": debugger.remove_watchpoint,
+                "m": lambda address: print(f"[{address:03}] {cpu.memory.get_value(address)}")}
+    print(DEBUGGER_HELP)
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            parts = (await loop.run_in_executor(None, read_command, "(debug) ")).split()
+        except EOFError:
+            return
+        if not parts:
+            continue
+        try:
+            if parts[0] == "q":
+                return
+            elif parts[0] in ("s", "c"):
+                event = await (debugger.step() if parts[0] == "s" else debugger.continue_execution())
+                print(f"Stopped: {event.reason} at PC {event.program_counter:03}"
+                      + (f" (address {event.address:03})" if event.address is not None else ""))
+            elif parts[0] == "p":
+                print(f"PC {cpu.program_counter:03}  ACC {cpu.accumulator.value}  IR {cpu.instruction_register}")
+            elif parts[0] in commands and len(parts) == 2:
+                commands[parts[0]](int(parts[1]))
+            else:
+                print(DEBUGGER_HELP)
+        except Exception as e:
+            print(f"Error: {e}")
+
+
+def main():
+    """
+    Loads the program named on the command line and starts a debugging session.
+    """
+    from cpu import CPU
+    from input_handler import CLIInputHandler
+    from memory import Memory
+
+    if len(sys.argv) != 2:
+        print("Usage: python debugger.py PROGRAM_FILE")
+        return
+    with open(sys.argv[1], 'r') as file:
+        program = [line.strip() for line in file.readlines()]
+    memory = Memory(max_size=250)
+    try:
+        memory.load_program(program)
+    except Exception as e:
+        print(f"Error loading program into memory: {e}")
+        return
+    cpu = CPU(memory, CLIInputHandler(), output_callback=print)
+    try:
+        asyncio.run(run_debugger_cli(Debugger(cpu)))
+    except KeyboardInterrupt:
+        print("\nDebugging session interrupted by user.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""
+Memory-mapped device ports, so programs can stream data without a READ or WRITE per word.
+
+A DeviceMemory maps chosen addresses to ports. LOAD (or ADD, SUBTRACT, ...) from an input
+port takes the next value from its queue, and STORE to an output port appends the
+accumulator to its queue. The host fills input queues and drains output queues in batches,
+either between runs or through the refill and drain callbacks while the program runs.
+
+    memory = DeviceMemory(100, {98: InputPort(values), 99: OutputPort(drain=sink.extend)})
+
+Every other address behaves as in Memory; plain Memory objects are not affected at all.
+The word at a port's address always shows the last value that passed through the port, and
+is what runs if the program counter reaches that address; instruction fetches never touch
+the port itself.
+"""
+from collections import deque
+
+from accumulator import WORD_MAX
+from memory import Memory
+
+
+class InputPort:
+    """
+    A queue of values read by a program, one per load from the port's address.
+
+    Attributes:
+        buffer (deque): The values waiting to be read.
+        refill: A callable returning an iterable of more values, called when the buffer runs
+            dry, or None.
+        end_value (int): The value read once the buffer is empty and `refill` has nothing
+            more, or None to make that an error.
+        count (int): The number of values read so far.
+    """
+    __slots__ = ("buffer", "refill", "end_value", "count")
+
+    def __init__(self, values=(), refill=None, end_value=None):
+        """
+        Initializes the port with its first batch of values.
+
+        Args:
+            values (iterable of int): The values to read first.
+            refill: A callable returning the next batch of values, defaults to None.
+            end_value (int): The value read at the end of the input, defaults to None.
+
+        Raises:
+            ValueError: If a value does not fit in a word.
+        """
+        self.buffer = deque()
+        self.refill = refill
+        self.end_value = end_value
+        self.count = 0
+        self.feed(values)
+
+    def feed(self, values):
+        """
+        Appends a batch of values to the queue.
+
+        Args:
+            values (iterable of int): The values to append.
+
+        Raises:
+            ValueError: If a value does not fit in a word.
+        """
+        batch = [int(value) for value in values]
+        for value in batch:
+            if abs(value) > WORD_MAX:
+                raise ValueError(f"Port value {value} does not fit in a word")
+        self.buffer.extend(batch)
+
+    def read(self):
+        """
+        Takes the next value, refilling the queue first if it is empty.
+
+        Returns:
+            int: The value.
+
+        Raises:
+            ValueError: If the queue is empty, nothing refills it and there is no end value.
+        """
+        if not self.buffer and self.refill is not None:
+            self.feed(self.refill())
+        if self.buffer:
+            self.count += 1
+            return self.buffer.popleft()
+        if self.end_value is None:
+            raise ValueError("Input port is empty")
+        return self.end_value
+
+
+class OutputPort:
+    """
+    A queue of values written by a program, one per store to the port's address.
+
+    Attributes:
+        buffer (list of int): The values written since the host last drained the port.
+        drain: A callable taking a list of values, called whenever `capacity` values are
+            waiting and by `flush`, or None.
+        capacity (int): The number of values buffered before `drain` is called, or before
+            writing fails if there is no `drain`. None means no limit.
+        count (int): The number of values written so far.
+    """
+    __slots__ = ("buffer", "drain", "capacity", "count")
+
+    def __init__(self, drain=None, capacity=256):
+        """
+        Initializes an empty port.
+
+        Args:
+            drain: A callable receiving each full batch, defaults to None.
+            capacity (int): The batch size, defaults to 256. None means no limit.
+        """
+        self.buffer = []
+        self.drain = drain
+        self.capacity = capacity
+        self.count = 0
+
+    def write(self, value):
+        """
+        Appends a value, handing the batch to `drain` once it is full.
+
+        Args:
+            value (int): The value written by the program.
+
+        Raises:
+            ValueError: If the buffer is full and there is no `drain`.
+        """
+        if self.capacity is not None and len(self.buffer) >= self.capacity:
+            if self.drain is None:
+                raise ValueError("Output port is full")
+            self.flush()
+        self.buffer.append(value)
+        self.count += 1
+        if self.drain is not None and self.capacity is not None and len(self.buffer) >= self.capacity:
+            self.flush()
+
+    def take(self):
+        """
+        Removes and returns every buffered value, for hosts that drain between runs.
+
+        Returns:
+            list of int: The values, in the order they were written.
+        """
+        values, self.buffer = self.buffer, []
+        return values
+
+    def flush(self):
+        """
+        Hands any buffered values to `drain`, typically once the program has stopped.
+        """
+        if self.buffer and self.drain is not None:
+            self.drain(self.take())
+
+
+class DeviceMemory(Memory):
+    """
+    A Memory with some addresses mapped to input and output ports.
+
+    Attributes:
+        ports (dict): Maps each port address to its InputPort or OutputPort.
+    """
+    __slots__ = ("ports",)
+
+    def __init__(self, max_size, ports):
+        """
+        Initializes the memory and maps the ports.
+
+        Args:
+            max_size (int): The total number of memory slots available.
+            ports (dict): Maps addresses to InputPort or OutputPort objects.
+
+        Raises:
+            ValueError: If a port address is outside memory.
+        """
+        super().__init__(max_size)
+        for address in ports:
+            if not 0 <= address < max_size:
+                raise ValueError(f"Port address {address} is outside memory of {max_size} words")
+        self.ports = dict(ports)
+
+    def get_value(self, address):
+        """
+        Retrieves a word, or the next value from the input port mapped at the address.
+
+        Args:
+            address (int): The address to retrieve the value from.
+
+        Returns:
+            int: The value.
+
+        Raises:
+            ValueError: If the address is an output port, or an input port with no value left.
+        """
+        if address not in self.ports:
+            return self.memory[address]
+        port = self.ports[address]
+        if not isinstance(port, InputPort):
+            raise ValueError(f"Cannot read from output port at address {address}")
+        value = port.read()
+        self.memory[address] = value
+        self.mark_changed((address,))
+        return value
+
+    def set_value(self, address, value):
+        """
+        Stores a word, or writes the value to the output port mapped at the address.
+
+        Args:
+            address (int): The address to store the value at.
+            value (int): The value to store.
+
+        Raises:
+            ValueError: If the address is an input port, or a full output port with no drain.
+        """
+        port = self.ports.get(address)
+        if port is not None:
+            if not isinstance(port, OutputPort):
+                raise ValueError(f"Cannot write to input port at address {address}")
+            port.write(value)
+        super().set_value(address, value)
+
+    def flush(self):
+        """
+        Drains every output port that has a drain callback.
+        """
+        for port in self.ports.values():
+            if isinstance(port, OutputPort):
+                port.flush()
@@ -0,0 +1,261 @@
+"""
+Pull-based execution: a CPU that yields typed events from an async iterator.
+
+    async for event in cpu.run_events():
+        if isinstance(event, InputRequest):
+            event.provide(next_value)
+        elif isinstance(event, OutputEvent):
+            print(event.value)
+
+The program only advances when the consumer asks for the next event, so a slow consumer
+holds the program back instead of letting output pile up. Output values are passed as
+integers, with no message formatting.
+"""
+import asyncio
+
+from batch_runner import RunResult, state_hash
+from cpu import CPU
+
+READ = 10
+HALT = 43
+
+
+class Event:
+    """
+    Base class for execution events. Subclasses list their fields in `__slots__`.
+    """
+    __slots__ = ()
+    kind = "event"
+
+    def to_dict(self):
+        """
+        Converts the event to a JSON serializable dictionary.
+
+        Returns:
+            dict: The event's fields, plus its kind under "type".
+        """
+        data = {"type": self.kind}
+        for name in self.__slots__:
+            if not name.startswith("_"):
+                data[name] = getattr(self, name)
+        return data
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={value!r}" for name, value in self.to_dict().items() if name != "type")
+        return f"{type(self).__name__}({fields})"
+
+
+class OutputEvent(Event):
+    """
+    A WRITE instruction ran.
+
+    Attributes:
+        address (int): The address written out.
+        value (int): The value at that address.
+    """
+    __slots__ = ("address", "value")
+    kind = "output"
+
+    def __init__(self, address, value):
+        self.address = address
+        self.value = value
+
+
+class InputRequest(Event):
+    """
+    A READ instruction is about to run and needs a value.
+
+    The consumer answers with `provide`, either before asking for the next event or later
+    from another task; the program waits until it does.
+
+    Attributes:
+        address (int): The address the value will be stored at.
+    """
+    __slots__ = ("address", "_future")
+    kind = "input"
+
+    def __init__(self, address):
+        self.address = address
+        self._future = asyncio.get_running_loop().create_future()
+
+    def provide(self, value):
+        """
+        Supplies the value for the READ. Later calls are ignored.
+
+        Args:
+            value: The input, as an integer or a string.
+        """
+        if not self._future.done():
+            self._future.set_result(value)
+
+    async def get_input(self):
+        """
+        Waits for the value, so the request can stand in for the CPU's input handler.
+
+        Returns:
+            str: The value provided.
+        """
+        return str(await self._future)
+
+
+class HaltEvent(Event):
+    """
+    The program halted or ran off the end of memory.
+
+    Attributes:
+        steps (int): The number of instructions executed.
+        cycles (int): The simulated cycles used.
+        halted (bool): True if a HALT instruction stopped the program, False if it ran off
+            the end of memory.
+    """
+    __slots__ = ("steps", "cycles", "halted")
+    kind = "halt"
+
+    def __init__(self, steps, cycles, halted=True):
+        self.steps = steps
+        self.cycles = cycles
+        self.halted = halted
+
+
+class ErrorEvent(Event):
+    """
+    The program stopped with an error.
+
+    Attributes:
+        message (str): The error message.
+        program_counter (int): The address of the instruction that failed.
+    """
+    __slots__ = ("message", "program_counter")
+    kind = "error"
+
+    def __init__(self, message, program_counter):
+        self.message = message
+        self.program_counter = program_counter
+
+
+class EventCPU(CPU):
+    """
+    A CPU driven through `run_events` rather than an input handler and output callback.
+    """
+    __slots__ = ("_event",)
+
+    def __init__(self, memory, overflow_policy="wrap", cycle_costs=None):
+        """
+        Initializes the CPU with no input handler and no output callback.
+
+        Args:
+            memory: The memory object holding the program.
+            overflow_policy: How arithmetic results outside a 6 digit word are handled.
+            cycle_costs: A dict of opcode (or opcode name) to cycle cost, defaults to None.
+        """
+        super().__init__(memory, None, self._discard_message, overflow_policy, cycle_costs)
+        self._event = None
+
+    @staticmethod
+    def _discard_message(message):
+        """
+        Ignores status messages such as "Awaiting user input...".
+
+        Args:
+            message (str): The message to ignore.
+        """
+
+    def handle_write(self, address):
+        """
+        Queues an output event for the value at a memory address.
+
+        Args:
+            address: The memory address to read the value from.
+        """
+        self._event = OutputEvent(address, self.memory.get_value(address))
+
+    def take_event(self):
+        """
+        Returns the output event of the last instruction, for callers that step the CPU
+        themselves, such as a debugger.
+
+        Returns:
+            OutputEvent: The event, or None if the last instruction wrote nothing.
+        """
+        event, self._event = self._event, None
+        return event
+
+    def handle_halt(self):
+        """
+        Halts program execution by moving the program counter past the end of memory.
+        """
+        self.program_counter = self.memory.max_size
+
+    def stopped_at_halt(self):
+        """
+        Returns whether the last instruction executed was a HALT, as opposed to the program
+        running off the end of memory.
+
+        Returns:
+            bool: True if a HALT instruction stopped the program.
+        """
+        return self.instruction_register is not None and self.instruction_register // 1000 == HALT
+
+    async def run_events(self, max_steps=None):
+        """
+        Runs the program, yielding an event for each input, output and the final outcome.
+
+        Args:
+            max_steps (int): The most instructions to execute, or None for no limit.
+
+        Yields:
+            Event: InputRequest and OutputEvent as they happen, then one HaltEvent or ErrorEvent.
+        """
+        max_size = self.memory.max_size
+        try:
+            while self.program_counter < max_size:
+                if max_steps is not None and self.instruction_count >= max_steps:
+                    raise RuntimeError(f"Step budget of {max_steps} instructions exceeded")
+                word = self.memory.fetch(self.program_counter)
+                if word // 1000 == READ:
+                    request = InputRequest(word % 1000)
+                    self.input_handler = request
+                    yield request
+                await self.execute_instruction()
+                event = self.take_event()
+                if event is not None:
+                    yield event
+        except Exception as e:
+            yield ErrorEvent(str(e), self.program_counter)
+            return
+        yield HaltEvent(self.instruction_count, self.cycles, self.stopped_at_halt())
+
+
+async def run_scripted(memory, inputs=(), max_steps=None, overflow_policy="wrap"):
+    """
+    Runs a loaded program on an EventCPU, answering READs from a fixed input sequence.
+
+    Args:
+        memory: The memory holding the loaded program. It is modified by the run.
+        inputs (iterable): The values supplied to READ instructions, in order.
+        max_steps (int): The most instructions to execute, or None for no limit.
+        overflow_policy (str): How arithmetic results outside a 6 digit word are handled.
+
+    Returns:
+        RunResult: The program's outputs, step and cycle counts and final state hash, as
+            `batch_runner.run_program` reports them.
+    """
+    cpu = EventCPU(memory, overflow_policy)
+    remaining = iter(inputs)
+    outputs = []
+    error = None
+    async for event in cpu.run_events(max_steps):
+        if isinstance(event, OutputEvent):
+            outputs.append(event.value)
+        elif isinstance(event, InputRequest):
+            value = next(remaining, None)
+            if value is None:
+                error = "Program requested more input than was provided"
+                break
+            event.provide(value)
+        elif isinstance(event, ErrorEvent):
+            error = event.message
+    return RunResult(outputs, cpu.instruction_count, state_hash(cpu), error, cpu.cycles)
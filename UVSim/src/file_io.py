@@ -0,0 +1,75 @@
+"""
+Program file reading and writing in chunks, with progress reporting, for use off the GUI thread
+"""
+import os
+
+from tracing import span
+
+CHUNK_SIZE = 65536
+
+
+def read_program_file(file_path, progress=None, chunk_size=CHUNK_SIZE):
+    """
+    Reads a program file into a list of stripped lines, reporting progress as it goes.
+
+    Blank lines before the first and after the last instruction are dropped, as when a
+    program is typed into the GUI. Blank lines between instructions are kept, so
+    `Memory.load_program` rejects them rather than every later instruction silently moving
+    to a different address.
+
+    Args:
+        file_path (str): The file to read.
+        progress: An optional callable taking (bytes_done, bytes_total), called after each chunk.
+        chunk_size (int): The number of bytes read at a time, defaults to 64 KiB.
+
+    Returns:
+        list of str: The file's lines with surrounding whitespace removed.
+    """
+    total = os.path.getsize(file_path)
+    done = 0
+    chunks = []
+    with span("read program file", path=file_path, bytes=total):
+        with open(file_path, 'r') as file:
+            while True:
+                chunk = file.read(chunk_size)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                done += len(chunk)
+                if progress is not None:
+                    progress(min(done, total), total)
+        return [line.strip() for line in "".join(chunks).strip().splitlines()]
+
+
+def write_text_file(file_path, text, progress=None, chunk_size=CHUNK_SIZE):
+    """
+    Writes text to a file in chunks, reporting progress as it goes.
+
+    Args:
+        file_path (str): The file to write.
+        text (str): The text to write.
+        progress: An optional callable taking (characters_done, characters_total).
+        chunk_size (int): The number of characters written at a time, defaults to 64 KiB.
+    """
+    total = len(text)
+    with open(file_path, 'w') as file:
+        for start in range(0, total, chunk_size):
+            file.write(text[start:start + chunk_size])
+            if progress is not None:
+                progress(min(start + chunk_size, total), total)
+
+
+def preview_text(lines, max_lines):
+    """
+    Builds the text shown in the editor for a program, truncated for large programs.
+
+    Args:
+        lines (list of str): The program's lines.
+        max_lines (int): The most lines to include.
+
+    Returns:
+        tuple: The preview text and whether it was truncated.
+    """
+    if len(lines) <= max_lines:
+        return "\n".join(lines), False
+    return "\n".join(lines[:max_lines]), True
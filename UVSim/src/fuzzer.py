@@ -0,0 +1,299 @@
+"""
+Differential fuzzer for simulator engines, run this file to fuzz the engines against the reference CPU.
+
+Random memory images are generated with a bias towards loops, conditional branches and
+stores into the program's own code, together with random input streams. Each image runs on
+the reference CPU and on every engine under test with a step budget, and any difference in
+outputs, error, step or cycle count or final memory is reported. Failing cases are shrunk
+to a small image before they are shown, and can be saved as golden corpus cases.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from accumulator import WORD_MAX
+from golden_corpus import ENGINES, REFERENCE_ENGINE, compare_runs
+
+ARITHMETIC = (20, 30, 31, 32, 33)
+CONDITIONAL_BRANCHES = (41, 42)
+HALT_WORD = 43000
+BATCH_SIZE = 200
+
+
+class FuzzCase:
+    """
+    A memory image and the input stream it is run with.
+
+    Attributes:
+        words (list of int): The memory image.
+        inputs (list of int): The values supplied to READ instructions, in order.
+    """
+    __slots__ = ("words", "inputs")
+
+    def __init__(self, words, inputs):
+        self.words = words
+        self.inputs = inputs
+
+    def program(self):
+        """
+        Formats the image as signed 6 digit program lines, trimming trailing zero words.
+
+        Returns:
+            list of str: The program lines.
+        """
+        end = len(self.words)
+        while end > 1 and self.words[end - 1] == 0:
+            end -= 1
+        return [f"{word:+07d}" for word in self.words[:end]]
+
+    def __repr__(self):
+        return f"FuzzCase(words={self.words!r}, inputs={self.inputs!r})"
+
+
+def _random_value(rng):
+    """
+    Picks a data value, usually small, sometimes at or near the word limits.
+    """
+    choice = rng.random()
+    if choice < 0.6:
+        return rng.randint(-10, 10)
+    if choice < 0.8:
+        return rng.choice((0, 1, -1, WORD_MAX, -WORD_MAX, WORD_MAX - 1))
+    return rng.randint(-WORD_MAX, WORD_MAX)
+
+
+def generate_case(rng, memory_size=100):
+    """
+    Generates a random program image and input stream.
+
+    Args:
+        rng (random.Random): The source of randomness.
+        memory_size (int): The number of words in the image, defaults to 100.
+
+    Returns:
+        FuzzCase: The generated case.
+    """
+    code_size = rng.randint(2, min(40, memory_size // 2))
+    words = [0] * memory_size
+    for address in range(code_size):
+        kind = rng.random()
+        if kind < 0.15:
+            # Mostly backward, so loops are common
+            target = rng.randint(0, address) if rng.random() < 0.7 else rng.randrange(code_size)
+            opcode = rng.choice(CONDITIONAL_BRANCHES) if rng.random() < 0.8 else 40
+            words[address] = opcode * 1000 + target
+        elif kind < 0.25:
+            # Self-modification: store over an instruction
+            words[address] = 21000 + rng.randrange(code_size)
+        elif kind < 0.33:
+            words[address] = 10000 + rng.randrange(code_size, memory_size)
+        elif kind < 0.43:
+            words[address] = 11000 + rng.randrange(memory_size)
+        elif kind < 0.47:
+            words[address] = HALT_WORD
+        else:
+            operand = rng.randrange(code_size, memory_size) if rng.random() < 0.85 else rng.randrange(code_size)
+            words[address] = rng.choice(ARITHMETIC + (21,)) * 1000 + operand
+    for address in range(code_size, memory_size):
+        if rng.random() < 0.5:
+            words[address] = _random_value(rng)
+    inputs = [_random_value(rng) for _ in range(rng.randint(0, 6))]
+    return FuzzCase(words, inputs)
+
+
+def find_differences(case, engines, max_steps=2000, memory_size=100):
+    """
+    Runs a case on the reference CPU and on each engine.
+
+    Args:
+        case (FuzzCase): The case to run.
+        engines (list of str): The engines to compare with the reference.
+        max_steps (int): The step budget for every run, defaults to 2000.
+        memory_size (int): The number of words of memory, defaults to 100.
+
+    Returns:
+        dict: Maps each engine that disagreed to its list of differences.
+    """
+    program = case.program()
+    runs = {}
+    for engine in [REFERENCE_ENGINE] + list(engines):
+        try:
+            result, words = ENGINES[engine](program, case.inputs, max_steps, memory_size)
+            runs[engine] = (result.to_dict(), words)
+        except Exception as e:
+            runs[engine] = ({"outputs": [], "steps": 0, "cycles": 0, "error": f"{type(e).__name__}: {e}"}, [])
+    differences = {}
+    for engine in engines:
+        problems = compare_runs(runs[REFERENCE_ENGINE], runs[engine])
+        if problems:
+            differences[engine] = problems
+    return differences
+
+
+def _complexity(word):
+    """
+    Orders words from simplest to most complex: zero, then HALT, then by magnitude.
+    Shrinking only ever moves a word down this order, so it always finishes.
+    """
+    if word == 0:
+        return 0
+    if word == HALT_WORD:
+        return 1
+    return 2 + abs(word)
+
+
+def shrink(case, engines, max_steps=2000, memory_size=100):
+    """
+    Reduces a failing case while it still fails, one simplification at a time.
+
+    Inputs are dropped, then words are replaced by HALT or zero and operands and values
+    are pulled towards zero, until no single change keeps the failure.
+
+    Args:
+        case (FuzzCase): A case for which `find_differences` is not empty.
+        engines (list of str): The engines to compare with the reference.
+        max_steps (int): The step budget for every run, defaults to 2000.
+        memory_size (int): The number of words of memory, defaults to 100.
+
+    Returns:
+        FuzzCase: The smallest failing case found.
+    """
+    def fails(candidate):
+        return bool(find_differences(candidate, engines, max_steps, memory_size))
+
+    improved = True
+    while improved:
+        improved = False
+        for index in reversed(range(len(case.inputs))):
+            candidate = FuzzCase(case.words, case.inputs[:index] + case.inputs[index + 1:])
+            if fails(candidate):
+                case, improved = candidate, True
+        for address in reversed(range(len(case.words))):
+            word = case.words[address]
+            for replacement in (0, HALT_WORD, int(word / 1000) * 1000, int(word / 2)):
+                if _complexity(replacement) >= _complexity(word):
+                    continue
+                words = list(case.words)
+                words[address] = replacement
+                candidate = FuzzCase(words, case.inputs)
+                if fails(candidate):
+                    case, improved = candidate, True
+                    break
+    return case
+
+
+def check_seeds(job):
+    """
+    Generates and runs a batch of cases, in a worker process.
+
+    Args:
+        job (tuple): The first seed, the number of seeds, the engines, the step budget and
+            the memory size.
+
+    Returns:
+        list of int: The seeds whose cases showed a difference.
+    """
+    first_seed, count, engines, max_steps, memory_size = job
+    failing = []
+    for seed in range(first_seed, first_seed + count):
+        case = generate_case(random.Random(seed), memory_size)
+        if find_differences(case, engines, max_steps, memory_size):
+            failing.append(seed)
+    return failing
+
+
+def fuzz(iterations, engines, seed=0, workers=None, max_steps=2000, memory_size=100):
+    """
+    Runs many generated cases across a process pool and shrinks the failing ones.
+
+    Args:
+        iterations (int): The number of cases to run.
+        engines (list of str): The engines to compare with the reference CPU.
+        seed (int): The seed of the first case; case i uses seed + i. Defaults to 0.
+        workers (int): The number of worker processes, defaults to the CPU count. 1 runs in
+            this process.
+        max_steps (int): The step budget for every run, defaults to 2000.
+        memory_size (int): The number of words of memory, defaults to 100.
+
+    Returns:
+        list of tuple: (seed, shrunk case, differences) for each failing case, in seed order.
+
+    Raises:
+        ValueError: If an engine name is unknown.
+    """
+    engines = list(engines)
+    for engine in engines:
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine '{engine}', expected one of {', '.join(ENGINES)}")
+    jobs = [(start, min(BATCH_SIZE, seed + iterations - start), engines, max_steps, memory_size)
+            for start in range(seed, seed + iterations, BATCH_SIZE)]
+    if workers == 1 or len(jobs) < 2:
+        batches = list(map(check_seeds, jobs))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            batches = list(executor.map(check_seeds, jobs))
+
+    failures = []
+    for failing_seed in sorted(seed for batch in batches for seed in batch):
+        case = shrink(generate_case(random.Random(failing_seed), memory_size), engines, max_steps, memory_size)
+        failures.append((failing_seed, case, find_differences(case, engines, max_steps, memory_size)))
+    return failures
+
+
+def save_case(directory, name, case, max_steps):
+    """
+    Writes a case as a golden corpus program with its inputs and step budget.
+
+    Expected results are not written; record them with golden_corpus.py --record once the
+    engines agree.
+
+    Args:
+        directory (str): The corpus directory.
+        name (str): The case name.
+        case (FuzzCase): The case to save.
+        max_steps (int): The step budget to save with it.
+    """
+    with open(os.path.join(directory, name + ".txt"), 'w') as file:
+        file.write("\n".join(case.program()) + "\n")
+    with open(os.path.join(directory, name + ".json"), 'w') as file:
+        json.dump({"inputs": case.inputs, "max_steps": max_steps}, file)
+        file.write("\n")
+
+
+def main():
+    """
+    Fuzzes the engines named on the command line and prints each shrunk failing case.
+    """
+    parser = argparse.ArgumentParser(description="Differentially fuzz UVSim engines against the reference CPU.")
+    parser.add_argument("--engine", action="append", choices=[name for name in ENGINES if name != REFERENCE_ENGINE],
+                        help="an engine to test, may be repeated; defaults to all")
+    parser.add_argument("--iterations", type=int, default=10000, help="the number of cases to run")
+    parser.add_argument("--seed", type=int, default=0, help="the seed of the first case")
+    parser.add_argument("--workers", type=int, help="worker processes, defaults to the CPU count")
+    parser.add_argument("--max-steps", type=int, default=2000, help="the step budget per run")
+    parser.add_argument("--save", metavar="DIR", help="save shrunk failing cases to this corpus directory")
+    args = parser.parse_args()
+
+    engines = args.engine or [name for name in ENGINES if name != REFERENCE_ENGINE]
+    start = time.perf_counter()
+    failures = fuzz(args.iterations, engines, args.seed, args.workers, args.max_steps)
+    elapsed = time.perf_counter() - start
+    for seed, case, differences in failures:
+        print(f"seed {seed}: inputs {case.inputs}")
+        print("  " + " ".join(case.program()))
+        for engine, problems in differences.items():
+            print(f"  {engine}: {'; '.join(problems)}")
+        if args.save:
+            save_case(args.save, f"fuzz_{seed}", case, args.max_steps)
+    runs = args.iterations * (len(engines) + 1)
+    print(f"{args.iterations} cases, {runs} runs in {elapsed:.1f} s ({runs / elapsed * 3600:,.0f} runs per hour), "
+          f"{len(failures)} failing")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,357 @@
+"""
+Golden program regression corpus, run this file with a corpus directory to check it.
+
+Each case is a program file NAME.txt with an expectations file NAME.json beside it:
+    {"inputs": [5], "max_steps": 1000, "outputs": [5], "error": null, "memory": {"9": 5}}
+"memory" lists only the words worth checking. Cases run in parallel across processes, and a
+case that passed before is skipped while its program, expectations and engine source are
+unchanged. In differential mode the expectations are ignored and each case is compared
+between the reference CPU and another engine instead.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from batch_runner import run_program
+from events import run_scripted
+from file_io import read_program_file
+from memory import Memory
+from simulator import Simulator
+
+REFERENCE_ENGINE = "cpu"
+CACHE_FILE = ".golden_cache.json"
+
+# The modules whose source decides each engine's behaviour, for cache invalidation
+ENGINE_MODULES = {
+    "cpu": ("accumulator", "batch_runner", "cpu", "cycle_model", "file_io", "input_handler", "memory", "tracing"),
+    "events": ("accumulator", "batch_runner", "cpu", "cycle_model", "events", "file_io", "memory", "tracing"),
+    "simulator": ("accumulator", "batch_runner", "cpu", "cycle_model", "file_io", "input_handler", "memory",
+                  "simulator", "tracing"),
+}
+
+_simulators = {}
+
+
+def _run_cpu(program, inputs, max_steps, memory_size):
+    """
+    Runs a program on the reference CPU, returning its result and final memory.
+    """
+    memory = Memory(memory_size)
+    memory.load_program(program)
+    return run_program(memory, inputs, max_steps), list(memory.memory)
+
+
+def _run_events(program, inputs, max_steps, memory_size):
+    """
+    Runs a program on the event iterator, returning its result and final memory.
+    """
+    memory = Memory(memory_size)
+    memory.load_program(program)
+    return asyncio.run(run_scripted(memory, inputs, max_steps)), list(memory.memory)
+
+
+def _run_simulator(program, inputs, max_steps, memory_size):
+    """
+    Runs a program on this process's reusable Simulator, returning its result and final memory.
+    """
+    if memory_size not in _simulators:
+        _simulators[memory_size] = Simulator(memory_size)
+    simulator = _simulators[memory_size]
+    simulator.load(program)
+    return simulator.run(inputs, max_steps), list(simulator.memory.memory)
+
+
+ENGINES = {"cpu": _run_cpu, "events": _run_events, "simulator": _run_simulator}
+
+
+def engine_fingerprint(engine):
+    """
+    Hashes the source of the modules an engine depends on.
+
+    Args:
+        engine (str): The engine name.
+
+    Returns:
+        str: A hex SHA-256 digest that changes whenever that source changes.
+    """
+    digest = hashlib.sha256(engine.encode())
+    src_dir = os.path.dirname(os.path.abspath(__file__))
+    for module in ENGINE_MODULES[engine]:
+        with open(os.path.join(src_dir, module + ".py"), 'rb') as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+
+def find_cases(corpus_dir):
+    """
+    Lists the cases in a corpus directory.
+
+    Args:
+        corpus_dir (str): The directory holding NAME.txt and NAME.json files.
+
+    Returns:
+        list of str: The case names, sorted, for every program file.
+    """
+    return sorted(name[:-4] for name in os.listdir(corpus_dir) if name.endswith(".txt"))
+
+
+def _read_case(corpus_dir, name):
+    """
+    Reads a case's program lines and expectations.
+
+    The program is read with `file_io.read_program_file`, so a case loads the same memory
+    image as its file run through the CLI.
+
+    Args:
+        corpus_dir (str): The corpus directory.
+        name (str): The case name.
+
+    Returns:
+        tuple: The program lines, the expectations dict (empty if there is no .json file)
+            and the raw bytes of both files for hashing.
+    """
+    program_path = os.path.join(corpus_dir, name + ".txt")
+    with open(program_path, 'rb') as file:
+        program_bytes = file.read()
+    expectations_path = os.path.join(corpus_dir, name + ".json")
+    expectations_bytes = b""
+    expectations = {}
+    if os.path.exists(expectations_path):
+        with open(expectations_path, 'rb') as file:
+            expectations_bytes = file.read()
+        expectations = json.loads(expectations_bytes)
+    program = read_program_file(program_path)
+    return program, expectations, program_bytes + b"\0" + expectations_bytes
+
+
+def _run_engine(engine, program, expectations, memory_size):
+    """
+    Runs a case on an engine, reporting load errors the way run errors are reported.
+
+    Args:
+        engine (str): The engine name.
+        program (list of str): The program lines.
+        expectations (dict): The case's expectations, for its inputs and step budget.
+        memory_size (int): The number of words of memory.
+
+    Returns:
+        tuple: The run's result as a dict and the final memory words.
+    """
+    try:
+        result, words = ENGINES[engine](program, expectations.get("inputs", []),
+                                        expectations.get("max_steps"), memory_size)
+    except ValueError as e:
+        return {"outputs": [], "steps": 0, "cycles": 0, "error": str(e)}, []
+    return result.to_dict(), words
+
+
+def check_expectations(expectations, result, words):
+    """
+    Compares a run with a case's expectations.
+
+    Args:
+        expectations (dict): The case's expected outputs, error, memory words and steps.
+        result (dict): The run's result from `RunResult.to_dict`.
+        words (list of int): The final memory.
+
+    Returns:
+        list of str: A description of each mismatch; empty if the run matched.
+    """
+    problems = []
+    for field in ("outputs", "error", "steps"):
+        if field in expectations and expectations[field] != result[field]:
+            problems.append(f"{field}: expected {expectations[field]!r}, got {result[field]!r}")
+    for address, value in expectations.get("memory", {}).items():
+        actual = words[int(address)] if int(address) < len(words) else None
+        if actual != value:
+            problems.append(f"memory[{address}]: expected {value}, got {actual}")
+    return problems
+
+
+def compare_runs(reference, candidate):
+    """
+    Compares two engines' runs of the same case.
+
+    Args:
+        reference (tuple): The reference engine's result dict and final memory.
+        candidate (tuple): The other engine's result dict and final memory.
+
+    Returns:
+        list of str: A description of each difference; empty if the runs agree.
+    """
+    (expected, expected_words), (actual, actual_words) = reference, candidate
+    problems = [f"{field}: reference {expected[field]!r}, engine {actual[field]!r}"
+                for field in ("outputs", "error", "steps", "cycles") if expected[field] != actual[field]]
+    differing = [address for address, (a, b) in enumerate(zip(expected_words, actual_words)) if a != b]
+    if differing or len(expected_words) != len(actual_words):
+        problems.append(f"memory differs at {differing[:10]}")
+    return problems
+
+
+def check_case(job):
+    """
+    Runs one case, in a worker process.
+
+    Args:
+        job (tuple): The corpus directory, case name, engine, differential engine (or None)
+            and memory size.
+
+    Returns:
+        dict: The case name, "pass" or "fail" status and any problems found.
+    """
+    corpus_dir, name, engine, diff_engine, memory_size = job
+    try:
+        program, expectations, _ = _read_case(corpus_dir, name)
+        run = _run_engine(engine, program, expectations, memory_size)
+        if diff_engine is None:
+            problems = check_expectations(expectations, *run)
+        else:
+            problems = compare_runs(run, _run_engine(diff_engine, program, expectations, memory_size))
+    except Exception as e:
+        problems = [f"{type(e).__name__}: {e}"]
+    return {"name": name, "status": "fail" if problems else "pass", "problems": problems}
+
+
+def case_key(corpus_dir, name, engines, fingerprints, memory_size):
+    """
+    Builds the cache key for a case: its files, the fingerprints of the engines involved and
+    the memory size it runs with.
+
+    Args:
+        corpus_dir (str): The corpus directory.
+        name (str): The case name.
+        engines (list of str): The engines the case runs on.
+        fingerprints (dict): Maps engine names to `engine_fingerprint` digests.
+        memory_size (int): The number of words of memory.
+
+    Returns:
+        str: A hex SHA-256 digest.
+    """
+    _, _, case_bytes = _read_case(corpus_dir, name)
+    digest = hashlib.sha256(case_bytes)
+    for engine in engines:
+        digest.update(fingerprints[engine].encode())
+    digest.update(str(memory_size).encode())
+    return digest.hexdigest()
+
+
+def _cache_slot(name, engines, memory_size):
+    """
+    Names a case's cache entry, so each engine or engine pair and memory size keeps its own.
+    """
+    return f"{name}|{'+'.join(engines)}|{memory_size}"
+
+
+def run_corpus(corpus_dir, engine=REFERENCE_ENGINE, diff_engine=None, workers=None, use_cache=True,
+               memory_size=250):
+    """
+    Checks every case in a corpus, skipping cases that passed before with the same inputs.
+
+    Args:
+        corpus_dir (str): The corpus directory.
+        engine (str): The engine checked against the expectations, defaults to the reference CPU.
+        diff_engine (str): An engine to compare against `engine` instead of checking
+            expectations, or None.
+        workers (int): The number of worker processes, defaults to the CPU count. 1 runs in
+            this process.
+        use_cache (bool): Whether to skip and record passing cases, defaults to True.
+        memory_size (int): The number of words of memory, defaults to 250.
+
+    Returns:
+        list of dict: One result per case in name order, with status "pass", "fail" or "cached".
+
+    Raises:
+        ValueError: If an engine name is unknown.
+    """
+    engines = [engine] + ([diff_engine] if diff_engine else [])
+    for name in engines:
+        if name not in ENGINES:
+            raise ValueError(f"Unknown engine '{name}', expected one of {', '.join(ENGINES)}")
+    fingerprints = {name: engine_fingerprint(name) for name in engines}
+    cache_path = os.path.join(corpus_dir, CACHE_FILE)
+    cache = {}
+    if use_cache and os.path.exists(cache_path):
+        with open(cache_path) as file:
+            cache = json.load(file)
+
+    results = {}
+    keys = {}
+    pending = []
+    for name in find_cases(corpus_dir):
+        keys[name] = case_key(corpus_dir, name, engines, fingerprints, memory_size)
+        if use_cache and cache.get(_cache_slot(name, engines, memory_size)) == keys[name]:
+            results[name] = {"name": name, "status": "cached", "problems": []}
+        else:
+            pending.append((corpus_dir, name, engine, diff_engine, memory_size))
+
+    if workers == 1 or len(pending) < 2:
+        checked = map(check_case, pending)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            checked = list(executor.map(check_case, pending, chunksize=max(1, len(pending) // 64)))
+    for result in checked:
+        results[result["name"]] = result
+
+    if use_cache:
+        for name, result in results.items():
+            if result["status"] == "pass":
+                cache[_cache_slot(name, engines, memory_size)] = keys[name]
+            elif result["status"] == "fail":
+                cache.pop(_cache_slot(name, engines, memory_size), None)
+        with open(cache_path, 'w') as file:
+            json.dump(cache, file, indent=0, sort_keys=True)
+    return [results[name] for name in sorted(results)]
+
+
+def record_expectations(corpus_dir, name, memory_size=250):
+    """
+    Writes a case's expectations from the reference CPU, keeping its inputs and step budget.
+
+    Args:
+        corpus_dir (str): The corpus directory.
+        name (str): The case name.
+        memory_size (int): The number of words of memory, defaults to 250.
+    """
+    program, expectations, _ = _read_case(corpus_dir, name)
+    result, words = _run_engine(REFERENCE_ENGINE, program, expectations, memory_size)
+    expectations.update({"outputs": result["outputs"], "error": result["error"], "steps": result["steps"],
+                         "memory": {str(address): word for address, word in enumerate(words) if word}})
+    with open(os.path.join(corpus_dir, name + ".json"), 'w') as file:
+        json.dump(expectations, file, indent=1)
+        file.write("\n")
+
+
+def main():
+    """
+    Checks the corpus named on the command line and prints a line per failing case.
+    """
+    parser = argparse.ArgumentParser(description="Run the golden program corpus.")
+    parser.add_argument("corpus", help="the corpus directory")
+    parser.add_argument("--engine", choices=ENGINES, default=REFERENCE_ENGINE, help="the engine to check")
+    parser.add_argument("--diff", choices=ENGINES, help="compare --engine with this engine instead of expectations")
+    parser.add_argument("--workers", type=int, help="worker processes, defaults to the CPU count")
+    parser.add_argument("--no-cache", action="store_true", help="run every case even if it passed before")
+    parser.add_argument("--record", nargs="+", metavar="NAME",
+                        help="write expectations for these cases from the reference CPU and exit")
+    args = parser.parse_args()
+
+    if args.record:
+        for name in args.record:
+            record_expectations(args.corpus, name)
+        return 0
+    results = run_corpus(args.corpus, args.engine, args.diff, args.workers, not args.no_cache)
+    counts = {"pass": 0, "fail": 0, "cached": 0}
+    for result in results:
+        counts[result["status"]] += 1
+        if result["status"] == "fail":
+            print(f"FAIL {result['name']}: {'; '.join(result['problems'])}")
+    print(f"{counts['pass']} passed, {counts['fail']} failed, {counts['cached']} skipped (unchanged)")
+    return 1 if counts["fail"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,8 +4,6 @@ Input handler module
 import asyncio
 from abc import ABC, abstractmethod
 
-from kivy.clock import Clock
-
 
 class InputHandler(ABC):
     """
@@ -22,6 +20,12 @@ class InputHandler(ABC):
             str: The input provided by the user.
         """
 
+    def close(self):
+        """
+        Releases anything the handler holds open once its program has finished. The default
+        does nothing.
+        """
+
 class CLIInputHandler(InputHandler):
     """
     Handles input from the command-line interface (CLI) asynchronously.
@@ -31,41 +35,71 @@ class CLIInputHandler(InputHandler):
         return await loop.run_in_executor(None, input, "Enter input: ")
 
 
-class GUIInputHandler(InputHandler):
+class ScriptedInputHandler(InputHandler):
     """
-        Handles input from a graphical user interface (GUI) asynchronously.
+    Supplies a fixed sequence of inputs, for running programs without a user.
 
-        This class interacts with a GUI instance to prompt the user for input
-        and waits for the input to be provided via the GUI.
+    Attributes:
+        inputs (list): The inputs to hand out, in order.
+        position (int): The index of the next input to hand out.
     """
-    def __init__(self, gui_instance):
+    def __init__(self, inputs):
+        """
+        Initializes the handler with the inputs to supply.
 
-        self.gui = gui_instance
-        self.loop = asyncio.get_event_loop()
-        self.input_future = None
+        Args:
+            inputs (iterable): The values returned by successive calls to `get_input`.
+        """
+        self.inputs = list(inputs)
+        self.position = 0
 
     async def get_input(self):
         """
-        Prompts the user for input through the GUI and waits for the input to be provided.
+        Returns the next scripted input.
 
         Returns:
-            str: The input provided by the user.
+            str: The next input, converted to a string.
 
-        This method uses an asyncio future to wait for the input, which is set by the GUI
-        when the user provides input.
+        Raises:
+            ValueError: If every scripted input has already been used.
         """
-        self.input_future = self.loop.create_future()
-        # Schedule the GUI to prompt for input
-        Clock.schedule_once(lambda dt: self.gui.enable_console_input(), 0)
-        return await self.input_future
+        if self.position >= len(self.inputs):
+            raise ValueError("Program requested more input than was provided")
+        value = self.inputs[self.position]
+        self.position += 1
+        return str(value)
+
+
+class StreamInputHandler(InputHandler):
+    """
+    Reads one input per line from an asyncio stream, such as a socket or a pipe.
+
+    Waiting for a line only suspends the program that asked, so other programs on the same
+    event loop keep running.
 
-    def provide_input(self, value):
+    Attributes:
+        reader: An object with an async `readline` method, such as `asyncio.StreamReader`.
+    """
+    def __init__(self, reader):
         """
-        Sets the provided input as the result of the future and clears it.
+        Initializes the handler with the stream to read.
 
         Args:
-            value (str): The input provided by the user.
+            reader: The stream inputs arrive on, one per line.
+        """
+        self.reader = reader
+
+    async def get_input(self):
+        """
+        Waits for the next line of the stream.
+
+        Returns:
+            str: The line, without surrounding whitespace.
+
+        Raises:
+            ValueError: If the stream ends before a line arrives.
         """
-        if self.input_future and not self.input_future.done():
-            self.input_future.set_result(value)
-            self.input_future = None
+        line = await self.reader.readline()
+        if not line:
+            raise ValueError("Input stream ended before the program finished reading")
+        return line.decode().strip()
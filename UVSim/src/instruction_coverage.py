@@ -0,0 +1,258 @@
+"""
+Instruction and branch coverage for BasicML programs, stored as bitmaps that merge across runs.
+
+Collection works per basic block: the run loop only records something when a branch or
+HALT ends a block, noting the block's address range and, for BRANCHNEG and BRANCHZERO,
+which way the branch went. The ranges are turned into bits once the run is over.
+"""
+import struct
+
+from profiler import ControlFlow
+
+BRANCH_NEG = 41
+BRANCH_ZERO = 42
+# Words at or above this are branches or HALT, the instructions that end a basic block
+BLOCK_END_WORD = 40000
+
+_HEADER = struct.Struct("<4sI")
+MAGIC = b"UVCV"
+
+
+class Coverage:
+    """
+    Which addresses executed and which directions each conditional branch took.
+
+    Attributes:
+        size (int): The number of addresses covered by the bitmaps.
+        executed (bytearray): One bit per address that executed.
+        taken (bytearray): One bit per conditional branch that branched.
+        not_taken (bytearray): One bit per conditional branch that fell through.
+    """
+    __slots__ = ("size", "executed", "taken", "not_taken")
+
+    def __init__(self, size):
+        """
+        Initializes empty bitmaps.
+
+        Args:
+            size (int): The number of addresses, usually the memory size.
+        """
+        self.size = size
+        length = (size + 7) // 8
+        self.executed = bytearray(length)
+        self.taken = bytearray(length)
+        self.not_taken = bytearray(length)
+
+    @staticmethod
+    def _test(bitmap, address):
+        return bool(bitmap[address >> 3] & (1 << (address & 7)))
+
+    @staticmethod
+    def _set(bitmap, address):
+        bitmap[address >> 3] |= 1 << (address & 7)
+
+    def mark_range(self, start, end):
+        """
+        Marks a run of addresses as executed.
+
+        Args:
+            start (int): The first address.
+            end (int): The last address, inclusive.
+        """
+        for address in range(start, min(end, self.size - 1) + 1):
+            self._set(self.executed, address)
+
+    def mark_branch(self, address, taken):
+        """
+        Records the direction a conditional branch went.
+
+        Args:
+            address (int): The branch's address.
+            taken (bool): Whether it branched.
+        """
+        self._set(self.taken if taken else self.not_taken, address)
+
+    def is_executed(self, address):
+        """
+        Returns whether an address executed.
+        """
+        return self._test(self.executed, address)
+
+    def branch_directions(self, address):
+        """
+        Returns the directions a branch took.
+
+        Args:
+            address (int): The branch's address.
+
+        Returns:
+            tuple: (taken, not_taken) booleans.
+        """
+        return self._test(self.taken, address), self._test(self.not_taken, address)
+
+    def executed_addresses(self):
+        """
+        Lists the addresses that executed.
+
+        Returns:
+            list of int: The addresses in ascending order.
+        """
+        return [address for address in range(self.size) if self._test(self.executed, address)]
+
+    def merge(self, other):
+        """
+        Adds another run's coverage to this one.
+
+        Args:
+            other (Coverage): Coverage of the same size.
+
+        Raises:
+            ValueError: If the sizes differ.
+        """
+        if other.size != self.size:
+            raise ValueError(f"Cannot merge coverage of {other.size} addresses into {self.size}")
+        for mine, theirs in ((self.executed, other.executed), (self.taken, other.taken),
+                             (self.not_taken, other.not_taken)):
+            merged = int.from_bytes(mine, "little") | int.from_bytes(theirs, "little")
+            mine[:] = merged.to_bytes(len(mine), "little")
+
+    def to_bytes(self):
+        """
+        Serializes the bitmaps.
+
+        Returns:
+            bytes: A small header followed by the three bitmaps.
+        """
+        return _HEADER.pack(MAGIC, self.size) + bytes(self.executed) + bytes(self.taken) + bytes(self.not_taken)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+        Rebuilds coverage from `to_bytes` output.
+
+        Args:
+            data (bytes): The serialized coverage.
+
+        Returns:
+            Coverage: The rebuilt coverage.
+
+        Raises:
+            ValueError: If the data is not serialized coverage.
+        """
+        if len(data) < _HEADER.size or data[:4] != MAGIC:
+            raise ValueError("Not serialized coverage")
+        _, size = _HEADER.unpack_from(data)
+        coverage = cls(size)
+        length = len(coverage.executed)
+        if len(data) != _HEADER.size + 3 * length:
+            raise ValueError("Serialized coverage has the wrong length")
+        offset = _HEADER.size
+        for bitmap in (coverage.executed, coverage.taken, coverage.not_taken):
+            bitmap[:] = data[offset:offset + length]
+            offset += length
+        return coverage
+
+    def summary(self, words):
+        """
+        Measures coverage against the instructions reachable in a program image.
+
+        Args:
+            words (list of int): The program image, as loaded.
+
+        Returns:
+            dict: Counts of reachable and executed instructions, and of conditional branch
+                directions possible and taken.
+        """
+        reachable = [address for start, end in ControlFlow(words).blocks for address in range(start, end + 1)]
+        branches = [address for address in reachable if words[address] // 1000 in (BRANCH_NEG, BRANCH_ZERO)]
+        return {
+            "instructions": len(reachable),
+            "executed": sum(self.is_executed(address) for address in reachable),
+            "branch_directions": 2 * len(branches),
+            "branch_directions_taken": sum(sum(self.branch_directions(address)) for address in branches),
+        }
+
+    def report(self, words, source_lines=None):
+        """
+        Formats the coverage alongside the program listing.
+
+        Each line shows the address, the source, "x" if it executed ("." if it did not) and,
+        for conditional branches, T and F for the directions taken.
+
+        Args:
+            words (list of int): The program image, as loaded.
+            source_lines (list of str): The program's source lines, defaults to the memory words.
+
+        Returns:
+            str: A summary line followed by one line per source line or executed address.
+        """
+        summary = self.summary(words)
+        lines = [f"{summary['executed']}/{summary['instructions']} instructions, "
+                 f"{summary['branch_directions_taken']}/{summary['branch_directions']} branch directions"]
+        executed = self.executed_addresses()
+        last = max([len(source_lines or [])] + [address + 1 for address in executed])
+        for address in range(last):
+            if source_lines is not None and address < len(source_lines):
+                source = source_lines[address]
+            else:
+                source = f"{words[address]:+07d}"
+            mark = "x" if self.is_executed(address) else "."
+            directions = ""
+            if words[address] // 1000 in (BRANCH_NEG, BRANCH_ZERO):
+                taken, not_taken = self.branch_directions(address)
+                directions = ("T" if taken else "-") + ("F" if not_taken else "-")
+            lines.append(f"{address:03}  {source:<8} {mark}  {directions}".rstrip())
+        return "\n".join(lines) + "\n"
+
+
+async def run_with_coverage(cpu, coverage=None, max_steps=None):
+    """
+    Executes a program until it stops, recording its coverage.
+
+    Coverage is recorded even when the program ends with an error, which is then raised.
+
+    Args:
+        cpu: The CPU to run, with a program loaded.
+        coverage (Coverage): Coverage to add to, defaults to a new one sized to memory.
+        max_steps (int): The most instructions to execute, or None for no limit.
+
+    Returns:
+        Coverage: The coverage, including this run.
+
+    Raises:
+        RuntimeError: If the program is still running after `max_steps` instructions.
+    """
+    max_size = cpu.memory.max_size
+    if coverage is None:
+        coverage = Coverage(max_size)
+    blocks = set()
+    taken = set()
+    not_taken = set()
+    # `address` stays below `start` until an instruction of the current block has run
+    start = cpu.program_counter
+    address = start - 1
+    try:
+        while cpu.program_counter < max_size:
+            if max_steps is not None and cpu.instruction_count >= max_steps:
+                raise RuntimeError(f"Step budget of {max_steps} instructions exceeded")
+            address = cpu.program_counter
+            await cpu.execute_instruction()
+            if cpu.instruction_register >= BLOCK_END_WORD:
+                blocks.add((start, address))
+                opcode = cpu.instruction_register // 1000
+                if opcode == BRANCH_NEG:
+                    (taken if cpu.accumulator.value < 0 else not_taken).add(address)
+                elif opcode == BRANCH_ZERO:
+                    (taken if cpu.accumulator.value == 0 else not_taken).add(address)
+                start = cpu.program_counter
+                address = start - 1
+    finally:
+        if start <= address:
+            blocks.add((start, address))
+        for block_start, block_end in blocks:
+            coverage.mark_range(block_start, block_end)
+        for branch in taken:
+            coverage.mark_branch(branch, True)
+        for branch in not_taken:
+            coverage.mark_branch(branch, False)
+    return coverage
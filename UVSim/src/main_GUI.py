@@ -4,6 +4,7 @@ Main GUI File, run this file to start the GUI
 from kivy.app import App
 
 from main_layout import MainLayout
+from tracing import enable_from_environment
 
 
 class UVSimApp(App):
@@ -35,4 +36,5 @@ class UVSimApp(App):
 
 
 if __name__ == '__main__':
+    enable_from_environment()
     UVSimApp().run()
@@ -1,14 +1,68 @@
 """
 Memory Management (customizable word memory size, 6 digit word), this represents the UVSim's memory
 """
+from array import array
+
+from tracing import span
+
+# Words are stored as signed 32 bit integers, which hold every 6 digit word
+WORD_TYPECODE = "i"
+
+
+class ChangeSet:
+    """
+    Collects the addresses written since a consumer last looked, so it can update in O(changes).
+
+    Created by `Memory.track_changes`. Each consumer, such as a memory view or a state hash,
+    gets its own change set, so taking changes in one does not hide them from the others.
+
+    Attributes:
+        memory (Memory): The memory being tracked.
+        addresses (set of int): The addresses written since the last `take`.
+    """
+    __slots__ = ("memory", "addresses")
+
+    def __init__(self, memory):
+        """
+        Initializes an empty change set for a memory.
+
+        Args:
+            memory (Memory): The memory to track.
+        """
+        self.memory = memory
+        self.addresses = set()
+
+    def take(self):
+        """
+        Returns the addresses written since the last call and starts collecting afresh.
+
+        Returns:
+            list of int: The changed addresses in ascending order.
+        """
+        addresses = sorted(self.addresses)
+        self.addresses.clear()
+        return addresses
+
+    def close(self):
+        """
+        Stops tracking changes.
+        """
+        self.memory.untrack_changes(self)
+
+    def __len__(self):
+        return len(self.addresses)
+
 
 class Memory:
     """
     Represents the memory for a machine code simulator.
     Attributes:
         max_size (int): The maximum number of memory addresses available.
-        memory (list): A list of integers representing the memory values.
+        memory (array): The memory values as signed 32 bit integers, 4 bytes per word.
+            Writing to it directly bypasses change tracking.
     """
+    __slots__ = ("max_size", "memory", "_change_sets")
+
     def __init__(self, max_size):
         """
         Initializes the memory with a specified size.
@@ -17,7 +71,8 @@ class Memory:
             max_size (int): The total number of memory slots available.
         """
         self.max_size = max_size
-        self.memory = [0] * self.max_size
+        self.memory = array(WORD_TYPECODE, [0]) * self.max_size
+        self._change_sets = []
 
     def load_program(self, program):
         """
@@ -30,6 +85,53 @@ class Memory:
         Raises:
             ValueError: If the instructions are not consistent or not properly formatted.
         """
+        with span("Memory.load_program", instructions=len(program)):
+            words = self.parse_program(program)
+            self.memory[:len(words)] = array(WORD_TYPECODE, words)
+            self.mark_changed(range(len(words)))
+
+    def patch_program(self, program):
+        """
+        Loads a program by writing only the words that differ from what memory already holds.
+
+        The resulting memory is the same as after `load_program`, but unchanged words are not
+        touched, so change sets and anything derived from them stay valid for those words.
+
+        Args:
+            program (list of str): A list of program instructions, as for `load_program`.
+
+        Returns:
+            list of int: The addresses that were changed.
+
+        Raises:
+            ValueError: If the instructions are not consistent or not properly formatted.
+        """
+        words = self.parse_program(program)
+        memory = self.memory
+        changed = [address for address, word in enumerate(words) if memory[address] != word]
+        for address in changed:
+            memory[address] = words[address]
+        self.mark_changed(changed)
+        return changed
+
+    def parse_program(self, program):
+        """
+        Converts program instructions into 6 digit words without changing memory.
+
+        Args:
+            program (list of str): A list of program instructions. Each instruction must be
+                either 4 or 6 digits, optionally prefixed with '+' or '-'.
+
+        Returns:
+            list of int: The instruction words, in order.
+
+        Raises:
+            ValueError: If the instructions are not consistent, not properly formatted or do
+                not fit in memory.
+        """
+        if len(program) > self.max_size:
+            raise ValueError(f"Program has {len(program)} instructions but memory only holds {self.max_size} words")
+        words = []
         length = 0
         for i, instruction in enumerate(program):
             if instruction.startswith(("+", "-")):
@@ -50,9 +152,17 @@ class Memory:
 
             try:
                 signed_instruction = instruction[0] + core_instruction if instruction[0] in "+-" else core_instruction
-                self.memory[i] = int(signed_instruction)
+                words.append(int(signed_instruction))
             except ValueError:
                 raise ValueError("Please insure all program instructions are integers")
+        return words
+
+    def clear(self):
+        """
+        Zeroes every word in place, keeping the same storage.
+        """
+        self.memory[:] = array(WORD_TYPECODE, [0]) * self.max_size
+        self.mark_changed(range(self.max_size))
 
     def get_value(self, address):
         """
@@ -66,6 +176,21 @@ class Memory:
         """
         return self.memory[address]
 
+    def fetch(self, address):
+        """
+        Retrieves the word stored at an address for the CPU to execute.
+
+        Unlike `get_value`, this is never a data read: subclasses that give data reads side
+        effects, such as device ports, still return the stored word here.
+
+        Args:
+            address (int): The address of the instruction.
+
+        Returns:
+            int: The word stored at the address.
+        """
+        return self.memory[address]
+
     def set_value(self, address, value):
         """
         Stores a value at a specific memory address.
@@ -75,3 +200,36 @@ class Memory:
             value (int): The value to store in memory.
         """
         self.memory[address] = value
+        for change_set in self._change_sets:
+            change_set.addresses.add(address)
+
+    def mark_changed(self, addresses):
+        """
+        Records addresses as changed, for code that writes to `memory` directly.
+
+        Args:
+            addresses (iterable of int): The addresses that were written.
+        """
+        for change_set in self._change_sets:
+            change_set.addresses.update(addresses)
+
+    def track_changes(self):
+        """
+        Starts collecting the addresses written through `set_value` and `load_program`.
+
+        Returns:
+            ChangeSet: A new change set, initially empty.
+        """
+        change_set = ChangeSet(self)
+        self._change_sets.append(change_set)
+        return change_set
+
+    def untrack_changes(self, change_set):
+        """
+        Stops updating a change set.
+
+        Args:
+            change_set (ChangeSet): A change set returned by `track_changes`.
+        """
+        if change_set in self._change_sets:
+            self._change_sets.remove(change_set)
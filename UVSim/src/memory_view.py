@@ -0,0 +1,124 @@
+"""
+Live memory and register viewer for the GUI
+"""
+from kivy.clock import Clock
+from kivy.metrics import dp
+from kivy.uix.boxlayout import BoxLayout
+from kivy.uix.label import Label
+from kivy.uix.recycleboxlayout import RecycleBoxLayout
+from kivy.uix.recycleview import RecycleView
+
+
+def format_word(address, value):
+    """
+    Formats one memory row.
+
+    Args:
+        address (int): The memory address.
+        value (int): The word stored at the address.
+
+    Returns:
+        str: The row text, such as "007  +001234".
+    """
+    return f"{address:03}  {value:+07d}"
+
+
+class MemoryView(BoxLayout):
+    """
+    Shows the accumulator, program counter, instruction register and memory words.
+
+    Memory rows live in a RecycleView, so only the rows on screen have widgets. A refresh
+    runs at most `max_fps` times a second and only rewrites rows whose words changed since
+    the previous refresh, using a change set from `Memory.track_changes`.
+
+    Attributes:
+        cpu: The CPU whose registers and memory are shown.
+        max_fps (float): The most refreshes per second.
+    """
+    def __init__(self, cpu, max_fps=10, **kwargs):
+        """
+        Initializes the view and starts the refresh timer.
+
+        Args:
+            cpu: The CPU to show.
+            max_fps (float): The most refreshes per second, defaults to 10.
+            **kwargs: Additional arguments passed to the parent BoxLayout initializer.
+        """
+        super().__init__(orientation='vertical', spacing=5, **kwargs)
+        self.cpu = None
+        self.max_fps = max_fps
+        self._changes = None
+        self._registers = None
+
+        self.accumulator_label = Label(text='ACC', size_hint=(1, None), height=dp(24))
+        self.program_counter_label = Label(text='PC', size_hint=(1, None), height=dp(24))
+        self.instruction_label = Label(text='IR', size_hint=(1, None), height=dp(24))
+        for label in (self.accumulator_label, self.program_counter_label, self.instruction_label):
+            self.add_widget(label)
+
+        self.memory_list = RecycleView(viewclass='Label')
+        layout = RecycleBoxLayout(
+            orientation='vertical',
+            default_size=(None, dp(22)),
+            default_size_hint=(1, None),
+            size_hint_y=None,
+        )
+        layout.bind(minimum_height=layout.setter('height'))
+        self.memory_list.add_widget(layout)
+        self.add_widget(self.memory_list)
+
+        self.set_cpu(cpu)
+        self._event = Clock.schedule_interval(self.refresh, 1 / max_fps)
+
+    def set_cpu(self, cpu):
+        """
+        Shows a different CPU, such as after a reload, and redraws every row once.
+
+        Args:
+            cpu: The CPU to show.
+        """
+        if self._changes is not None:
+            self._changes.close()
+        self.cpu = cpu
+        memory = cpu.memory
+        self._changes = memory.track_changes()
+        self._registers = None
+        self.memory_list.data = [{'text': format_word(address, value)}
+                                 for address, value in enumerate(memory.memory)]
+        self.refresh(0)
+
+    def refresh(self, dt):
+        """
+        Updates the register labels and any memory rows that changed.
+
+        Args:
+            dt: The time interval since the last call.
+        """
+        cpu = self.cpu
+        registers = (cpu.accumulator.value, cpu.program_counter, cpu.instruction_register)
+        if registers != self._registers:
+            self._registers = registers
+            self.accumulator_label.text = f"ACC  {registers[0]:+07d}"
+            self.program_counter_label.text = f"PC   {registers[1]:03}"
+            self.instruction_label.text = "IR   ------" if registers[2] is None else f"IR   {registers[2]:+07d}"
+
+        changed = self._changes.take()
+        if not changed:
+            return
+        words = cpu.memory.memory
+        data = self.memory_list.data
+        if len(changed) > len(data) // 4:
+            # Many rows changed, so one rebuild is cheaper than many item updates
+            self.memory_list.data = [{'text': format_word(address, value)} for address, value in enumerate(words)]
+            return
+        for address in changed:
+            data[address] = {'text': format_word(address, words[address])}
+
+    def stop(self):
+        """
+        Stops the refresh timer and change tracking.
+        """
+        self._event.cancel()
+        if self._changes is not None:
+            self._changes.close()
+            self._changes = None
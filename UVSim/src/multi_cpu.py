@@ -0,0 +1,311 @@
+"""
+Several CPUs running in separate processes against one memory image in shared memory.
+
+Consistency model:
+    - Every word read or write is atomic; a CPU never sees half of another CPU's write.
+    - Ordinary instructions are not ordered between CPUs. LOAD, ADD and STORE are separate
+      accesses, so "LOAD x, ADD one, STORE x" on two CPUs can lose an update.
+    - The synchronization opcodes below run under one lock shared by every CPU, so they are
+      sequentially consistent with each other. Taking the lock is also a full memory barrier:
+      words written before an UNLOCK are visible to a CPU once its LOCK on that address succeeds.
+
+Synchronization opcodes:
+    50 FETCHADD: Adds the accumulator to a word and loads the word's old value into the accumulator.
+    51 LOCK: Sets a word from 0 to 1, or repeats (spins) until it can. Locks are not
+             re-entrant: locking a word the CPU already holds is an error.
+    52 UNLOCK: Stores 0 in a word.
+
+A CPU that reaches HALT while holding a lock stops with an error, and any locks a CPU still
+holds when it stops for whatever reason are released, so the other CPUs cannot spin forever.
+"""
+import asyncio
+import multiprocessing
+import queue
+import time
+from array import array
+from multiprocessing import shared_memory
+
+from batch_runner import BatchCPU, RunResult, run_to_completion, state_hash
+from input_handler import ScriptedInputHandler
+from memory import WORD_TYPECODE, Memory
+from tracing import span
+
+WORD_BYTES = 4
+
+FETCH_ADD = 50
+LOCK = 51
+UNLOCK = 52
+SYNC_OPCODE_NAMES = {FETCH_ADD: "FETCHADD", LOCK: "LOCK", UNLOCK: "UNLOCK"}
+SYNC_CYCLE_COSTS = {FETCH_ADD: 4, LOCK: 4, UNLOCK: 2}
+
+
+class SharedWordMemory(Memory):
+    """
+    A Memory whose words live in a `multiprocessing.shared_memory` block.
+
+    Change sets only see writes made through this process's object; other CPUs' writes are
+    not tracked.
+
+    Attributes:
+        max_size (int): The number of words.
+        memory (memoryview): The words, as signed 32 bit integers in the shared block.
+        lock: The lock that serializes synchronization operations across processes.
+        name (str): The shared block's name, used by other processes to attach to it.
+    """
+    def __init__(self, max_size, name=None, lock=None):
+        """
+        Creates a new zeroed shared block, or attaches to an existing one.
+
+        Args:
+            max_size (int): The number of words.
+            name (str): The name of an existing block to attach to, or None to create one.
+            lock: The lock shared with the other CPUs. A new lock is made when creating a block.
+
+        Raises:
+            ValueError: If attaching to a block without a lock.
+        """
+        if name is not None and lock is None:
+            raise ValueError("A lock is required to attach to shared memory")
+        self.max_size = max_size
+        self._block = shared_memory.SharedMemory(name=name, create=name is None, size=max_size * WORD_BYTES)
+        self._owner = name is None
+        self._bytes = self._block.buf[:max_size * WORD_BYTES]
+        if self._owner:
+            self._bytes[:] = bytes(len(self._bytes))
+        self.memory = self._bytes.cast(WORD_TYPECODE)
+        self.lock = lock if lock is not None else multiprocessing.Lock()
+        self._change_sets = []
+
+    @property
+    def name(self):
+        return self._block.name
+
+    def fetch_add(self, address, value, fit):
+        """
+        Atomically adds to a word.
+
+        Args:
+            address (int): The word to add to.
+            value (int): The amount to add.
+            fit: A callable bringing the sum into word range, such as `Accumulator.fit`.
+
+        Returns:
+            int: The word's value before the addition.
+        """
+        with self.lock:
+            old = self.memory[address]
+            self.memory[address] = fit(old + value)
+        self.mark_changed((address,))
+        return old
+
+    def test_and_set(self, address):
+        """
+        Atomically sets a word to 1 if it is 0.
+
+        Args:
+            address (int): The lock word.
+
+        Returns:
+            int: The word's value before the call; 0 means the lock was taken.
+        """
+        with self.lock:
+            old = self.memory[address]
+            if old == 0:
+                self.memory[address] = 1
+        if old == 0:
+            self.mark_changed((address,))
+        return old
+
+    def atomic_store(self, address, value):
+        """
+        Stores a word under the shared lock, ordering it after this CPU's earlier writes.
+
+        Args:
+            address (int): The word to store to.
+            value (int): The value to store.
+        """
+        with self.lock:
+            self.memory[address] = value
+        self.mark_changed((address,))
+
+    def close(self):
+        """
+        Detaches from the shared block, removing it if this object created it.
+        """
+        self.memory.release()
+        self._bytes.release()
+        self._block.close()
+        if self._owner:
+            self._block.unlink()
+
+
+class SharedCPU(BatchCPU):
+    """
+    A batch CPU that also executes the synchronization opcodes against a SharedWordMemory.
+
+    A LOCK that fails leaves the program counter where it is, so each retry is counted as an
+    instruction and costs cycles, as a spin loop would on real hardware.
+
+    Attributes:
+        held_locks (set of int): The lock words this CPU has taken and not yet released.
+    """
+    def __init__(self, memory, input_handler, overflow_policy="wrap"):
+        """
+        Initializes the CPU and adds the synchronization opcodes to its cycle costs.
+
+        Args:
+            memory (SharedWordMemory): The shared memory holding the program.
+            input_handler: An object for handling input asynchronously.
+            overflow_policy: How arithmetic results outside a 6 digit word are handled.
+        """
+        super().__init__(memory, input_handler, overflow_policy)
+        costs = list(self.cycle_costs)
+        for opcode, cost in SYNC_CYCLE_COSTS.items():
+            costs[opcode] = cost
+        self.cycle_costs = tuple(costs)
+        self.held_locks = set()
+
+    def execute_extended(self, opcode, operand):
+        """
+        Executes a synchronization instruction.
+
+        Args:
+            opcode (int): The opcode.
+            operand (int): The operand address.
+
+        Raises:
+            ValueError: If the opcode is invalid or the operand address is out of range.
+            RuntimeError: If the CPU tries to take a lock it already holds, which would spin forever.
+        """
+        if opcode not in SYNC_OPCODE_NAMES:
+            super().execute_extended(opcode, operand)
+        if operand >= self.memory.max_size:
+            raise ValueError(f"Invalid address '{operand}'. expected an address space less than {self.memory.max_size}")
+        if opcode == FETCH_ADD:
+            self.accumulator.value = self.memory.fetch_add(operand, self.accumulator.value, self.accumulator.fit)
+        elif opcode == LOCK:
+            if operand in self.held_locks:
+                raise RuntimeError(f"Re-entrant lock: the lock at address {operand} is already held by this CPU")
+            if self.memory.test_and_set(operand) != 0:
+                time.sleep(0)
+                return
+            self.held_locks.add(operand)
+        else:
+            self.memory.atomic_store(operand, 0)
+            self.held_locks.discard(operand)
+        self.program_counter += 1
+
+    def handle_halt(self):
+        """
+        Halts the program, unless it still holds a lock the other CPUs may be waiting for.
+
+        Raises:
+            ValueError: If the CPU holds a lock.
+        """
+        if self.held_locks:
+            raise ValueError(f"Program halted while holding the lock at address {min(self.held_locks)}")
+        super().handle_halt()
+
+    def release_locks(self):
+        """
+        Releases every lock this CPU still holds, so a CPU that stopped early cannot leave the
+        others spinning forever.
+        """
+        for address in self.held_locks:
+            self.memory.atomic_store(address, 0)
+        self.held_locks.clear()
+
+
+def _cpu_main(index, name, max_size, lock, entry_point, inputs, max_steps, overflow_policy, results):
+    """
+    Runs one CPU in a child process and reports its outcome on a queue.
+
+    Args:
+        index (int): The CPU's position in the entry point list.
+        name (str): The shared block's name.
+        max_size (int): The number of words.
+        lock: The lock shared by all CPUs.
+        entry_point (int): The address the CPU starts at.
+        inputs (list): The values supplied to this CPU's READ instructions.
+        max_steps (int): The most instructions to execute, or None for no limit.
+        overflow_policy (str): How arithmetic results outside a 6 digit word are handled.
+        results: A queue receiving (index, outputs, steps, cycles, error, accumulator, program_counter).
+    """
+    memory = SharedWordMemory(max_size, name=name, lock=lock)
+    try:
+        cpu = SharedCPU(memory, ScriptedInputHandler(inputs), overflow_policy)
+        cpu.program_counter = entry_point
+        error = None
+        try:
+            asyncio.run(run_to_completion(cpu, max_steps))
+        except Exception as e:
+            error = str(e)
+        cpu.release_locks()
+        results.put((index, cpu.outputs, cpu.instruction_count, cpu.cycles, error,
+                     cpu.accumulator.value, cpu.program_counter))
+    finally:
+        memory.close()
+
+
+def run_parallel(program, entry_points, inputs=None, memory_size=250, max_steps=None, overflow_policy="wrap"):
+    """
+    Loads a program into shared memory and runs one CPU process per entry point until all stop.
+
+    Args:
+        program (list of str): The program, including every CPU's code and shared data.
+        entry_points (list of int): The address each CPU starts at.
+        inputs (list of list): The READ inputs for each CPU, defaults to none.
+        memory_size (int): The number of words, defaults to 250.
+        max_steps (int): The most instructions each CPU may execute, or None for no limit.
+        overflow_policy (str): How arithmetic results outside a 6 digit word are handled.
+
+    Returns:
+        tuple: A RunResult per CPU, in entry point order, and the final memory words. Each
+            state hash covers the final shared memory and that CPU's own registers.
+
+    Raises:
+        ValueError: If the program is invalid or no entry points are given.
+        RuntimeError: If a CPU process dies without reporting a result.
+    """
+    if not entry_points:
+        raise ValueError("At least one entry point is required")
+    inputs = inputs or [[] for _ in entry_points]
+    memory = SharedWordMemory(memory_size)
+    try:
+        memory.load_program(program)
+        results = multiprocessing.Queue()
+        processes = [multiprocessing.Process(
+            target=_cpu_main,
+            args=(index, memory.name, memory_size, memory.lock, entry_point, list(inputs[index]),
+                  max_steps, overflow_policy, results))
+            for index, entry_point in enumerate(entry_points)]
+        with span("run_parallel", cpus=len(processes)):
+            for process in processes:
+                process.start()
+            reports = {}
+            while len(reports) < len(processes):
+                try:
+                    report = results.get(timeout=0.1)
+                except queue.Empty:
+                    if not any(process.is_alive() for process in processes) and results.empty():
+                        break
+                    continue
+                reports[report[0]] = report
+            for process in processes:
+                process.join()
+        if len(reports) < len(processes):
+            raise RuntimeError("A CPU process exited without reporting a result")
+        words = list(memory.memory)
+    finally:
+        memory.close()
+
+    final_memory = Memory(memory_size)
+    final_memory.memory = array(WORD_TYPECODE, words)
+    final_cpu = BatchCPU(final_memory, ScriptedInputHandler(()))
+    run_results = []
+    for index in range(len(entry_points)):
+        _, outputs, steps, cycles, error, accumulator, program_counter = reports[index]
+        final_cpu.accumulator.value = accumulator
+        final_cpu.program_counter = program_counter
+        run_results.append(RunResult(outputs, steps, state_hash(final_cpu), error, cycles))
+    return run_results, words
@@ -0,0 +1,350 @@
+"""
+Sampling profiler for BasicML programs, run this file with a program path to profile it.
+
+Instead of tracing every step, the program counter is sampled every N instructions or on
+a wall clock timer. Samples are attributed to basic blocks and loops found by following
+the program's control flow from address 0, and reported as collapsed stacks (for
+flamegraph.pl), a speedscope profile, or a heat listing aligned with the program source.
+"""
+import argparse
+import asyncio
+import json
+import threading
+import time
+
+BRANCH = 40
+BRANCH_NEG = 41
+BRANCH_ZERO = 42
+HALT = 43
+VALID_OPCODES = {10, 11, 20, 21, 30, 31, 32, 33, BRANCH, BRANCH_NEG, BRANCH_ZERO, HALT}
+
+
+class ControlFlow:
+    """
+    The basic blocks and loops of a program image.
+
+    Attributes:
+        blocks (list of tuple): (start, end) address ranges, end inclusive, in address order.
+        loops (list of tuple): (header, end) address ranges from backward branches, outermost first.
+    """
+    def __init__(self, words):
+        """
+        Finds the blocks and loops reachable from address 0.
+
+        Args:
+            words (list of int): The memory image.
+        """
+        size = len(words)
+        reachable = set()
+        leaders = {0}
+        loop_ends = {}
+        pending = [0]
+        while pending:
+            address = pending.pop()
+            if address in reachable or not 0 <= address < size:
+                continue
+            reachable.add(address)
+            opcode, operand = divmod(words[address], 1000)
+            if opcode not in VALID_OPCODES:
+                continue
+            if opcode in (BRANCH, BRANCH_NEG, BRANCH_ZERO):
+                leaders.add(operand)
+                leaders.add(address + 1)
+                pending.append(operand)
+                if operand <= address:
+                    loop_ends[operand] = max(loop_ends.get(operand, address), address)
+                if opcode != BRANCH:
+                    pending.append(address + 1)
+            elif opcode == HALT:
+                leaders.add(address + 1)
+            else:
+                pending.append(address + 1)
+
+        self.blocks = []
+        start = None
+        for address in sorted(reachable):
+            if start is not None and (address in leaders or address != previous + 1):
+                self.blocks.append((start, previous))
+                start = None
+            if start is None:
+                start = address
+            previous = address
+        if start is not None:
+            self.blocks.append((start, previous))
+
+        self.loops = sorted(loop_ends.items(), key=lambda loop: (loop[0], -loop[1]))
+        self._block_of = {}
+        for start, end in self.blocks:
+            for address in range(start, end + 1):
+                self._block_of[address] = (start, end)
+
+    def block_of(self, address):
+        """
+        Returns the basic block containing an address.
+
+        Args:
+            address (int): The address.
+
+        Returns:
+            tuple: The block's (start, end), or (address, address) if it was not reached statically.
+        """
+        return self._block_of.get(address, (address, address))
+
+    def stack_of(self, address):
+        """
+        Returns the frames a sample at an address belongs to, outermost first.
+
+        Args:
+            address (int): The sampled address.
+
+        Returns:
+            list of str: Loop frames from outer to inner, then the block frame.
+        """
+        frames = [f"loop@{header:03}-{end:03}" for header, end in self.loops if header <= address <= end]
+        start, end = self.block_of(address)
+        frames.append(f"block@{start:03}-{end:03}")
+        return frames
+
+
+class Profile:
+    """
+    Sample counts per address together with the program's control flow.
+
+    Attributes:
+        counts (list of int): The number of samples taken at each address.
+        words (list of int): The memory image when profiling started.
+        flow (ControlFlow): The blocks and loops of that image.
+        name (str): The profile name used in reports.
+    """
+    def __init__(self, counts, words, name="program"):
+        self.counts = counts
+        self.words = words
+        self.flow = ControlFlow(words)
+        self.name = name
+
+    @property
+    def total(self):
+        """
+        The total number of samples.
+        """
+        return sum(self.counts)
+
+    def stacks(self):
+        """
+        Aggregates samples by stack.
+
+        Returns:
+            dict: Maps a tuple of frame names to its sample count.
+        """
+        stacks = {}
+        for address, count in enumerate(self.counts):
+            if count:
+                stack = tuple([self.name] + self.flow.stack_of(address))
+                stacks[stack] = stacks.get(stack, 0) + count
+        return stacks
+
+    def collapsed(self):
+        """
+        Formats the samples as collapsed stacks, one "frame;frame;frame count" line per stack.
+
+        Returns:
+            str: Text readable by flamegraph.pl and speedscope.
+        """
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in sorted(self.stacks().items()))
+
+    def speedscope(self):
+        """
+        Builds a speedscope "sampled" profile.
+
+        Returns:
+            dict: The profile, ready for `json.dump`.
+        """
+        frames = []
+        frame_index = {}
+        samples = []
+        weights = []
+        for stack, count in sorted(self.stacks().items()):
+            indexes = []
+            for frame in stack:
+                if frame not in frame_index:
+                    frame_index[frame] = len(frames)
+                    frames.append({"name": frame})
+                indexes.append(frame_index[frame])
+            samples.append(indexes)
+            weights.append(count)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": frames},
+            "profiles": [{"type": "sampled", "name": self.name, "unit": "none",
+                          "startValue": 0, "endValue": sum(weights),
+                          "samples": samples, "weights": weights}],
+            "name": self.name,
+        }
+
+    def heat_listing(self, source_lines=None, width=40):
+        """
+        Formats a per-address listing with sample counts, aligned with the program source.
+
+        Args:
+            source_lines (list of str): The program's source lines, defaults to the memory words.
+            width (int): The width of the longest bar, defaults to 40.
+
+        Returns:
+            str: One line per source line or sampled address.
+        """
+        total = self.total or 1
+        peak = max(self.counts) or 1
+        last = max([len(source_lines or [])] + [address + 1 for address, count in enumerate(self.counts) if count])
+        lines = []
+        for address in range(last):
+            if source_lines is not None and address < len(source_lines):
+                source = source_lines[address]
+            else:
+                source = f"{self.words[address]:+07d}"
+            count = self.counts[address]
+            bar = "#" * round(width * count / peak)
+            lines.append(f"{address:03}  {source:<8} {count:8} {100 * count / total:6.1f}%  {bar}")
+        return "\n".join(lines) + "\n"
+
+
+class SamplingProfiler:
+    """
+    Runs a CPU to completion while sampling its program counter.
+
+    Attributes:
+        cpu: The CPU to profile, with a program loaded.
+        every (int): Sample once every this many instructions, or None for timer sampling.
+        seconds (float): Sample on a timer with this period when `every` is None.
+        counts (list of int): The number of samples taken at each address.
+    """
+    def __init__(self, cpu, every=100, seconds=0.001):
+        """
+        Initializes the profiler.
+
+        Args:
+            cpu: The CPU to profile.
+            every (int): Instructions between samples, defaults to 100. Pass None to sample
+                on a timer instead.
+            seconds (float): The timer period when `every` is None, defaults to 1 ms.
+
+        Raises:
+            ValueError: If the sampling period is not positive.
+        """
+        if (every is not None and every < 1) or (every is None and seconds <= 0):
+            raise ValueError("The sampling period must be positive")
+        self.cpu = cpu
+        self.every = every
+        self.seconds = seconds
+        self.counts = [0] * cpu.memory.max_size
+        self._words = list(cpu.memory.memory)
+
+    async def run(self):
+        """
+        Executes the program until it halts, taking samples as it goes.
+        """
+        if self.every is None:
+            await self._run_timed()
+        else:
+            await self._run_counted()
+
+    def profile(self, name="program"):
+        """
+        Returns the samples collected so far.
+
+        Args:
+            name (str): The profile name used in reports, defaults to "program".
+
+        Returns:
+            Profile: The samples and the program's control flow.
+        """
+        return Profile(list(self.counts), self._words, name)
+
+    async def _run_counted(self):
+        """
+        Samples the address of every Nth instruction executed.
+        """
+        cpu = self.cpu
+        counts = self.counts
+        every = self.every
+        max_size = cpu.memory.max_size
+        countdown = every
+        while cpu.program_counter < max_size:
+            countdown -= 1
+            if not countdown:
+                countdown = every
+                counts[cpu.program_counter] += 1
+            await cpu.execute_instruction()
+
+    async def _run_timed(self):
+        """
+        Samples the program counter from a background thread on a timer.
+        """
+        cpu = self.cpu
+        counts = self.counts
+        max_size = cpu.memory.max_size
+        stop = threading.Event()
+
+        def sample():
+            while not stop.wait(self.seconds):
+                address = cpu.program_counter
+                if address < max_size:
+                    counts[address] += 1
+
+        sampler = threading.Thread(target=sample, daemon=True)
+        sampler.start()
+        try:
+            while cpu.program_counter < max_size:
+                await cpu.execute_instruction()
+        finally:
+            stop.set()
+            sampler.join()
+
+
+def main():
+    """
+    Profiles the program named on the command line and writes the requested reports.
+    """
+    from cpu import CPU
+    from input_handler import CLIInputHandler, ScriptedInputHandler
+    from memory import Memory
+
+    parser = argparse.ArgumentParser(description="Profile a BasicML program.")
+    parser.add_argument("program", help="the program file")
+    parser.add_argument("--inputs", help="comma separated READ inputs; prompts if omitted")
+    parser.add_argument("--every", type=int, default=100, help="instructions between samples")
+    parser.add_argument("--timer", type=float, help="sample every this many seconds instead")
+    parser.add_argument("--collapsed", help="write collapsed stacks to this file")
+    parser.add_argument("--speedscope", help="write a speedscope profile to this file")
+    args = parser.parse_args()
+
+    with open(args.program, 'r') as file:
+        program = [line.strip() for line in file.readlines()]
+    memory = Memory(max_size=250)
+    memory.load_program(program)
+    if args.inputs is not None:
+        input_handler = ScriptedInputHandler(args.inputs.split(","))
+    else:
+        input_handler = CLIInputHandler()
+    cpu = CPU(memory, input_handler, output_callback=print)
+
+    profiler = SamplingProfiler(cpu, every=None if args.timer else args.every, seconds=args.timer or 0.001)
+    start = time.perf_counter()
+    try:
+        asyncio.run(profiler.run())
+    except Exception as e:
+        print(f"Error during execution: {e}")
+    elapsed = time.perf_counter() - start
+
+    profile = profiler.profile(args.program)
+    print(f"\n{profile.total} samples in {elapsed:.3f} s\n")
+    print(profile.heat_listing(program), end="")
+    if args.collapsed:
+        with open(args.collapsed, 'w') as file:
+            file.write(profile.collapsed())
+    if args.speedscope:
+        with open(args.speedscope, 'w') as file:
+            json.dump(profile.speedscope(), file)
+
+
+if __name__ == "__main__":
+    main()
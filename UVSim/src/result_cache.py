@@ -0,0 +1,161 @@
+"""
+Content addressed cache of program results, keyed by memory image and input sequence.
+
+BasicML programs are deterministic given their READ inputs, so a result can be reused
+whenever the same image is run with the same inputs and settings.
+"""
+import hashlib
+import json
+import sqlite3
+from collections import OrderedDict
+
+from batch_runner import RunResult, run_program
+
+
+def make_key(memory, inputs=(), max_steps=None, overflow_policy="wrap"):
+    """
+    Builds the cache key for running a loaded memory image with a sequence of inputs.
+
+    Args:
+        memory: The memory object holding the loaded program.
+        inputs (iterable): The values supplied to READ instructions, in order.
+        max_steps (int): The step budget for the run, or None for no limit.
+        overflow_policy (str): The overflow policy used by the accumulator.
+
+    Returns:
+        str: A hex SHA-256 digest identifying the run.
+    """
+    digest = hashlib.sha256()
+    digest.update(" ".join(map(str, memory.memory)).encode())
+    digest.update(b"|")
+    # JSON keeps input boundaries, so ["1 2"] and ["1", "2"] get different keys
+    digest.update(json.dumps([str(value) for value in inputs]).encode())
+    digest.update(f"|{max_steps}|{overflow_policy}".encode())
+    return digest.hexdigest()
+
+
+def _copy(result):
+    """
+    Copies a result, so callers can change its outputs without changing the cached one.
+    """
+    return RunResult(list(result.outputs), result.steps, result.state_hash, result.error, result.cycles)
+
+
+class ResultCache:
+    """
+    A two tier result cache: a bounded in-memory LRU in front of an optional SQLite file.
+
+    Attributes:
+        max_entries (int): The most results kept in memory.
+        path (str): The SQLite database path, or None for an in-memory cache only.
+        hits (int): The number of lookups that found a result.
+        misses (int): The number of lookups that did not.
+    """
+    def __init__(self, max_entries=1024, path=None):
+        """
+        Initializes the cache, creating the SQLite table if a path is given.
+
+        Args:
+            max_entries (int): The most results kept in memory, defaults to 1024.
+            path (str): The SQLite database path, defaults to None.
+
+        Raises:
+            ValueError: If max_entries is less than 1.
+        """
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+        self.max_entries = max_entries
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._connection = None
+        if path is not None:
+            self._connection = sqlite3.connect(path)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            self._connection.commit()
+
+    def get(self, key):
+        """
+        Looks up a result, promoting on-disk results into the in-memory tier.
+
+        Args:
+            key (str): A key built by `make_key`.
+
+        Returns:
+            RunResult: A copy of the cached result, or None if there is none.
+        """
+        result = self._entries.get(key)
+        if result is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return _copy(result)
+        if self._connection is not None:
+            row = self._connection.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                result = RunResult.from_dict(json.loads(row[0]))
+                self._remember(key, result)
+                self.hits += 1
+                return _copy(result)
+        self.misses += 1
+        return None
+
+    def put(self, key, result):
+        """
+        Stores a copy of a result in both tiers.
+
+        Args:
+            key (str): A key built by `make_key`.
+            result (RunResult): The result to store.
+        """
+        self._remember(key, _copy(result))
+        if self._connection is not None:
+            self._connection.execute("INSERT OR REPLACE INTO results (key, value) VALUES (?, ?)",
+                                     (key, json.dumps(result.to_dict())))
+            self._connection.commit()
+
+    def run(self, memory, inputs=(), max_steps=None, overflow_policy="wrap"):
+        """
+        Returns the cached result for a run, executing the program only on a miss.
+
+        Args:
+            memory: The memory object holding the loaded program. It is only modified on a miss.
+            inputs (iterable): The values supplied to READ instructions, in order.
+            max_steps (int): The most instructions to execute, or None for no limit.
+            overflow_policy (str): How arithmetic results outside a 6 digit word are handled.
+
+        Returns:
+            RunResult: The program's outputs, step count and final state hash.
+        """
+        inputs = list(inputs)
+        key = make_key(memory, inputs, max_steps, overflow_policy)
+        result = self.get(key)
+        if result is None:
+            result = run_program(memory, inputs, max_steps, overflow_policy)
+            self.put(key, result)
+        return result
+
+    def close(self):
+        """
+        Closes the SQLite connection, if there is one.
+        """
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def _remember(self, key, result):
+        """
+        Adds a result to the in-memory tier, evicting the least recently used if full.
+
+        Args:
+            key (str): The result's key.
+            result (RunResult): The result to keep.
+        """
+        self._entries[key] = result
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,125 @@
+"""
+Bounded line buffer for console output, with optional spill to disk
+"""
+from collections import deque
+from itertools import islice
+
+
+class ScrollbackBuffer:
+    """
+    Keeps the most recent lines of console output in a fixed size ring buffer.
+
+    Appending costs the same no matter how long the session runs. Lines that fall out of
+    the buffer are lost unless a spill file is given, in which case every line is also
+    written there.
+
+    Attributes:
+        max_lines (int): The most lines kept in memory.
+        total_lines (int): The number of lines appended since the buffer was created or cleared.
+        spill_path (str): The file every line is also written to, or None.
+    """
+    def __init__(self, max_lines=5000, spill_path=None):
+        """
+        Initializes an empty buffer.
+
+        Args:
+            max_lines (int): The most lines kept in memory, defaults to 5000.
+            spill_path (str): A file to append every line to, defaults to None.
+
+        Raises:
+            ValueError: If max_lines is less than 1.
+        """
+        if max_lines < 1:
+            raise ValueError("max_lines must be at least 1")
+        self.max_lines = max_lines
+        self.total_lines = 0
+        self.spill_path = spill_path
+        self._lines = deque(maxlen=max_lines)
+        self._spill_file = open(spill_path, 'a') if spill_path is not None else None
+
+    @property
+    def first_line_number(self):
+        """
+        The line number of the oldest line still in memory, counting from 0.
+        """
+        return self.total_lines - len(self._lines)
+
+    def append(self, text):
+        """
+        Appends text, which may hold several lines.
+
+        Args:
+            text (str): The text to append. A trailing newline does not add an empty line.
+        """
+        lines = text.split("\n")
+        if len(lines) > 1 and lines[-1] == "":
+            lines.pop()
+        self._lines.extend(lines)
+        self.total_lines += len(lines)
+        if self._spill_file is not None:
+            self._spill_file.write("\n".join(lines) + "\n")
+
+    def lines(self, start=None):
+        """
+        Returns the lines in memory, optionally only those from a given line number on.
+
+        Args:
+            start (int): The first line number wanted, defaults to the oldest in memory.
+
+        Returns:
+            list of str: The lines, oldest first.
+        """
+        skip = 0 if start is None else max(0, start - self.first_line_number)
+        if skip == 0:
+            return list(self._lines)
+        if skip >= len(self._lines):
+            return []
+        # Walk from the newer end, which is shorter when only recent lines are wanted
+        recent = list(islice(reversed(self._lines), len(self._lines) - skip))
+        recent.reverse()
+        return recent
+
+    def search(self, query, case_sensitive=False):
+        """
+        Finds the lines in memory containing some text.
+
+        Args:
+            query (str): The text to look for.
+            case_sensitive (bool): Whether case must match, defaults to False.
+
+        Returns:
+            list of int: The line numbers of matching lines, oldest first.
+        """
+        if not case_sensitive:
+            query = query.lower()
+        first = self.first_line_number
+        return [first + index for index, line in enumerate(self._lines)
+                if query in (line if case_sensitive else line.lower())]
+
+    def clear(self):
+        """
+        Empties the in-memory buffer. Lines already spilled to disk are kept.
+        """
+        self._lines.clear()
+        self.total_lines = 0
+
+    def flush(self):
+        """
+        Flushes the spill file so it holds the full log.
+        """
+        if self._spill_file is not None:
+            self._spill_file.flush()
+
+    def close(self):
+        """
+        Closes the spill file, if there is one.
+        """
+        if self._spill_file is not None:
+            self._spill_file.close()
+            self._spill_file = None
+
+    def __len__(self):
+        return len(self._lines)
+
+    def __getitem__(self, index):
+        return self._lines[index]
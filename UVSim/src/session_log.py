@@ -0,0 +1,333 @@
+"""
+Record and replay of interactive sessions, run this file with a session log to replay it.
+
+The GUI records every program load, run start, run end and console input into a
+SessionRecorder. The log is a short header followed by the events as zlib compressed JSON,
+so a session with a few loads costs about as much as its program text. Replay runs the same
+loads and runs headlessly and at full speed, answering each run's READs from the inputs
+typed during it through a ScriptedInputHandler, and reports each run's results and wall time.
+
+Each Step or Continue in the GUI debugger is recorded as a debugger run, ended by the
+number of instructions it ran. Replay runs the same number of instructions from where the
+program stopped, so breakpoints need not be recorded.
+
+Replay runs one event at a time, so a run that was still going when the program was
+reloaded or run again cannot be reproduced. Such runs are reported as overlapped.
+
+Set UVSIM_RECORD to a path prefix to record GUI sessions: when the GUI exits, each tab's
+session is written to the prefix followed by a dot and the tab number.
+"""
+import argparse
+import asyncio
+import json
+import os
+import struct
+import sys
+import time
+import zlib
+
+from batch_runner import BatchCPU, RunResult, run_to_completion, state_hash
+from input_handler import ScriptedInputHandler
+from memory import Memory
+
+MAGIC = b"UVSR"
+FORMAT_VERSION = 1
+RECORD_ENVIRONMENT_VARIABLE = "UVSIM_RECORD"
+DEFAULT_MAX_STEPS = 1000000
+
+LOAD = "load"
+RUN = "run"
+DEBUG = "debug"
+INPUT = "input"
+DONE = "done"
+
+# magic, version, memory size
+_HEADER = struct.Struct("<4sBH")
+
+
+class SessionRecorder:
+    """
+    Collects the loads, runs and inputs of one interactive session.
+
+    Attributes:
+        memory_size (int): The size of the session's memory.
+        events (list of list): [milliseconds since the session started, kind, data] per event.
+    """
+    __slots__ = ("memory_size", "events", "_start")
+
+    def __init__(self, memory_size=100):
+        """
+        Starts an empty session.
+
+        Args:
+            memory_size (int): The size of the session's memory, defaults to the GUI's 100.
+        """
+        self.memory_size = memory_size
+        self.events = []
+        self._start = time.perf_counter()
+
+    def _add(self, kind, data=None):
+        elapsed = int((time.perf_counter() - self._start) * 1000)
+        self.events.append([elapsed, kind, data])
+
+    def record_load(self, instructions):
+        """
+        Records a program load or reload.
+
+        Args:
+            instructions (list of str): The program's instructions.
+        """
+        self._add(LOAD, list(instructions))
+
+    def record_run(self):
+        """
+        Records the start of a run.
+        """
+        self._add(RUN)
+
+    def record_debug(self, restart):
+        """
+        Records the start of a debugger Step or Continue.
+
+        Args:
+            restart (bool): Whether the debugger restarted a finished program from address 0.
+        """
+        self._add(DEBUG, restart)
+
+    def record_done(self, attempts=None):
+        """
+        Records the end of a run, whether it halted or stopped with an error.
+
+        Args:
+            attempts (int): For debugger runs, the instructions started, including one that
+                failed. None for other runs.
+        """
+        self._add(DONE, attempts)
+
+    def record_input(self, value):
+        """
+        Records a value typed in answer to a READ.
+
+        Args:
+            value (str): The text submitted.
+        """
+        self._add(INPUT, value)
+
+    def to_bytes(self):
+        """
+        Serializes the session.
+
+        Returns:
+            bytes: The header followed by the compressed events.
+        """
+        events = json.dumps(self.events, separators=(",", ":")).encode()
+        return _HEADER.pack(MAGIC, FORMAT_VERSION, self.memory_size) + zlib.compress(events, 9)
+
+    def save(self, path):
+        """
+        Writes the session log to a file.
+
+        Args:
+            path (str): The file to write.
+        """
+        with open(path, 'wb') as file:
+            file.write(self.to_bytes())
+
+
+def save_from_environment(recorder, instance_number):
+    """
+    Writes a GUI tab's session log if UVSIM_RECORD is set.
+
+    Args:
+        recorder (SessionRecorder): The tab's session.
+        instance_number (int): The tab number, appended to the path prefix.
+
+    Returns:
+        str: The file written, or None if the variable is not set.
+    """
+    prefix = os.environ.get(RECORD_ENVIRONMENT_VARIABLE)
+    if not prefix:
+        return None
+    path = f"{prefix}.{instance_number}"
+    recorder.save(path)
+    return path
+
+
+def load_log(data):
+    """
+    Reads a session log.
+
+    Args:
+        data (bytes): The output of `SessionRecorder.to_bytes`.
+
+    Returns:
+        SessionRecorder: The recorded session.
+
+    Raises:
+        ValueError: If the data is not a session log or has an unsupported version.
+    """
+    if len(data) < _HEADER.size or data[:4] != MAGIC:
+        raise ValueError("Not a UVSim session log")
+    _, version, memory_size = _HEADER.unpack_from(data)
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported session log version {version}")
+    session = SessionRecorder(memory_size)
+    session.events = json.loads(zlib.decompress(data[_HEADER.size:]))
+    return session
+
+
+def _group_runs(events):
+    """
+    Pairs each run with the inputs submitted while it was in flight, and finds the runs that
+    overlapped a load or another run.
+
+    Args:
+        events (list of list): The recorded events.
+
+    Returns:
+        list of list: [LOAD, instructions] steps, and [RUN or DEBUG, inputs, overlapped,
+            start data, done data] steps. The done data is None if the run never ended.
+    """
+    steps = []
+    in_flight = []
+    for _, kind, data in events:
+        if kind == INPUT:
+            if in_flight:
+                in_flight[-1][1].append(data)
+        elif kind == DONE:
+            if in_flight:
+                in_flight.pop(0)[4] = data
+        else:
+            step = [kind, data] if kind == LOAD else [kind, [], bool(in_flight), data, None]
+            for run in in_flight:
+                run[2] = True
+            if kind != LOAD:
+                in_flight.append(step)
+            steps.append(step)
+    return steps
+
+
+async def _run_attempts(cpu, attempts, max_steps):
+    """
+    Executes a debugger run again: the recorded number of instructions, from where the
+    program stopped.
+
+    Args:
+        cpu: The CPU to run.
+        attempts (int): The instructions the debugger started, or None if the run never
+            ended, in which case the run goes on until the program stops.
+        max_steps (int): The most instructions to execute, or None for no limit.
+
+    Raises:
+        RuntimeError: If `max_steps` instructions run before the recorded number does.
+    """
+    limit = attempts
+    if max_steps is not None and (limit is None or limit > max_steps):
+        limit = max_steps
+    max_size = cpu.memory.max_size
+    started = 0
+    while cpu.program_counter < max_size and (limit is None or started < limit):
+        started += 1
+        await cpu.execute_instruction()
+    if cpu.program_counter < max_size and limit != attempts:
+        raise RuntimeError(f"Step budget of {max_steps} instructions exceeded")
+
+
+async def replay_async(session, max_steps=DEFAULT_MAX_STEPS):
+    """
+    Replays a session on the caller's event loop.
+
+    Loads behave as in the GUI: the first successful load writes the program, later ones
+    patch memory and reset the CPU, and a failed load changes nothing. Each run starts at
+    address 0 with the registers and memory the previous run left, and runs to completion
+    before the next event is replayed, so runs that overlapped in the GUI are flagged rather
+    than reproduced. Debugger runs continue from where the program stopped, unless the
+    debugger restarted it, and run as many instructions as they did in the GUI.
+
+    Args:
+        session (SessionRecorder): The recorded session.
+        max_steps (int): The most instructions per run, defaults to DEFAULT_MAX_STEPS. None
+            means no limit.
+
+    Returns:
+        list of dict: One entry per run, with the `RunResult` fields for that run alone, its
+            wall time in seconds, "run" or "debug" under "kind", and whether a load or another
+            run started before it ended under "overlapped".
+    """
+    memory = Memory(session.memory_size)
+    cpu = BatchCPU(memory, ScriptedInputHandler(()))
+    is_loaded = False
+    runs = []
+    for step in _group_runs(session.events):
+        kind, data = step[0], step[1]
+        if kind == LOAD:
+            try:
+                if not is_loaded:
+                    memory.load_program(data)
+                else:
+                    memory.patch_program(data)
+            except ValueError:
+                continue
+            if is_loaded:
+                cpu.reset()
+            is_loaded = True
+            continue
+        overlapped, restart, attempts = step[2], step[3], step[4]
+        if kind == RUN or restart:
+            cpu.program_counter = 0
+        cpu.input_handler = ScriptedInputHandler(data)
+        cpu.outputs = []
+        steps, cycles = cpu.instruction_count, cpu.cycles
+        error = None
+        start = time.perf_counter()
+        try:
+            if kind == RUN:
+                await run_to_completion(cpu, None if max_steps is None else steps + max_steps)
+            else:
+                await _run_attempts(cpu, attempts, max_steps)
+        except Exception as e:
+            error = str(e)
+        wall_time = time.perf_counter() - start
+        result = RunResult(cpu.outputs, cpu.instruction_count - steps, state_hash(cpu), error, cpu.cycles - cycles)
+        runs.append(dict(result.to_dict(), wall_time=wall_time, kind=kind, overlapped=overlapped))
+    return runs
+
+
+def replay(session, max_steps=DEFAULT_MAX_STEPS):
+    """
+    Replays a session in a new event loop.
+
+    Args:
+        session (SessionRecorder): The recorded session.
+        max_steps (int): The most instructions per run, defaults to DEFAULT_MAX_STEPS. None
+            means no limit.
+
+    Returns:
+        list of dict: One entry per run, as from `replay_async`.
+    """
+    return asyncio.run(replay_async(session, max_steps))
+
+
+def main():
+    """
+    Replays the session logs named on the command line, printing one JSON line per run.
+    """
+    parser = argparse.ArgumentParser(description="Replay recorded UVSim GUI sessions.")
+    parser.add_argument("logs", nargs="+", help="session log files")
+    parser.add_argument("--max-steps", type=int, default=DEFAULT_MAX_STEPS,
+                        help=f"the step budget per run, defaults to {DEFAULT_MAX_STEPS}")
+    args = parser.parse_args()
+
+    status = 0
+    for path in args.logs:
+        with open(path, 'rb') as file:
+            session = load_log(file.read())
+        for number, run in enumerate(replay(session, args.max_steps)):
+            print(json.dumps(dict(run, log=path, run=number)))
+            if run["error"] is not None:
+                status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
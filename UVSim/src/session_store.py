@@ -0,0 +1,133 @@
+"""
+Compact snapshots of idle sessions, so a host can keep thousands of them out of live objects.
+
+A snapshot holds the CPU registers, counters and memory words. Memory is zlib compressed, so
+a mostly empty memory costs only a few bytes. Input handlers and output callbacks are not
+saved; they are supplied again when the session is restored.
+"""
+import struct
+import sys
+import tracemalloc
+import zlib
+from array import array
+
+from accumulator import OVERFLOW_POLICIES
+from cpu import CPU
+from cycle_model import OPCODE_COUNT, build_cost_table
+from input_handler import ScriptedInputHandler
+from memory import WORD_TYPECODE, Memory
+
+MAGIC = b"UVSS"
+FORMAT_VERSION = 1
+
+# The measured size of a live 250 word session must stay under this many bytes
+SESSION_BYTES_TARGET = 2048
+
+_HAS_INSTRUCTION = 1
+_CUSTOM_COSTS = 2
+
+# magic, version, flags, overflow policy, memory size, accumulator, program counter,
+# instruction register, instruction count, cycles
+_HEADER = struct.Struct("<4sBBBHiiiqq")
+
+
+def _little_endian(words):
+    """
+    Returns words in little endian byte order, whatever the host's order is.
+
+    Args:
+        words (array): The words to convert, modified when the host is big endian.
+
+    Returns:
+        array: The same array.
+    """
+    if sys.byteorder == "big":
+        words.byteswap()
+    return words
+
+
+def save_session(cpu):
+    """
+    Serializes a CPU and its memory to a compact blob.
+
+    Args:
+        cpu: The CPU to save.
+
+    Returns:
+        bytes: The snapshot.
+    """
+    flags = 0
+    if cpu.instruction_register is not None:
+        flags |= _HAS_INSTRUCTION
+    payload = _little_endian(array(WORD_TYPECODE, cpu.memory.memory)).tobytes()
+    if cpu.cycle_costs is not build_cost_table():
+        flags |= _CUSTOM_COSTS
+        payload += _little_endian(array(WORD_TYPECODE, cpu.cycle_costs)).tobytes()
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, flags,
+                          OVERFLOW_POLICIES.index(cpu.accumulator.overflow_policy),
+                          cpu.memory.max_size, cpu.accumulator.value, cpu.program_counter,
+                          cpu.instruction_register or 0, cpu.instruction_count, cpu.cycles)
+    return header + zlib.compress(payload)
+
+
+def load_session(blob, input_handler, output_callback=None):
+    """
+    Rebuilds a CPU and its memory from a blob made by `save_session`.
+
+    Args:
+        blob (bytes): The snapshot.
+        input_handler: The input handler for the restored CPU.
+        output_callback: The output callback for the restored CPU, defaults to None.
+
+    Returns:
+        CPU: The restored CPU, ready to continue where it was saved.
+
+    Raises:
+        ValueError: If the blob is not a snapshot or was written by a newer version.
+    """
+    if len(blob) < _HEADER.size or blob[:4] != MAGIC:
+        raise ValueError("Not a UVSim session snapshot")
+    (_, version, flags, policy, max_size, accumulator, program_counter,
+     instruction_register, instruction_count, cycles) = _HEADER.unpack_from(blob)
+    if version > FORMAT_VERSION:
+        raise ValueError(f"Session snapshot version {version} is newer than supported version {FORMAT_VERSION}")
+    payload = array(WORD_TYPECODE)
+    payload.frombytes(zlib.decompress(blob[_HEADER.size:]))
+    _little_endian(payload)
+
+    memory = Memory(max_size)
+    memory.memory = payload[:max_size]
+    cpu = CPU(memory, input_handler, output_callback, OVERFLOW_POLICIES[policy])
+    if flags & _CUSTOM_COSTS:
+        cpu.cycle_costs = tuple(payload[max_size:max_size + OPCODE_COUNT])
+    cpu.accumulator.value = accumulator
+    cpu.program_counter = program_counter
+    cpu.instruction_register = instruction_register if flags & _HAS_INSTRUCTION else None
+    cpu.instruction_count = instruction_count
+    cpu.cycles = cycles
+    return cpu
+
+
+def session_footprint(sessions=1000, memory_size=250):
+    """
+    Measures the memory a live session (Memory, CPU and input handler) takes, on average.
+
+    Args:
+        sessions (int): The number of sessions to build for the measurement, defaults to 1000.
+        memory_size (int): The number of words per session, defaults to 250.
+
+    Returns:
+        float: The bytes allocated per session.
+    """
+    already_tracing = tracemalloc.is_tracing()
+    if not already_tracing:
+        tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        live = [CPU(Memory(memory_size), ScriptedInputHandler(())) for _ in range(sessions)]
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        if not already_tracing:
+            tracemalloc.stop()
+    del live
+    return (after - before) / sessions
@@ -0,0 +1,515 @@
+"""
+Local simulation server, run this file to serve BasicML programs over HTTP or a Unix socket.
+
+POST /run with a JSON body such as
+    {"program": ["+1007", "+1107", "+4300"], "inputs": [5], "max_steps": 1000, "stream": false}
+and the server replies with the run's result as JSON. With "stream": true the reply is
+NDJSON sent as it happens: one {"output": value} line per WRITE, then {"result": {...}}.
+
+Programs run on a warm pool of worker processes, each of which keeps its Memory and CPU
+between requests. Results are kept in a ResultCache, so a program run again with the same
+inputs and budget is answered without running it.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+
+from batch_runner import BatchCPU, RunResult, state_hash
+from memory import Memory
+from result_cache import ResultCache, make_key
+from simulator import Simulator
+
+STATUS_TEXT = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+
+class _StreamingCPU(BatchCPU):
+    """
+    A BatchCPU that can also send each WRITE value to the server as it happens.
+
+    Attributes:
+        connection: The pipe to send values on, or None when not streaming.
+    """
+    def __init__(self, memory, input_handler, overflow_policy="wrap"):
+        super().__init__(memory, input_handler, overflow_policy)
+        self.connection = None
+
+    def handle_write(self, address):
+        """
+        Records the value stored at a memory address and streams it if requested.
+
+        Args:
+            address: The memory address to read the value from.
+        """
+        value = self.memory.get_value(address)
+        self.outputs.append(value)
+        if self.connection is not None:
+            self.connection.send(("output", value))
+
+
+def _worker_main(connection, memory_size, overflow_policy):
+    """
+    Runs jobs sent over a pipe until it is closed, reusing one Memory and CPU throughout.
+
+    Args:
+        connection: The worker's end of the pipe.
+        memory_size (int): The number of words of memory.
+        overflow_policy (str): How arithmetic results outside a 6 digit word are handled.
+    """
+    simulator = Simulator(memory_size, overflow_policy, cpu_class=_StreamingCPU)
+    cpu = simulator.cpu
+    while True:
+        try:
+            job = connection.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+
+        # Reset the warm objects in place rather than building new ones
+        simulator.reset()
+        cpu.connection = connection if job["stream"] else None
+        try:
+            simulator.memory.load_program(job["program"])
+        except Exception as e:
+            result = RunResult([], 0, state_hash(cpu), str(e))
+        else:
+            result = simulator.run(job["inputs"], job["max_steps"])
+        connection.send(("done", result.to_dict()))
+    simulator.close()
+
+
+class _Worker:
+    """
+    The server's handle on one worker process.
+
+    Attributes:
+        process: The worker process.
+        connection: The server's end of the pipe to the worker.
+    """
+    def __init__(self, memory_size, overflow_policy):
+        self.connection, child_connection = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=_worker_main, args=(child_connection, memory_size, overflow_policy), daemon=True)
+        self.process.start()
+        child_connection.close()
+
+    def stop(self):
+        """
+        Asks the worker to exit and waits briefly for it.
+        """
+        try:
+            self.connection.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.connection.close()
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.terminate()
+
+
+class WorkerPool:
+    """
+    A fixed size pool of warm worker processes.
+
+    Attributes:
+        size (int): The number of worker processes.
+        memory_size (int): The number of words of memory per worker.
+        overflow_policy (str): How arithmetic results outside a 6 digit word are handled.
+    """
+    def __init__(self, size=2, memory_size=250, overflow_policy="wrap"):
+        """
+        Initializes the pool. Workers are started by `start`.
+
+        Args:
+            size (int): The number of worker processes, defaults to 2.
+            memory_size (int): The number of words of memory per worker, defaults to 250.
+            overflow_policy (str): The accumulator overflow policy, defaults to "wrap".
+        """
+        self.size = size
+        self.memory_size = memory_size
+        self.overflow_policy = overflow_policy
+        self._workers = []
+        self._idle = None
+        self._readers = set()
+
+    def start(self):
+        """
+        Starts the worker processes.
+        """
+        self._idle = asyncio.Queue()
+        for _ in range(self.size):
+            worker = _Worker(self.memory_size, self.overflow_policy)
+            self._workers.append(worker)
+            self._idle.put_nowait(worker)
+
+    async def run(self, program, inputs=(), max_steps=None, on_output=None):
+        """
+        Runs a program on the next idle worker, waiting for one if all are busy.
+
+        Args:
+            program (list of str): The program's instructions.
+            inputs (iterable): The values supplied to READ instructions, in order.
+            max_steps (int): The most instructions to execute, or None for no limit.
+            on_output: An optional coroutine function called with each WRITE value as it happens.
+
+        Returns:
+            RunResult: The program's outputs, step count and final state hash.
+
+        Raises:
+            RuntimeError: If the worker process died during the run. It is replaced.
+        """
+        worker = await self._idle.get()
+        try:
+            worker.connection.send({"program": list(program), "inputs": list(inputs),
+                                    "max_steps": max_steps, "stream": on_output is not None})
+        except BrokenPipeError:
+            await self._replace(worker)
+            raise RuntimeError("Worker process exited unexpectedly")
+
+        # The worker's messages are read by a separate task that always reads up to "done",
+        # so a caller that fails or is cancelled part way leaves the worker clean for reuse
+        messages = asyncio.Queue()
+        reader = asyncio.ensure_future(self._read_messages(worker, messages))
+        self._readers.add(reader)
+        reader.add_done_callback(self._readers.discard)
+        while True:
+            kind, value = await messages.get()
+            if kind == "done":
+                return RunResult.from_dict(value)
+            if kind == "exited":
+                raise RuntimeError("Worker process exited unexpectedly")
+            await on_output(value)
+
+    async def _read_messages(self, worker, messages):
+        """
+        Passes a job's messages from a worker to a queue, then returns the worker to the pool.
+
+        Args:
+            worker (_Worker): The worker running the job.
+            messages (asyncio.Queue): Receives each (kind, value) message, or ("exited", None)
+                if the worker died, in which case it is replaced.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                kind, value = await loop.run_in_executor(None, worker.connection.recv)
+            except (EOFError, BrokenPipeError):
+                messages.put_nowait(("exited", None))
+                await self._replace(worker)
+                return
+            messages.put_nowait((kind, value))
+            if kind == "done":
+                self._idle.put_nowait(worker)
+                return
+
+    async def _replace(self, worker):
+        """
+        Puts a new worker in the pool in place of a dead one.
+
+        Args:
+            worker (_Worker): The dead worker, stopped off the event loop.
+        """
+        self._workers.remove(worker)
+        replacement = _Worker(self.memory_size, self.overflow_policy)
+        self._workers.append(replacement)
+        self._idle.put_nowait(replacement)
+        await asyncio.get_running_loop().run_in_executor(None, worker.stop)
+
+    def close(self):
+        """
+        Stops every worker process.
+        """
+        for reader in list(self._readers):
+            reader.cancel()
+        for worker in self._workers:
+            worker.stop()
+        self._workers = []
+
+
+class SimulationServer:
+    """
+    A minimal HTTP/1.1 server that runs BasicML programs on a WorkerPool.
+
+    Attributes:
+        pool (WorkerPool): The pool that executes programs.
+        max_pending (int): The most requests queued or running at once; beyond this the
+            server answers 503 so clients back off.
+        max_steps (int): The largest instruction budget a request may ask for, also used
+            when a request gives none.
+        max_body (int): The largest accepted request body in bytes.
+        cache (ResultCache): Results of earlier runs, checked before running a job, or None.
+        pending (int): The number of requests currently queued or running.
+    """
+    def __init__(self, pool, max_pending=64, max_steps=1000000, max_body=1048576, cache=None):
+        """
+        Initializes the server.
+
+        Args:
+            pool (WorkerPool): A started worker pool.
+            max_pending (int): The request queue limit, defaults to 64.
+            max_steps (int): The instruction budget cap, defaults to 1000000.
+            max_body (int): The request body limit in bytes, defaults to 1 MiB.
+            cache (ResultCache): The result cache, defaults to None for no caching.
+        """
+        self.pool = pool
+        self.max_pending = max_pending
+        self.max_steps = max_steps
+        self.max_body = max_body
+        self.cache = cache
+        self.pending = 0
+
+    async def handle_connection(self, reader, writer):
+        """
+        Serves one request on a connection and then closes it.
+
+        Args:
+            reader: The connection's asyncio StreamReader.
+            writer: The connection's asyncio StreamWriter.
+        """
+        try:
+            await self._handle_request(reader, writer)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _handle_request(self, reader, writer):
+        """
+        Parses the request, validates the job and sends the reply.
+
+        Args:
+            reader: The connection's asyncio StreamReader.
+            writer: The connection's asyncio StreamWriter.
+        """
+        request_line = (await reader.readline()).decode("latin-1").split()
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode("latin-1").strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if len(request_line) < 2:
+            return await self._send_json(writer, 400, {"error": "Malformed request line"})
+        method, path = request_line[0], request_line[1]
+        if path != "/run":
+            return await self._send_json(writer, 404, {"error": f"Unknown path '{path}'"})
+        if method != "POST":
+            return await self._send_json(writer, 405, {"error": "Use POST"})
+
+        try:
+            length = int(headers.get("content-length", "0"))
+        except ValueError:
+            length = -1
+        if length < 0:
+            return await self._send_json(writer, 400, {"error": "Content-Length must be a non-negative integer"})
+        if length > self.max_body:
+            return await self._send_json(writer, 413, {"error": "Request body too large"})
+        try:
+            job = self._parse_job(await reader.readexactly(length))
+        except ValueError as e:
+            return await self._send_json(writer, 400, {"error": str(e)})
+
+        if self.pending >= self.max_pending:
+            return await self._send_json(writer, 503, {"error": "Server busy, try again later"})
+        self.pending += 1
+        try:
+            if job["stream"]:
+                await self._run_streaming(writer, job)
+            else:
+                result = await self._run_job(job)
+                await self._send_json(writer, 200, result.to_dict())
+        except RuntimeError as e:
+            await self._send_json(writer, 500, {"error": str(e)})
+        finally:
+            self.pending -= 1
+
+    def _parse_job(self, body):
+        """
+        Validates a request body.
+
+        Args:
+            body (bytes): The JSON request body.
+
+        Returns:
+            dict: The program, inputs, instruction budget and stream flag.
+
+        Raises:
+            ValueError: If the body is not a valid job.
+        """
+        try:
+            data = json.loads(body)
+        except json.JSONDecodeError:
+            raise ValueError("Request body must be JSON")
+        if not isinstance(data, dict) or not isinstance(data.get("program"), list):
+            raise ValueError("'program' must be a list of instructions")
+        inputs = data.get("inputs", [])
+        if not isinstance(inputs, list):
+            raise ValueError("'inputs' must be a list")
+        max_steps = data.get("max_steps", self.max_steps)
+        if not isinstance(max_steps, int) or max_steps < 1:
+            raise ValueError("'max_steps' must be a positive integer")
+        return {"program": [str(line).strip() for line in data["program"]],
+                "inputs": inputs,
+                "max_steps": min(max_steps, self.max_steps),
+                "stream": bool(data.get("stream", False))}
+
+    def _cache_key(self, job):
+        """
+        Builds a job's result cache key from the memory image its program loads.
+
+        Args:
+            job (dict): The validated job.
+
+        Returns:
+            str: The key, or None if there is no cache or the program does not load.
+        """
+        if self.cache is None:
+            return None
+        memory = Memory(self.pool.memory_size)
+        try:
+            memory.load_program(job["program"])
+        except ValueError:
+            return None
+        return make_key(memory, job["inputs"], job["max_steps"], self.pool.overflow_policy)
+
+    async def _run_job(self, job, on_output=None):
+        """
+        Returns a job's cached result, or runs it on the pool and caches the result.
+
+        Args:
+            job (dict): The validated job.
+            on_output: An async callable given each WRITE value, which a cached result
+                replays in order, or None.
+
+        Returns:
+            RunResult: The job's result.
+
+        Raises:
+            RuntimeError: If the worker running the job fails.
+        """
+        key = self._cache_key(job)
+        if key is not None:
+            result = self.cache.get(key)
+            if result is not None:
+                if on_output is not None:
+                    for value in result.outputs:
+                        await on_output(value)
+                return result
+        result = await self.pool.run(job["program"], job["inputs"], job["max_steps"], on_output)
+        if key is not None:
+            self.cache.put(key, result)
+        return result
+
+    async def _run_streaming(self, writer, job):
+        """
+        Runs a job, sending each WRITE value as an NDJSON chunk followed by the result.
+
+        Args:
+            writer: The connection's asyncio StreamWriter.
+            job (dict): The validated job.
+        """
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\n"
+                     b"Transfer-Encoding: chunked\r\nConnection: close\r\n\r\n")
+
+        async def send_line(data):
+            line = (json.dumps(data) + "\n").encode()
+            writer.write(f"{len(line):X}\r\n".encode() + line + b"\r\n")
+            await writer.drain()
+
+        async def on_output(value):
+            await send_line({"output": value})
+
+        try:
+            result = await self._run_job(job, on_output)
+            await send_line({"result": result.to_dict()})
+        except RuntimeError as e:
+            await send_line({"error": str(e)})
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    @staticmethod
+    async def _send_json(writer, status, data):
+        """
+        Sends a complete JSON response.
+
+        Args:
+            writer: The connection's asyncio StreamWriter.
+            status (int): The HTTP status code.
+            data (dict): The response body.
+        """
+        body = json.dumps(data).encode()
+        writer.write(f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\nContent-Type: application/json\r\n"
+                     f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+        await writer.drain()
+
+
+async def serve(host="127.0.0.1", port=8450, unix_path=None, workers=2, memory_size=250,
+                max_pending=64, max_steps=1000000, cache_size=1024, cache_path=None):
+    """
+    Starts the worker pool and serves requests until cancelled.
+
+    Args:
+        host (str): The TCP host to listen on, defaults to 127.0.0.1.
+        port (int): The TCP port to listen on, defaults to 8450.
+        unix_path (str): A Unix socket path to listen on instead of TCP, defaults to None.
+        workers (int): The number of worker processes, defaults to 2.
+        memory_size (int): The number of words of memory per worker, defaults to 250.
+        max_pending (int): The request queue limit, defaults to 64.
+        max_steps (int): The instruction budget cap, defaults to 1000000.
+        cache_size (int): The results kept in memory, defaults to 1024. 0 turns caching off.
+        cache_path (str): A SQLite file that keeps results between server runs, defaults to None.
+    """
+    cache = ResultCache(cache_size, cache_path) if cache_size > 0 else None
+    pool = WorkerPool(workers, memory_size)
+    pool.start()
+    server = SimulationServer(pool, max_pending, max_steps, cache=cache)
+    try:
+        if unix_path is not None:
+            listener = await asyncio.start_unix_server(server.handle_connection, path=unix_path)
+            print(f"Serving on unix socket {unix_path}")
+        else:
+            listener = await asyncio.start_server(server.handle_connection, host, port)
+            print(f"Serving on http://{host}:{port}/run")
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        pool.close()
+        if cache is not None:
+            cache.close()
+
+
+def main():
+    """
+    Parses command line options and runs the server.
+    """
+    parser = argparse.ArgumentParser(description="Serve UVSim program runs over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1", help="TCP host to listen on")
+    parser.add_argument("--port", type=int, default=8450, help="TCP port to listen on")
+    parser.add_argument("--unix", dest="unix_path", help="listen on this Unix socket path instead of TCP")
+    parser.add_argument("--workers", type=int, default=2, help="number of worker processes")
+    parser.add_argument("--memory-size", type=int, default=250, help="words of memory per run")
+    parser.add_argument("--max-pending", type=int, default=64, help="requests queued before answering 503")
+    parser.add_argument("--max-steps", type=int, default=1000000, help="largest instruction budget per request")
+    parser.add_argument("--cache-size", type=int, default=1024, help="results cached in memory, 0 to turn caching off")
+    parser.add_argument("--cache-file", help="a SQLite file that keeps cached results between runs")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.unix_path, args.workers, args.memory_size,
+                          args.max_pending, args.max_steps, args.cache_size, args.cache_file))
+    except KeyboardInterrupt:
+        print("\nServer stopped.")
+
+
+if __name__ == "__main__":
+    main()
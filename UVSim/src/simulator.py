@@ -0,0 +1,197 @@
+"""
+Reusable simulator instances, so short batch jobs do not pay for building Memory and a CPU.
+
+A Simulator keeps its Memory, CPU and event loop between runs and resets them in place. A
+SimulatorPool hands out idle simulators and takes them back, resetting each one on return.
+"""
+import asyncio
+from contextlib import contextmanager
+
+from batch_runner import BatchCPU, RunResult, run_to_completion, state_hash
+from input_handler import ScriptedInputHandler
+from memory import Memory
+
+
+class Simulator:
+    """
+    A Memory and a batch CPU kept together for reuse.
+
+    Attributes:
+        memory (Memory): The simulator's memory.
+        cpu (BatchCPU): The CPU attached to that memory.
+    """
+    __slots__ = ("memory", "cpu", "_loop")
+
+    def __init__(self, memory_size=250, overflow_policy="wrap", cpu_class=BatchCPU):
+        """
+        Builds the memory and CPU once.
+
+        Args:
+            memory_size (int): The number of words of memory, defaults to 250.
+            overflow_policy (str): How arithmetic results outside a 6 digit word are handled.
+            cpu_class: BatchCPU or a subclass of it taking the same arguments.
+        """
+        self.memory = Memory(memory_size)
+        self.cpu = cpu_class(self.memory, ScriptedInputHandler(()), overflow_policy)
+        self._loop = None
+
+    def reset(self):
+        """
+        Zeroes memory and the CPU registers in place and starts a new output list.
+        """
+        self.memory.clear()
+        self.cpu.reset()
+        self.cpu.outputs = []
+
+    def load(self, program):
+        """
+        Resets the simulator and loads a program.
+
+        Args:
+            program (list of str): The program's instructions.
+
+        Raises:
+            ValueError: If the instructions are not consistent or not properly formatted.
+        """
+        self.reset()
+        self.memory.load_program(program)
+
+    async def run_async(self, inputs=(), max_steps=None):
+        """
+        Runs the loaded program on the caller's event loop.
+
+        Errors raised by the program are captured in the result rather than propagated.
+
+        Args:
+            inputs (iterable): The values supplied to READ instructions, in order.
+            max_steps (int): The most instructions to execute, or None for no limit.
+
+        Returns:
+            RunResult: The program's outputs, step and cycle counts and final state hash.
+        """
+        cpu = self.cpu
+        cpu.input_handler = ScriptedInputHandler(inputs)
+        error = None
+        try:
+            await run_to_completion(cpu, max_steps)
+        except Exception as e:
+            error = str(e)
+        return RunResult(cpu.outputs, cpu.instruction_count, state_hash(cpu), error, cpu.cycles)
+
+    def run(self, inputs=(), max_steps=None):
+        """
+        Runs the loaded program on the simulator's own event loop, which is kept between runs.
+
+        Args:
+            inputs (iterable): The values supplied to READ instructions, in order.
+            max_steps (int): The most instructions to execute, or None for no limit.
+
+        Returns:
+            RunResult: The program's outputs, step and cycle counts and final state hash.
+        """
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+        return self._loop.run_until_complete(self.run_async(inputs, max_steps))
+
+    def close(self):
+        """
+        Closes the simulator's event loop, if it made one.
+        """
+        if self._loop is not None:
+            self._loop.close()
+            self._loop = None
+
+
+class SimulatorPool:
+    """
+    Idle simulators waiting to be checked out.
+
+    Attributes:
+        memory_size (int): The number of words of memory in each simulator.
+        overflow_policy (str): The overflow policy of each simulator.
+        max_idle (int): The most idle simulators kept; extra ones are closed on release.
+        created (int): The number of simulators built so far.
+    """
+    def __init__(self, memory_size=250, overflow_policy="wrap", max_idle=16):
+        """
+        Initializes an empty pool. Simulators are built when first needed.
+
+        Args:
+            memory_size (int): The number of words of memory, defaults to 250.
+            overflow_policy (str): How arithmetic results outside a 6 digit word are handled.
+            max_idle (int): The most idle simulators kept, defaults to 16.
+        """
+        self.memory_size = memory_size
+        self.overflow_policy = overflow_policy
+        self.max_idle = max_idle
+        self.created = 0
+        self._idle = []
+
+    def acquire(self):
+        """
+        Checks a simulator out of the pool, building one if none is idle.
+
+        Returns:
+            Simulator: A reset simulator.
+        """
+        try:
+            return self._idle.pop()
+        except IndexError:
+            self.created += 1
+            return Simulator(self.memory_size, self.overflow_policy)
+
+    def release(self, simulator):
+        """
+        Resets a simulator and returns it to the pool.
+
+        Args:
+            simulator (Simulator): A simulator from `acquire`.
+        """
+        simulator.reset()
+        if len(self._idle) < self.max_idle:
+            self._idle.append(simulator)
+        else:
+            simulator.close()
+
+    @contextmanager
+    def checkout(self):
+        """
+        Checks a simulator out for the duration of a with block.
+
+        Yields:
+            Simulator: A reset simulator.
+        """
+        simulator = self.acquire()
+        try:
+            yield simulator
+        finally:
+            self.release(simulator)
+
+    def run(self, program, inputs=(), max_steps=None):
+        """
+        Runs a program on a pooled simulator.
+
+        Args:
+            program (list of str): The program's instructions.
+            inputs (iterable): The values supplied to READ instructions, in order.
+            max_steps (int): The most instructions to execute, or None for no limit.
+
+        Returns:
+            RunResult: The program's outputs, step and cycle counts and final state hash.
+
+        Raises:
+            ValueError: If the instructions are not consistent or not properly formatted.
+        """
+        with self.checkout() as simulator:
+            simulator.memory.load_program(program)
+            return simulator.run(inputs, max_steps)
+
+    def close(self):
+        """
+        Closes every idle simulator.
+        """
+        while self._idle:
+            self._idle.pop().close()
+
+    def __len__(self):
+        return len(self._idle)
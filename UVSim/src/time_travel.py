@@ -0,0 +1,326 @@
+"""
+Reverse execution for a CPU using a compact undo log with periodic full checkpoints.
+
+Each executed instruction records only what it changes: the previous program counter,
+accumulator, instruction count and cycle count and, for READ and STORE, the address
+written with its old and new values. Records live in typed arrays. A full checkpoint is
+taken every `checkpoint_interval` steps, so any recorded step is reached by applying at
+most one interval of records, backwards from the nearest later checkpoint or forwards
+from the nearest earlier one.
+
+Memory is restored through the raw word array, so device ports do not fire again.
+WRITE output and consumed input are not undone; only machine state is.
+"""
+from array import array
+
+from memory import WORD_TYPECODE
+
+# Opcodes that overwrite a memory word
+READ = 10
+STORE = 21
+NO_ADDRESS = -1
+
+
+class _Checkpoint:
+    """
+    A full copy of machine state after a given step.
+
+    Attributes:
+        step (int): The number of steps executed when the checkpoint was taken.
+        words (array): A copy of memory.
+        accumulator (int): The accumulator value.
+        program_counter (int): The program counter.
+        instruction_count (int): The CPU's instruction count.
+        cycles (int): The CPU's cycle count.
+    """
+    __slots__ = ("step", "words", "accumulator", "program_counter", "instruction_count", "cycles")
+
+    def __init__(self, step, cpu):
+        self.step = step
+        self.words = array(WORD_TYPECODE, cpu.memory.memory)
+        self.accumulator = cpu.accumulator.value
+        self.program_counter = cpu.program_counter
+        self.instruction_count = cpu.instruction_count
+        self.cycles = cpu.cycles
+
+    def restore(self, cpu):
+        """
+        Copies this checkpoint back into the CPU and its memory.
+
+        Args:
+            cpu: The CPU to restore.
+        """
+        cpu.memory.memory[:] = self.words
+        cpu.memory.mark_changed(range(len(self.words)))
+        self.restore_registers(cpu)
+
+    def restore_registers(self, cpu):
+        """
+        Copies this checkpoint's registers and counters back into the CPU, leaving memory alone.
+
+        Args:
+            cpu: The CPU to restore.
+        """
+        cpu.accumulator.value = self.accumulator
+        cpu.program_counter = self.program_counter
+        cpu.instruction_count = self.instruction_count
+        cpu.cycles = self.cycles
+
+
+class TimeTravel:
+    """
+    Records a CPU's execution so it can be stepped backwards and forwards.
+
+    Attributes:
+        cpu: The CPU being recorded.
+        checkpoint_interval (int): Steps between full checkpoints.
+        max_records (int): The most undo records kept. Older history is dropped a whole
+            interval at a time, so memory use stays bounded on long runs.
+        position (int): The step the CPU is currently at.
+        head (int): The latest recorded step.
+        earliest (int): The earliest step that can still be reached.
+    """
+    def __init__(self, cpu, checkpoint_interval=1024, max_records=1048576):
+        """
+        Initializes the log, starting at step 0 with the CPU's current state.
+
+        Args:
+            cpu: The CPU to record.
+            checkpoint_interval (int): Steps between full checkpoints, defaults to 1024.
+            max_records (int): The most undo records kept, defaults to 1048576.
+
+        Raises:
+            ValueError: If max_records is smaller than checkpoint_interval.
+        """
+        if checkpoint_interval < 1 or max_records < checkpoint_interval:
+            raise ValueError("max_records must be at least checkpoint_interval, which must be positive")
+        self.cpu = cpu
+        self.checkpoint_interval = checkpoint_interval
+        self.max_records = max_records
+        self.earliest = 0
+        self.position = 0
+        self.head = 0
+        self._program_counters = array('i')
+        self._accumulators = array('q')
+        self._instruction_counts = array('q')
+        self._cycles = array('q')
+        self._addresses = array('i')
+        self._old_values = array('q')
+        self._new_values = array('q')
+        self._logs = (self._program_counters, self._accumulators, self._instruction_counts, self._cycles,
+                      self._addresses, self._old_values, self._new_values)
+        self._checkpoints = []
+        self._head_checkpoint = None
+
+    def memory_usage(self):
+        """
+        Estimates the bytes used by undo records and checkpoints.
+
+        Returns:
+            int: The approximate size in bytes.
+        """
+        records = sum(log.itemsize * len(log) for log in self._logs)
+        checkpoints = sum(c.words.itemsize * len(c.words) for c in self._checkpoints)
+        return records + checkpoints
+
+    async def step(self):
+        """
+        Moves one step forward: along the recorded history if behind the head, otherwise by
+        executing and recording the next instruction.
+
+        Raises:
+            Exception: Any error raised by the instruction. Nothing is recorded for it.
+        """
+        if self.position < self.head:
+            self.seek(self.position + 1)
+        else:
+            await self._execute()
+
+    def step_back(self):
+        """
+        Moves one step backward.
+
+        Raises:
+            ValueError: If the CPU is already at the earliest reachable step.
+        """
+        self.seek(self.position - 1)
+
+    async def run(self):
+        """
+        Executes and records instructions until the program halts.
+        """
+        max_size = self.cpu.memory.max_size
+        while self.cpu.program_counter < max_size:
+            await self.step()
+
+    def seek(self, step):
+        """
+        Restores the machine state as it was after a recorded step.
+
+        Args:
+            step (int): The step to move to, between `earliest` and `head`.
+
+        Raises:
+            ValueError: If the step has not been recorded or has been dropped.
+        """
+        if not self.earliest <= step <= self.head:
+            raise ValueError(f"Step {step} is outside the recorded range {self.earliest} to {self.head}")
+        if step == self.position:
+            return
+        if self.position == self.head:
+            # Leaving the head: keep its state so it can be returned to
+            self._head_checkpoint = _Checkpoint(self.head, self.cpu)
+
+        if step < self.position:
+            if self.position - step > self.checkpoint_interval:
+                checkpoint = self._nearest_checkpoint(step)
+                checkpoint.restore(self.cpu)
+                self.position = checkpoint.step
+            self._undo_to(step)
+        else:
+            if step - self.position > self.checkpoint_interval:
+                checkpoint = self._checkpoint_before(step)
+                if checkpoint is not None and checkpoint.step > self.position:
+                    checkpoint.restore(self.cpu)
+                    self.position = checkpoint.step
+            self._redo_to(step)
+        self.cpu.instruction_register = None
+        if self.position == self.head:
+            self._head_checkpoint = None
+
+    async def _execute(self):
+        """
+        Records the undo information for the next instruction and then executes it.
+        """
+        cpu = self.cpu
+        memory = cpu.memory
+        program_counter = cpu.program_counter
+        word = memory.fetch(program_counter)
+        address = word % 1000
+        if word // 1000 in (READ, STORE) and address < memory.max_size:
+            self._addresses.append(address)
+            self._old_values.append(memory.fetch(address))
+        else:
+            self._addresses.append(NO_ADDRESS)
+            self._old_values.append(0)
+        self._program_counters.append(program_counter)
+        self._accumulators.append(cpu.accumulator.value)
+        self._instruction_counts.append(cpu.instruction_count)
+        self._cycles.append(cpu.cycles)
+        try:
+            await cpu.execute_instruction()
+        except Exception:
+            for log in self._logs:
+                if len(log) > len(self._new_values):
+                    log.pop()
+            raise
+        address = self._addresses[-1]
+        self._new_values.append(0 if address == NO_ADDRESS else memory.fetch(address))
+
+        self.position += 1
+        self.head = self.position
+        if self.position % self.checkpoint_interval == 0:
+            self._checkpoints.append(_Checkpoint(self.position, cpu))
+        if len(self._program_counters) > self.max_records:
+            self._drop_oldest()
+
+    def _undo_to(self, step):
+        """
+        Applies undo records backwards until the CPU is at an earlier step.
+
+        Args:
+            step (int): The step to stop at, no later than the current position.
+        """
+        words = self.cpu.memory.memory
+        changed = []
+        for index in range(self.position - self.earliest - 1, step - self.earliest - 1, -1):
+            address = self._addresses[index]
+            if address != NO_ADDRESS:
+                words[address] = self._old_values[index]
+                changed.append(address)
+        self.cpu.memory.mark_changed(changed)
+        self._restore_registers(step)
+        self.position = step
+
+    def _redo_to(self, step):
+        """
+        Applies records forwards until the CPU is at a later step.
+
+        Args:
+            step (int): The step to stop at, no earlier than the current position.
+        """
+        words = self.cpu.memory.memory
+        changed = []
+        for index in range(self.position - self.earliest, step - self.earliest):
+            address = self._addresses[index]
+            if address != NO_ADDRESS:
+                words[address] = self._new_values[index]
+                changed.append(address)
+        self.cpu.memory.mark_changed(changed)
+        self._restore_registers(step)
+        self.position = step
+
+    def _restore_registers(self, step):
+        """
+        Sets the registers and counters to their values after a recorded step.
+
+        Each record holds the state before its step, so the state after a step is the next
+        record's, or the head state for the latest step.
+
+        Args:
+            step (int): The step whose state is wanted.
+        """
+        if step == self.head:
+            self._head_checkpoint.restore_registers(self.cpu)
+            return
+        index = step - self.earliest
+        cpu = self.cpu
+        cpu.program_counter = self._program_counters[index]
+        cpu.accumulator.value = self._accumulators[index]
+        cpu.instruction_count = self._instruction_counts[index]
+        cpu.cycles = self._cycles[index]
+
+    def _nearest_checkpoint(self, step):
+        """
+        Finds the earliest checkpoint at or after a step, falling back to the head state.
+
+        Args:
+            step (int): The step being sought.
+
+        Returns:
+            _Checkpoint: The checkpoint to restore before undoing down to the step.
+        """
+        for checkpoint in self._checkpoints:
+            if checkpoint.step >= step:
+                if checkpoint.step <= self.head:
+                    return checkpoint
+                break
+        return self._head_checkpoint
+
+    def _checkpoint_before(self, step):
+        """
+        Finds the latest checkpoint at or before a step.
+
+        Args:
+            step (int): The step being sought.
+
+        Returns:
+            _Checkpoint: The checkpoint to restore before redoing up to the step, or None.
+        """
+        found = None
+        for checkpoint in self._checkpoints:
+            if checkpoint.step > step:
+                break
+            found = checkpoint
+        return found
+
+    def _drop_oldest(self):
+        """
+        Discards the oldest interval of records and the checkpoint that covered them.
+        """
+        count = self.checkpoint_interval
+        for log in self._logs:
+            del log[:count]
+        self.earliest += count
+        if self._checkpoints and self._checkpoints[0].step <= self.earliest:
+            self._checkpoints.pop(0)
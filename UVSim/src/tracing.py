@@ -0,0 +1,184 @@
+"""
+Span instrumentation exported as Chrome trace-event JSON (chrome://tracing, Perfetto, speedscope).
+
+Tracing is off by default. While it is off, `span` returns one shared do-nothing context
+manager, so instrumented code pays only for the call. Set the UVSIM_TRACE environment
+variable to a file path to trace a CLI or GUI session and write the trace on exit.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+
+TRACE_ENVIRONMENT_VARIABLE = "UVSIM_TRACE"
+
+_tracer = None
+
+
+class _NullSpan:
+    """
+    A context manager that does nothing, used while tracing is off.
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    """
+    Times a block of code and records it as a complete ("X") trace event.
+    """
+    __slots__ = ("tracer", "name", "category", "args", "start")
+
+    def __init__(self, tracer, name, category, args):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        end = time.perf_counter_ns()
+        if exc_type is not None:
+            self.args["error"] = str(exc_value)
+        self.tracer.add_event(self.name, self.category, self.start, end - self.start, self.args)
+        return False
+
+
+class Tracer:
+    """
+    Collects trace events in memory.
+
+    Attributes:
+        max_events (int): The most events kept; later events are counted but dropped.
+        events (list of dict): The recorded trace events.
+        dropped (int): The number of events dropped after `max_events` was reached.
+    """
+    def __init__(self, max_events=1000000):
+        """
+        Initializes an empty tracer.
+
+        Args:
+            max_events (int): The most events kept, defaults to 1000000.
+        """
+        self.max_events = max_events
+        self.events = []
+        self.dropped = 0
+        self._origin = time.perf_counter_ns()
+        self._pid = os.getpid()
+
+    def add_event(self, name, category, start, duration, args):
+        """
+        Records a complete event.
+
+        Args:
+            name (str): The span name.
+            category (str): The span category.
+            start (int): The start time from `time.perf_counter_ns`.
+            duration (int): The duration in nanoseconds.
+            args (dict): Extra details shown with the event.
+        """
+        if len(self.events) >= self.max_events:
+            self.dropped += 1
+            return
+        self.events.append({
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": (start - self._origin) / 1000,
+            "dur": duration / 1000,
+            "pid": self._pid,
+            "tid": threading.get_ident(),
+            "args": args,
+        })
+
+    def to_json(self):
+        """
+        Builds the trace in Chrome trace-event format.
+
+        Returns:
+            dict: The trace, ready for `json.dump`.
+        """
+        return {"traceEvents": list(self.events), "displayTimeUnit": "ms",
+                "otherData": {"dropped_events": self.dropped}}
+
+    def save(self, path):
+        """
+        Writes the trace to a JSON file.
+
+        Args:
+            path (str): The file to write.
+        """
+        with open(path, 'w') as file:
+            json.dump(self.to_json(), file)
+
+
+def span(name, category="uvsim", **args):
+    """
+    Returns a context manager that records a span while tracing is on.
+
+    Args:
+        name (str): The span name, such as "Memory.load_program".
+        category (str): The span category, defaults to "uvsim".
+        **args: Extra details shown with the event.
+
+    Returns:
+        A context manager.
+    """
+    if _tracer is None:
+        return _NULL_SPAN
+    return _Span(_tracer, name, category, args)
+
+
+def enable(max_events=1000000):
+    """
+    Turns tracing on with a new tracer.
+
+    Args:
+        max_events (int): The most events kept, defaults to 1000000.
+
+    Returns:
+        Tracer: The active tracer.
+    """
+    global _tracer
+    _tracer = Tracer(max_events)
+    return _tracer
+
+
+def disable():
+    """
+    Turns tracing off.
+
+    Returns:
+        Tracer: The tracer that was active, or None.
+    """
+    global _tracer
+    tracer, _tracer = _tracer, None
+    return tracer
+
+
+def enable_from_environment():
+    """
+    Turns tracing on if UVSIM_TRACE names a file, writing the trace there when Python exits.
+
+    Returns:
+        Tracer: The active tracer, or None if the variable is not set.
+    """
+    path = os.environ.get(TRACE_ENVIRONMENT_VARIABLE)
+    if not path:
+        return None
+    tracer = enable()
+    atexit.register(tracer.save, path)
+    return tracer
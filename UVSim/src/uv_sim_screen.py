@@ -3,8 +3,9 @@
 import asyncio
 import os
 import re
+from concurrent.futures import ThreadPoolExecutor
 
-from kivy.clock import Clock
+from kivy.clock import Clock, mainthread
 from kivy.graphics import Color, Rectangle
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.button import Button
@@ -13,9 +14,14 @@ from kivy.uix.popup import Popup
 from kivy.uix.screenmanager import Screen
 from kivy.uix.textinput import TextInput
 
-from cpu import CPU
-from input_handler import GUIInputHandler
+from file_io import preview_text, read_program_file, write_text_file
+from debugger import Debugger
+from events import EventCPU, HaltEvent, InputRequest, OutputEvent
 from memory import Memory
+from memory_view import MemoryView
+from console_view import ConsoleView
+from session_log import SessionRecorder, save_from_environment
+from tracing import span
 
 # Define your theme colors
 theme = [
@@ -23,6 +29,9 @@ theme = [
     [1, 1, 1, 1],                  # White
 ]
 
+# Files longer than this are only previewed in the editor
+PREVIEW_LINES = 200
+
 class UVSimScreen(Screen):
     """
     Represents a screen in the UVSim application.
@@ -36,11 +45,21 @@ class UVSimScreen(Screen):
     Attributes:
         instance_number (int): The identifier for this screen instance.
         memory (Memory): The memory object for storing instructions and data.
-        input_handler (GUIInputHandler): Handles user input asynchronously.
-        cpu (CPU): The CPU object for executing machine instructions.
+        loop: The asyncio event loop, stepped from the Kivy clock.
+        cpu (EventCPU): The CPU object for executing machine instructions, driven by its events.
+        pending_input (InputRequest): The READ waiting for console input, or None.
+        debugger (Debugger): Steps the CPU and stops it at breakpoints.
+        debug_task: The step or continue in progress, or None.
+        recorder (SessionRecorder): Records the loads, runs and inputs of this session for replay.
+        memory_view (MemoryView): Shows the registers and memory words as the program runs.
+        output_display (ConsoleView): Shows program output and feedback, keeping a bounded
+            number of lines.
         is_loaded (bool): Indicates if a program has been loaded.
         main_color (list): The primary theme color.
         off_color (list): The secondary (off) theme color.
+        io_executor (ThreadPoolExecutor): Runs file reads and writes off the GUI thread.
+        file_program (list): The full program from the last picked file, or None.
+        file_preview (str): The editor text shown for that file.
     """
 
     def __init__(self, instance_number, **kwargs):
@@ -56,9 +75,18 @@ class UVSimScreen(Screen):
 
         # Initialize components
         self.memory = Memory(100)
-        self.input_handler = GUIInputHandler(self)
-        self.cpu = CPU(self.memory, self.input_handler)
+        self.loop = asyncio.get_event_loop()
+        self.cpu = EventCPU(self.memory)
+        self.pending_input = None
+        self.debugger = Debugger(self.cpu)
+        self.debug_task = None
         self.is_loaded = False
+        self.recorder = SessionRecorder(self.memory.max_size)
+
+        # File I/O runs in the background so large files or slow mounts don't freeze the UI
+        self.io_executor = ThreadPoolExecutor(max_workers=1)
+        self.file_program = None
+        self.file_preview = None
 
         # Theme colors
         self.main_color = theme[0]
@@ -93,15 +121,19 @@ class UVSimScreen(Screen):
         self.console_input.disabled = True
         left_column.add_widget(self.console_input)
 
-        # Output Display
-        self.output_display = TextInput(
-            hint_text='Output',
-            size_hint=(1, 0.3),
-            readonly=True,
-            multiline=True,
-        )
+        # Output Display, keeping only the most recent lines
+        self.output_display = ConsoleView(size_hint=(1, 0.25))
         left_column.add_widget(self.output_display)
 
+        # Output Search
+        self.output_search_input = TextInput(
+            hint_text='Search output',
+            size_hint=(1, 0.05),
+            multiline=False,
+        )
+        self.output_search_input.bind(on_text_validate=self.search_output)
+        left_column.add_widget(self.output_search_input)
+
         # Load Program Button
         self.load_button = Button(
             text='Load Program',
@@ -167,6 +199,28 @@ class UVSimScreen(Screen):
         self.submit_color_input_button.bind(on_press=self.pick_color)
         right_column.add_widget(self.submit_color_input_button)
 
+        # Debugger controls
+        self.breakpoint_input = TextInput(
+            hint_text='Breakpoints, e.g. 3, 10',
+            size_hint=(1, 0.08),
+            multiline=False
+        )
+        self.breakpoint_input.bind(on_text_validate=self.set_breakpoints)
+        right_column.add_widget(self.breakpoint_input)
+
+        debug_row = BoxLayout(orientation='horizontal', size_hint=(1, 0.08), spacing=10)
+        self.step_button = Button(text='Step', background_color=self.main_color)
+        self.step_button.bind(on_press=self.step_program)
+        debug_row.add_widget(self.step_button)
+        self.continue_button = Button(text='Continue', background_color=self.main_color)
+        self.continue_button.bind(on_press=self.continue_program)
+        debug_row.add_widget(self.continue_button)
+        right_column.add_widget(debug_row)
+
+        # Memory and register viewer
+        self.memory_view = MemoryView(self.cpu, size_hint=(1, 0.34))
+        right_column.add_widget(self.memory_view)
+
         self.main_layout.add_widget(right_column)
 
         # Add the main_layout to the screen
@@ -186,17 +240,37 @@ class UVSimScreen(Screen):
             - Feedback in the output display on successful loading or errors.
         """
         machine_instructions = self.machine_instructions_input.text
-        try:
+        if self.file_program is not None and machine_instructions == self.file_preview:
+            # The editor may only hold a preview of the picked file, so load the whole file
+            self.load_instructions(self.file_program, f"{len(self.file_program)} lines from file")
+        else:
             # Convert each line to an integer
-            instructions = list(machine_instructions.strip().splitlines())
+            self.load_instructions(list(machine_instructions.strip().splitlines()), machine_instructions)
+
+    def load_instructions(self, instructions, listing):
+        """
+        Loads a list of instructions into memory and updates the load state.
 
-            # Load the program into memory
-            self.cpu.memory.load_program(instructions)
+        Args:
+            instructions (list of str): The program's instructions.
+            listing (str): What to show in the output display as the loaded program.
+
+        Displays:
+            - Feedback in the output display on successful loading or errors.
+        """
+        self.recorder.record_load(instructions)
+        try:
+            if not self.is_loaded:
+                # Load the program into memory
+                self.cpu.memory.load_program(instructions)
+            else:
+                # Reload: only write the words that differ from what is in memory
+                changed = self.cpu.memory.patch_program(instructions)
 
             # Update the output display
-            self.output_display.text += f"Program Loaded:\n{machine_instructions}\n"
+            self.output_display.write(f"Program Loaded:\n{listing}")
         except Exception as e:
-            self.output_display.text += f"Error: {e}.\n"
+            self.output_display.write(f"Error: {e}.")
             return
 
         if not self.is_loaded:
@@ -204,10 +278,9 @@ class UVSimScreen(Screen):
             self.load_button.text = "Reload Program"
             self.is_loaded = True
         else:
-            # Reload: reinitialize CPU
-            self.cpu = CPU(self.memory, self.input_handler)
-            self.cpu.output_callback = self.output_callback
-            self.output_display.text += "CPU Reinitialized.\n"
+            # Reload: reset the CPU in place, keeping the memory view and its rows
+            self.cpu.reset()
+            self.output_display.write(f"CPU Reset, {len(changed)} words changed.")
 
     def run_program(self, instance):
         """
@@ -219,24 +292,154 @@ class UVSimScreen(Screen):
         Displays:
             - Feedback in the output display during and after execution.
         """
-        self.cpu.output_callback = self.output_callback
-        self.output_display.text += "Running the program...\n"
+        self.output_display.write("Running the program...")
+        self.recorder.record_run()
         # Start the CPU execution asynchronously
         self.cpu.program_counter = 0
         asyncio.ensure_future(self.execute_cpu())
 
     async def execute_cpu(self):
         """
-        Executes the CPU instructions until the program counter exceeds memory size.
+        Executes the program, showing each event from the CPU as it arrives.
 
         Handles:
+            - Input requests by enabling the console input until a value is submitted.
             - Errors during execution and displays them in the output display.
         """
+        with span("CPU run"):
+            try:
+                async for event in self.cpu.run_events():
+                    if isinstance(event, OutputEvent):
+                        self.output_callback(f"Output: {event.value}")
+                    elif isinstance(event, InputRequest):
+                        self.pending_input = event
+                        self.output_callback("Awaiting user input...")
+                        self.enable_console_input()
+                    elif isinstance(event, HaltEvent):
+                        self.output_callback(self.finish_message(event.halted))
+                    else:
+                        self.output_display.write(f"Error: {event.message}")
+            finally:
+                # Lets replay tell which loads and runs happened while this run was going
+                self.recorder.record_done()
+
+    @staticmethod
+    def finish_message(halted):
+        """
+        Describes how a program stopped, so running off the end of memory is not reported
+        as a clean finish.
+
+        Args:
+            halted (bool): Whether a HALT instruction stopped the program.
+
+        Returns:
+            str: The message to show.
+        """
+        if halted:
+            return "Program finished"
+        return "Program ran off the end of memory without a HALT"
+
+    def set_breakpoints(self, instance):
+        """
+        Replaces the debugger's breakpoints with the addresses in the breakpoint input.
+
+        Args:
+            instance: The Kivy TextInput instance that triggered this action.
+
+        Displays:
+            - The breakpoints set, or an error if an address is invalid.
+        """
+        try:
+            addresses = [int(part) for part in self.breakpoint_input.text.replace(",", " ").split()]
+            for address in list(self.debugger.breakpoints):
+                self.debugger.remove_breakpoint(address)
+            for address in addresses:
+                self.debugger.add_breakpoint(address)
+        except ValueError as e:
+            self.output_display.write(f"Error: {e}")
+            return
+        listed = ", ".join(f"{address:03}" for address in sorted(self.debugger.breakpoints))
+        self.output_display.write(f"Breakpoints: {listed or 'none'}")
+
+    def step_program(self, instance):
+        """
+        Executes one instruction of the loaded program.
+
+        Args:
+            instance: The Kivy Button instance that triggered this action.
+        """
+        self.start_debugging(single_step=True)
+
+    def continue_program(self, instance):
+        """
+        Runs the loaded program until a breakpoint is reached or it stops.
+
+        Args:
+            instance: The Kivy Button instance that triggered this action.
+        """
+        self.start_debugging(single_step=False)
+
+    def start_debugging(self, single_step):
+        """
+        Starts a step or continue unless one is already in progress, restarting a finished
+        program from address 0.
+
+        Args:
+            single_step (bool): Whether to stop after one instruction.
+        """
+        if self.debug_task is not None and not self.debug_task.done():
+            return
+        restart = self.debugger.is_halted()
+        if restart:
+            self.output_display.write("Debugging the program...")
+            self.cpu.program_counter = 0
+        self.recorder.record_debug(restart)
+        self.debug_task = asyncio.ensure_future(self.debug_cpu(single_step))
+
+    async def debug_cpu(self, single_step):
+        """
+        Steps the CPU through the debugger, showing output as it happens and where it stopped.
+
+        Args:
+            single_step (bool): Whether to stop after one instruction.
+        """
+        cpu = self.cpu
+        # READs during debugging ask this screen for input through `get_input`
+        cpu.input_handler = self
+        start = cpu.instruction_count
+        failed = False
         try:
-            while self.cpu.program_counter < self.memory.max_size:
-                await self.cpu.execute_instruction()
+            while True:
+                event = await self.debugger.step()
+                output = cpu.take_event()
+                if output is not None:
+                    self.output_callback(f"Output: {output.value}")
+                if event.reason != "step" or single_step or cpu.program_counter in self.debugger.breakpoints:
+                    break
         except Exception as e:
-            self.output_display.text += f"Error: {e}\n"
+            failed = True
+            self.output_display.write(f"Error: {e}")
+            return
+        finally:
+            # Replay runs as many instructions, counting one that failed, instead of breakpoints
+            self.recorder.record_done(cpu.instruction_count - start + failed)
+        if event.reason == "halt":
+            self.output_callback(self.finish_message(cpu.stopped_at_halt()))
+        else:
+            self.output_display.write(f"Stopped: {event.reason} at PC {cpu.program_counter:03}, "
+                                      f"ACC {cpu.accumulator.value}")
+
+    async def get_input(self):
+        """
+        Waits for console input for a READ run by the debugger.
+
+        Returns:
+            str: The value submitted.
+        """
+        self.pending_input = InputRequest(self.cpu.instruction_register % 1000)
+        self.output_callback("Awaiting user input...")
+        self.enable_console_input()
+        return await self.pending_input.get_input()
 
     def save_file(self, instance):
         """
@@ -284,17 +487,32 @@ class UVSimScreen(Screen):
         folder_path = self.file_path_input.text.strip()
         file_name = "output.txt"  # Set your desired file name
 
-        # Attempt to save the file in the specified folder
-        try:
-            full_path = os.path.join(folder_path, file_name)
-            with open(full_path, 'w') as file:
-                file.write(self.machine_instructions_input.text)  # Save the output to the file
+        # Save the whole picked file if the editor only shows its preview
+        text = self.machine_instructions_input.text
+        if self.file_program is not None and text == self.file_preview:
+            text = "\n".join(self.file_program)
 
-            self.output_display.text += f"File saved successfully at {full_path}\n"
-        except Exception as e:
-            self.output_display.text += f"Error saving file: {e}\n"
+        # Write the file in the background and report the result when done
+        full_path = os.path.join(folder_path, file_name)
+        future = self.io_executor.submit(write_text_file, full_path, text, self.progress_reporter("Saving"))
+        future.add_done_callback(lambda done: self.finish_file_save(full_path, done))
+
+        self.popup.dismiss()  # Close the popup without waiting for the save
+
+    @mainthread
+    def finish_file_save(self, full_path, future):
+        """
+        Reports the result of a background save, on the GUI thread.
 
-        self.popup.dismiss()  # Close the popup after saving
+        Args:
+            full_path (str): The file that was written.
+            future: The finished future for the write.
+        """
+        error = future.exception()
+        if error is None:
+            self.output_display.write(f"File saved successfully at {full_path}")
+        else:
+            self.output_display.write(f"Error saving file: {error}")
 
     def pick_file(self, instance):
         """
@@ -321,13 +539,55 @@ class UVSimScreen(Screen):
             # Check if a file is selected
             if filechooser.selection:
                 file_path = filechooser.selection[0]
-                with open(file_path, 'r') as file:
-                    self.machine_instructions_input.text = file.read()  # Load file contents
-                self.output_display.text += f"File loaded from: {file_path}\n"
-            popup.dismiss()  # Close popup after loading
+                # Read the file in the background and load it once it arrives
+                future = self.io_executor.submit(read_program_file, file_path, self.progress_reporter("Loading"))
+                future.add_done_callback(lambda done: self.finish_file_load(file_path, done))
+            popup.dismiss()  # Close popup without waiting for the file
 
         load_button.bind(on_press=on_load)  # Bind load button to function
 
+    @mainthread
+    def finish_file_load(self, file_path, future):
+        """
+        Loads a file read in the background straight into memory and previews it in the editor.
+
+        Args:
+            file_path (str): The file that was read.
+            future: The finished future holding the file's lines.
+        """
+        error = future.exception()
+        if error is not None:
+            self.output_display.write(f"Error loading file: {error}")
+            return
+        lines = future.result()
+        self.file_program = lines
+        self.file_preview, truncated = preview_text(lines, PREVIEW_LINES)
+        self.machine_instructions_input.text = self.file_preview
+        self.output_display.write(f"File loaded from: {file_path}")
+        if truncated:
+            self.output_display.write(f"Showing the first {PREVIEW_LINES} of {len(lines)} lines in the editor.")
+        self.load_instructions(lines, f"{len(lines)} lines from {file_path}")
+
+    def progress_reporter(self, action):
+        """
+        Builds a progress callback for background file I/O that reports every quarter.
+
+        Args:
+            action (str): The word shown in the output display, such as "Loading".
+
+        Returns:
+            callable: A function taking (done, total), safe to call from any thread.
+        """
+        last_reported = [0]
+
+        def report(done, total):
+            quarter = 4 * done // total if total else 4
+            if quarter > last_reported[0] and done < total:
+                last_reported[0] = quarter
+                Clock.schedule_once(lambda dt: self.output_display.write(f"{action} file: {quarter * 25}%"), 0)
+
+        return report
+
     def pick_color(self, instance):
         """
         Updates the application's theme colors based on user input.
@@ -350,7 +610,7 @@ class UVSimScreen(Screen):
 
             self.update_theme()
         except Exception as e:
-            self.output_display.text += f"Error: {e}\n"
+            self.output_display.write(f"Error: {e}")
 
     def parse_color_input(self, color_input):
         """
@@ -389,7 +649,7 @@ class UVSimScreen(Screen):
             pass
 
         # Invalid input if it doesn't match hex or rgba formats
-        self.output_display.text += "Please input either hex values (with a # in front), or rgba values between 0 and 1.\n"
+        self.output_display.write("Please input either hex values (with a # in front), or rgba values between 0 and 1.")
         return None
 
     def update_theme(self):
@@ -398,7 +658,8 @@ class UVSimScreen(Screen):
         """
         self.main_color = theme[0]
         self.off_color = theme[1]
-        for button in [self.load_button, self.run_button, self.save_button, self.submit_color_input_button, self.pick_file_button]:
+        for button in [self.load_button, self.run_button, self.save_button, self.submit_color_input_button,
+                       self.pick_file_button, self.step_button, self.continue_button]:
             button.background_color = self.main_color
         with self.main_layout.canvas.before:
             Color(*self.off_color)
@@ -418,20 +679,34 @@ class UVSimScreen(Screen):
 
     def submit_console_input(self, instance):
         """
-        Handles console input submission and provides it to the input handler.
+        Handles console input submission and provides it to the waiting READ.
 
         Args:
             instance: The Kivy TextInput instance that triggered this action.
         """
         console_input_text = self.console_input.text
-        self.output_display.text += f"Console Input: {console_input_text}\n"
-        self.input_handler.provide_input(console_input_text)
+        self.output_display.write(f"Console Input: {console_input_text}")
+        if self.pending_input is not None:
+            self.recorder.record_input(console_input_text)
+            self.pending_input.provide(console_input_text)
+            self.pending_input = None
         self.console_input.text = ''
         self.console_input.disabled = True  # Disable until next input is needed
 
+    def search_output(self, instance):
+        """
+        Scrolls the output display to the next line containing the search text.
+
+        Args:
+            instance: The Kivy TextInput instance that triggered this action.
+        """
+        query = self.output_search_input.text
+        if query and self.output_display.search(query) is None:
+            self.output_search_input.hint_text = f"No output matches '{query}'"
+
     def enable_console_input(self):
         """
-        Enables the console input field for user interaction, called by the input handler.
+        Enables the console input field for user interaction, called when a READ needs a value.
         """
         self.console_input.disabled = False
         self.console_input.focus = True
@@ -443,7 +718,8 @@ class UVSimScreen(Screen):
         Args:
             message (str): The message to display.
         """
-        self.output_display.text += f"{message}\n"
+        with span("output render"):
+            self.output_display.write(str(message))
 
     def process_asyncio_events(self, dt):
         """
@@ -454,14 +730,18 @@ class UVSimScreen(Screen):
         """
         try:
             # Process pending asyncio tasks
-            self.input_handler.loop.call_soon_threadsafe(lambda: None)
-            self.input_handler.loop.run_until_complete(asyncio.sleep(0))
+            self.loop.call_soon_threadsafe(lambda: None)
+            self.loop.run_until_complete(asyncio.sleep(0))
         except Exception as e:
-            self.output_display.text += f"Asyncio Error: {e}\n"
+            self.output_display.write(f"Asyncio Error: {e}")
 
     def on_stop(self):
         """
         Cleans up resources and stops the asyncio event loop when the application exits.
         """
         # Clean up the asyncio loop on application exit
-        self.input_handler.loop.stop()
+        self.memory_view.stop()
+        self.output_display.close()
+        self.io_executor.shutdown(wait=False)
+        save_from_environment(self.recorder, self.instance_number)
+        self.loop.stop()
@@ -1,7 +1,15 @@
 # Implement unit tests for each component (memory, CPU, instruction execution) to ensure functionality remains consistent.
+import asyncio
 import io
+import json
 import os
+import random
+import shutil
+import subprocess
 import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from unittest.async_case import IsolatedAsyncioTestCase
 from unittest.mock import patch, AsyncMock
@@ -13,8 +21,30 @@ current_dir = os.path.dirname(__file__)
 src_dir = os.path.abspath(os.path.join(current_dir, '../src'))
 sys.path.insert(0, src_dir)
 from memory import Memory  # type: ignore
-from accumulator import Accumulator  # type: ignore
+from accumulator import Accumulator, fit_word  # type: ignore
 from cpu import CPU  # type: ignore
+from batch_runner import run_program  # type: ignore
+from result_cache import ResultCache, make_key  # type: ignore
+from sim_server import SimulationServer, WorkerPool  # type: ignore
+from debugger import Debugger, WatchedMemory  # type: ignore
+from time_travel import TimeTravel  # type: ignore
+from scrollback import ScrollbackBuffer  # type: ignore
+from file_io import preview_text, read_program_file, write_text_file  # type: ignore
+from profiler import ControlFlow, SamplingProfiler  # type: ignore
+from cycle_model import CycleReport, build_cost_table  # type: ignore
+import tracing  # type: ignore
+from multi_cpu import SYNC_OPCODE_NAMES, SharedCPU, SharedWordMemory, run_parallel  # type: ignore
+from events import ErrorEvent, EventCPU, HaltEvent, InputRequest, OutputEvent, run_scripted  # type: ignore
+from simulator import Simulator, SimulatorPool  # type: ignore
+import golden_corpus  # type: ignore
+from golden_corpus import run_corpus  # type: ignore
+from instruction_coverage import Coverage, run_with_coverage  # type: ignore
+from session_log import DEFAULT_MAX_STEPS, SessionRecorder, load_log, replay  # type: ignore
+from devices import DeviceMemory, InputPort, OutputPort  # type: ignore
+from concurrent_runner import FileInputHandler, ProgramJob, run_concurrently  # type: ignore
+from fuzzer import FuzzCase, find_differences, fuzz, generate_case, shrink  # type: ignore
+from session_store import SESSION_BYTES_TARGET, load_session, save_session, session_footprint  # type: ignore
+from input_handler import InputHandler, ScriptedInputHandler, StreamInputHandler  # type: ignore
 
 
 class unitTests(IsolatedAsyncioTestCase):
@@ -238,7 +268,7 @@ class unitTests(IsolatedAsyncioTestCase):
         cpu.memory.memory[address] = original_address_value
         cpu.accumulator.value = original_accumulator_value
         await cpu.execute_instruction()
-        values_divided = original_accumulator_value / original_address_value
+        values_divided = original_accumulator_value // original_address_value
         self.assertEqual(values_divided, cpu.accumulator.value)
 
     async def test_divide2(self):
@@ -253,7 +283,7 @@ class unitTests(IsolatedAsyncioTestCase):
         cpu.memory.memory[address] = original_address_value
         cpu.accumulator.value = original_accumulator_value
         await cpu.execute_instruction()
-        values_divided = original_accumulator_value / original_address_value
+        values_divided = original_accumulator_value // original_address_value
         self.assertEqual(values_divided, cpu.accumulator.value)
 
     async def test_multiply1(self):
@@ -399,4 +429,1078 @@ class unitTests(IsolatedAsyncioTestCase):
         memory.load_program([instruction])
         with self.assertRaises(ValueError) as context:
             await cpu.execute_instruction()
-        self.assertEqual(str(context.exception), f"Invalid address '{address}'. expected an address space less than 250")
\ No newline at end of file
+        self.assertEqual(str(context.exception), f"Invalid address '{address}'. expected an address space less than 250")
+
+    def test_cli_does_not_import_kivy(self):
+        code = "import sys, UVSim, input_handler, cpu, memory; print('kivy' in sys.modules)"
+        result = subprocess.run([sys.executable, "-c", code], cwd=src_dir, capture_output=True, text=True)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.strip(), "False")
+
+    async def test_divide_negative_truncates(self):
+        memory = Memory(250)
+        cpu = CPU(memory, CLIInputHandler(), output_callback=print)
+        memory.load_program(["032056"])
+        cpu.memory.memory[56] = 2
+        cpu.accumulator.value = -7
+        await cpu.execute_instruction()
+        self.assertEqual(cpu.accumulator.value, -3)
+        self.assertIsInstance(cpu.accumulator.value, int)
+
+    async def test_divide_by_zero(self):
+        memory = Memory(250)
+        cpu = CPU(memory, CLIInputHandler(), output_callback=print)
+        memory.load_program(["032056"])
+        cpu.accumulator.value = 10
+        with self.assertRaises(ValueError) as context:
+            await cpu.execute_instruction()
+        self.assertEqual(str(context.exception), "Cannot divide by zero")
+
+    def test_accumulator_overflow_wrap(self):
+        accumulator = Accumulator()
+        accumulator.value = 999999
+        accumulator.add(2)
+        self.assertEqual(accumulator.value, 1)
+        accumulator.value = -999999
+        accumulator.subtract(2)
+        self.assertEqual(accumulator.value, -1)
+
+    def test_accumulator_overflow_saturate(self):
+        accumulator = Accumulator("saturate")
+        accumulator.value = 5000
+        accumulator.multiply(5000)
+        self.assertEqual(accumulator.value, 999999)
+        accumulator.multiply(-1)
+        accumulator.subtract(10)
+        self.assertEqual(accumulator.value, -999999)
+
+    def test_accumulator_overflow_trap(self):
+        accumulator = Accumulator("trap")
+        accumulator.value = 999999
+        with self.assertRaises(OverflowError):
+            accumulator.add(1)
+        self.assertEqual(accumulator.value, 999999)
+
+    def test_invalid_overflow_policy(self):
+        with self.assertRaises(ValueError):
+            Accumulator("ignore")
+
+    async def test_read_fits_word(self):
+        memory = Memory(250)
+        cpu = CPU(memory, CLIInputHandler(), output_callback=print, overflow_policy="saturate")
+        memory.load_program(["010200"])
+        with patch('builtins.input', return_value="12345678"):
+            await cpu.execute_instruction()
+        self.assertEqual(memory.get_value(200), fit_word(12345678, "saturate"))
+
+    def test_run_program_outputs(self):
+        memory = Memory(250)
+        memory.load_program(self.load_program_from_file(Path(__file__).parent / "Test2.txt"))
+        result = run_program(memory, [3, 5])
+        self.assertEqual(result.outputs, [5])
+        self.assertEqual(result.steps, 7)
+        self.assertEqual(result.cycles, 35)
+        self.assertIsNone(result.error)
+
+    def test_run_program_step_budget(self):
+        memory = Memory(250)
+        memory.load_program(["+4000"])
+        result = run_program(memory, max_steps=10)
+        self.assertEqual(result.steps, 10)
+        self.assertEqual(result.error, "Step budget of 10 instructions exceeded")
+
+    def test_run_program_missing_input(self):
+        memory = Memory(250)
+        memory.load_program(["+1009", "+4300"])
+        result = run_program(memory)
+        self.assertEqual(result.error, "Program requested more input than was provided")
+
+    def test_result_cache_hit(self):
+        program = self.load_program_from_file(Path(__file__).parent / "Test2.txt")
+        cache = ResultCache()
+        first = Memory(250)
+        first.load_program(program)
+        second = Memory(250)
+        second.load_program(program)
+        self.assertEqual(make_key(first, [3, 5]), make_key(second, [3, 5]))
+        self.assertNotEqual(make_key(first, [3, 5]), make_key(first, [5, 3]))
+        result = cache.run(first, [3, 5])
+        with patch('result_cache.run_program') as mock_run:
+            self.assertEqual(cache.run(second, [3, 5]), result)
+            mock_run.assert_not_called()
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_result_cache_keys_and_copies(self):
+        memory = Memory(250)
+        memory.load_program(["+1009", "+1109", "+4300"])
+        self.assertNotEqual(make_key(memory, ["1 2"]), make_key(memory, ["1", "2"]))
+        self.assertEqual(make_key(memory, [7]), make_key(memory, ["7"]))
+        key = make_key(memory, [7])
+        cache = ResultCache()
+        result = cache.run(memory, [7])
+        result.outputs.append(99)
+        cached = cache.get(key)
+        self.assertEqual(cached.outputs, [7])
+        cached.outputs.clear()
+        self.assertEqual(cache.get(key).outputs, [7])
+
+    def test_result_cache_lru_eviction(self):
+        cache = ResultCache(max_entries=2)
+        memory = Memory(250)
+        memory.load_program(["+4300"])
+        result = run_program(memory)
+        cache.put("a", result)
+        cache.put("b", result)
+        cache.get("a")
+        cache.put("c", result)
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), result)
+
+    def test_result_cache_sqlite_tier(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "results.sqlite")
+            memory = Memory(250)
+            memory.load_program(["+4300"])
+            cache = ResultCache(path=path)
+            result = cache.run(memory)
+            cache.close()
+            reopened = ResultCache(path=path)
+            self.assertEqual(reopened.get(make_key(memory)), result)
+            reopened.close()
+
+    async def test_sim_server_run_and_stream(self):
+        pool = WorkerPool(size=1)
+        pool.start()
+        cache = ResultCache()
+        server = SimulationServer(pool, max_steps=50, cache=cache)
+        listener = await asyncio.start_server(server.handle_connection, "127.0.0.1", 0)
+        port = listener.sockets[0].getsockname()[1]
+
+        async def post(job):
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            body = json.dumps(job).encode()
+            writer.write(b"POST /run HTTP/1.1\r\nContent-Length: " + str(len(body)).encode() + b"\r\n\r\n" + body)
+            await writer.drain()
+            response = await reader.read()
+            writer.close()
+            head, _, payload = response.partition(b"\r\n\r\n")
+            return head.split(b"\r\n")[0], payload
+
+        try:
+            status, payload = await post({"program": ["+1007", "+1107", "+4300"], "inputs": [42]})
+            self.assertEqual(status, b"HTTP/1.1 200 OK")
+            self.assertEqual(json.loads(payload)["outputs"], [42])
+
+            status, payload = await post({"program": ["+4000"], "max_steps": 1000})
+            self.assertEqual(json.loads(payload)["error"], "Step budget of 50 instructions exceeded")
+
+            status, payload = await post({"program": ["+1101", "+1101", "+4300"], "stream": True})
+            lines = [json.loads(line) for line in payload.split(b"\r\n") if line.startswith(b"{")]
+            self.assertEqual(lines[:2], [{"output": 11001}, {"output": 11001}])
+            self.assertEqual(lines[2]["result"]["steps"], 3)
+
+            # Repeated jobs are answered from the cache, streamed ones included
+            self.assertEqual((cache.hits, len(cache)), (0, 3))
+            status, payload = await post({"program": ["+1007", "+1107", "+4300"], "inputs": [42]})
+            self.assertEqual(json.loads(payload)["outputs"], [42])
+            status, payload = await post({"program": ["+1101", "+1101", "+4300"], "stream": True})
+            lines = [json.loads(line) for line in payload.split(b"\r\n") if line.startswith(b"{")]
+            self.assertEqual(lines[:2], [{"output": 11001}, {"output": 11001}])
+            self.assertEqual(cache.hits, 2)
+
+            status, _ = await post({"inputs": []})
+            self.assertEqual(status, b"HTTP/1.1 400 Bad Request")
+
+            for length in (b"abc", b"-5"):
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                writer.write(b"POST /run HTTP/1.1\r\nContent-Length: " + length + b"\r\n\r\n")
+                await writer.drain()
+                response = await reader.read()
+                writer.close()
+                self.assertTrue(response.startswith(b"HTTP/1.1 400 Bad Request"), response)
+        finally:
+            listener.close()
+            await listener.wait_closed()
+            pool.close()
+
+    async def test_worker_pool_survives_client_errors(self):
+        pool = WorkerPool(size=1)
+        pool.start()
+        worker = pool._workers[0]
+        # Writes address 4 three times, then halts
+        program = ["+1104", "+1104", "+1104", "+4300", "+0007"]
+
+        async def disconnect(value):
+            raise ConnectionResetError("client went away")
+
+        try:
+            with self.assertRaises(ConnectionResetError):
+                await pool.run(program, on_output=disconnect)
+            result = await pool.run(["+1103", "+4300", "+0000", "+0009"])
+            self.assertEqual(result.outputs, [9])
+
+            started = asyncio.Event()
+
+            async def wait_forever(value):
+                started.set()
+                await asyncio.sleep(60)
+
+            task = asyncio.ensure_future(pool.run(program, on_output=wait_forever))
+            await started.wait()
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            result = await pool.run(["+1103", "+4300", "+0000", "+0005"])
+            self.assertEqual(result.outputs, [5])
+            self.assertEqual(pool._workers, [worker])
+            self.assertTrue(worker.process.is_alive())
+
+            worker.process.terminate()
+            await asyncio.get_running_loop().run_in_executor(None, worker.process.join)
+            with self.assertRaises(RuntimeError):
+                await pool.run(program)
+            result = await pool.run(["+1103", "+4300", "+0000", "+0006"])
+            self.assertEqual(result.outputs, [6])
+            self.assertNotEqual(pool._workers, [worker])
+        finally:
+            pool.close()
+
+    async def test_debugger_breakpoint_and_continue(self):
+        memory = Memory(250)
+        memory.load_program(self.load_program_from_file(Path(__file__).parent / "Test2.txt"))
+        cpu = CPU(memory, CLIInputHandler(), output_callback=lambda message: None)
+        debugger = Debugger(cpu)
+        debugger.add_breakpoint(2)
+        with patch.object(cpu.input_handler, 'get_input', AsyncMock(side_effect=["3", "5"])):
+            event = await debugger.continue_execution()
+        self.assertEqual((event.reason, event.program_counter), ("breakpoint", 2))
+        event = await debugger.step()
+        self.assertEqual((event.reason, cpu.accumulator.value), ("step", 3))
+        debugger.remove_breakpoint(2)
+        event = await debugger.continue_execution()
+        self.assertEqual(event.reason, "halt")
+        self.assertTrue(debugger.is_halted())
+
+    async def test_debugger_watchpoints(self):
+        memory = Memory(250)
+        memory.load_program(["+2009", "+2110", "+2110", "+4300"])
+        cpu = CPU(memory, CLIInputHandler(), output_callback=lambda message: None)
+        debugger = Debugger(cpu)
+        debugger.add_watchpoint(10, "write")
+        self.assertIsInstance(cpu.memory, WatchedMemory)
+        event = await debugger.continue_execution()
+        self.assertEqual((event.reason, event.address, event.program_counter), ("write", 10, 2))
+        debugger.remove_watchpoint(10)
+        self.assertIs(cpu.memory, memory)
+        debugger.add_watchpoint(9, "read")
+        cpu.program_counter = 0
+        event = await debugger.continue_execution()
+        self.assertEqual((event.reason, event.address), ("read", 9))
+        event = await debugger.continue_execution()
+        self.assertEqual(event.reason, "halt")
+
+    def test_debugger_invalid_address(self):
+        cpu = CPU(Memory(250), CLIInputHandler(), output_callback=print)
+        with self.assertRaises(ValueError):
+            Debugger(cpu).add_breakpoint(250)
+
+    async def test_time_travel_seek(self):
+        # Counts memory[20] down from 5 to 0, storing after every subtraction
+        memory = Memory(250)
+        memory.load_program(["+2020", "+3121", "+2120", "+4205", "+4000", "+4300"])
+        memory.set_value(20, 5)
+        memory.set_value(21, 1)
+        cpu = CPU(memory, CLIInputHandler(), output_callback=lambda message: None)
+        history = TimeTravel(cpu, checkpoint_interval=4)
+
+        def state():
+            return (list(memory.memory), cpu.accumulator.value, cpu.program_counter,
+                    cpu.instruction_count, cpu.cycles)
+
+        states = [state()]
+        while cpu.program_counter < memory.max_size:
+            await history.step()
+            states.append(state())
+        self.assertEqual(history.head, len(states) - 1)
+
+        for step in (len(states) - 2, 3, 0, 17, 9, 10, len(states) - 1, 1, 2, 24):
+            history.seek(step)
+            self.assertEqual(state(), states[step])
+        history.seek(1)
+        history.step_back()
+        self.assertEqual(history.position, 0)
+        with self.assertRaises(ValueError):
+            history.step_back()
+        for step in range(1, len(states)):
+            await history.step()
+            self.assertEqual(state(), states[step])
+
+    async def test_time_travel_bounded(self):
+        memory = Memory(250)
+        memory.load_program(["+2110", "+4000"])
+        cpu = CPU(memory, CLIInputHandler(), output_callback=lambda message: None)
+        history = TimeTravel(cpu, checkpoint_interval=8, max_records=32)
+        for _ in range(100):
+            await history.step()
+        self.assertLessEqual(history.head - history.earliest, 32)
+        history.seek(history.earliest)
+        self.assertEqual(cpu.program_counter, history.earliest % 2)
+        with self.assertRaises(ValueError):
+            history.seek(history.earliest - 1)
+
+    def test_memory_change_tracking(self):
+        memory = Memory(250)
+        view = memory.track_changes()
+        snapshot = memory.track_changes()
+        memory.load_program(["+2009", "+4300"])
+        memory.set_value(9, 12)
+        memory.set_value(9, 13)
+        self.assertEqual(view.take(), [0, 1, 9])
+        self.assertEqual(view.take(), [])
+        memory.set_value(40, 1)
+        self.assertEqual(snapshot.take(), [0, 1, 9, 40])
+        snapshot.close()
+        memory.set_value(41, 1)
+        self.assertEqual(len(snapshot), 0)
+        self.assertEqual(view.take(), [40, 41])
+
+    async def test_time_travel_marks_changes(self):
+        memory = Memory(250)
+        memory.load_program(["+1010", "+4300"])
+        cpu = CPU(memory, CLIInputHandler(), output_callback=lambda message: None)
+        history = TimeTravel(cpu)
+        changes = memory.track_changes()
+        with patch.object(cpu.input_handler, 'get_input', AsyncMock(return_value="7")):
+            await history.step()
+        history.step_back()
+        self.assertEqual(changes.take(), [10])
+        self.assertEqual(memory.get_value(10), 0)
+
+    async def test_time_travel_does_not_fire_ports(self):
+        memory = DeviceMemory(100, {99: OutputPort()})
+        memory.load_program(["+2010", "+2199", "+2011", "+2199", "+4300"])
+        memory.set_value(10, 4)
+        memory.set_value(11, 6)
+        cpu = CPU(memory, CLIInputHandler(), output_callback=lambda message: None)
+        history = TimeTravel(cpu, checkpoint_interval=2)
+        await history.run()
+        history.seek(0)
+        self.assertEqual(memory.memory[99], 0)
+        history.seek(history.head)
+        self.assertEqual(memory.memory[99], 6)
+        self.assertEqual(memory.ports[99].take(), [4, 6])
+
+    def test_scrollback_bounded(self):
+        buffer = ScrollbackBuffer(max_lines=3)
+        buffer.append("Program Loaded:\n+1007\n+4300\n")
+        buffer.append("Output: 5")
+        buffer.append("Output: 6")
+        self.assertEqual(len(buffer), 3)
+        self.assertEqual(buffer.total_lines, 5)
+        self.assertEqual(buffer.first_line_number, 2)
+        self.assertEqual(buffer.lines(), ["+4300", "Output: 5", "Output: 6"])
+        self.assertEqual(buffer.lines(4), ["Output: 6"])
+        self.assertEqual(buffer.search("output"), [3, 4])
+        self.assertEqual(buffer.search("output", case_sensitive=True), [])
+
+    def test_scrollback_spill(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "console.log")
+            buffer = ScrollbackBuffer(max_lines=2, spill_path=path)
+            for value in range(5):
+                buffer.append(f"Output: {value}\n")
+            buffer.close()
+            with open(path) as file:
+                self.assertEqual(file.read().splitlines(), [f"Output: {value}" for value in range(5)])
+
+    def test_file_io_round_trip(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "program.txt")
+            progress = []
+            write_text_file(path, "+1007\n+1107\n\n+4300\n", lambda done, total: progress.append((done, total)), chunk_size=4)
+            self.assertEqual(progress[-1], (19, 19))
+            progress.clear()
+            lines = read_program_file(path, lambda done, total: progress.append(done), chunk_size=8)
+            self.assertEqual(lines, ["+1007", "+1107", "", "+4300"])
+            self.assertEqual(progress, [8, 16, 19])
+            with self.assertRaises(ValueError):
+                Memory(250).load_program(lines)
+            write_text_file(path, "\n+1007\n+4300\n\n")
+            self.assertEqual(read_program_file(path), ["+1007", "+4300"])
+
+    def test_preview_text(self):
+        self.assertEqual(preview_text(["+1007", "+4300"], 5), ("+1007\n+4300", False))
+        self.assertEqual(preview_text(["+1007", "+1107", "+4300"], 2), ("+1007\n+1107", True))
+
+    def test_memory_patch_program(self):
+        memory = Memory(250)
+        memory.load_program(["+1007", "+1107", "+4300"])
+        changes = memory.track_changes()
+        changed = memory.patch_program(["+1007", "+1108", "+4300"])
+        self.assertEqual(changed, [1])
+        self.assertEqual(changes.take(), [1])
+        self.assertEqual(list(memory.memory[:3]), [10007, 11008, 43000])
+        self.assertEqual(memory.patch_program(["+1007", "+1108", "+4300"]), [])
+
+    def test_load_program_too_long(self):
+        memory = Memory(2)
+        with self.assertRaises(ValueError) as context:
+            memory.load_program(["+1007", "+1107", "+4300"])
+        self.assertEqual(str(context.exception), "Program has 3 instructions but memory only holds 2 words")
+        self.assertEqual(list(memory.memory), [0, 0])
+
+    def test_cpu_reset(self):
+        memory = Memory(250)
+        cpu = CPU(memory, CLIInputHandler(), output_callback=print)
+        cpu.accumulator.value = 5
+        cpu.program_counter = 9
+        cpu.instruction_register = 20009
+        cpu.reset()
+        self.assertEqual((cpu.accumulator.value, cpu.program_counter, cpu.instruction_register), (0, 0, None))
+
+    def test_control_flow_blocks_and_loops(self):
+        memory = Memory(250)
+        memory.load_program(["+2020", "+3121", "+2120", "+4205", "+4000", "+4300"])
+        flow = ControlFlow(memory.memory)
+        self.assertEqual(flow.blocks, [(0, 3), (4, 4), (5, 5)])
+        self.assertEqual(flow.loops, [(0, 4)])
+        self.assertEqual(flow.stack_of(2), ["loop@000-004", "block@000-003"])
+        self.assertEqual(flow.stack_of(5), ["block@005-005"])
+
+    async def test_sampling_profiler(self):
+        memory = Memory(250)
+        memory.load_program(["+2020", "+3121", "+2120", "+4205", "+4000", "+4300"])
+        memory.set_value(20, 50)
+        memory.set_value(21, 1)
+        cpu = CPU(memory, CLIInputHandler(), output_callback=lambda message: None)
+        profiler = SamplingProfiler(cpu, every=5)
+        await profiler.run()
+        profile = profiler.profile()
+        # 250 instructions run: every fifth is the loop's branch, except the final halt
+        self.assertEqual(profile.total, 50)
+        self.assertEqual(profile.collapsed(),
+                         "program;block@005-005 1\nprogram;loop@000-004;block@004-004 49\n")
+        speedscope = profile.speedscope()
+        self.assertEqual(speedscope["profiles"][0]["weights"], [1, 49])
+        self.assertEqual([frame["name"] for frame in speedscope["shared"]["frames"]],
+                         ["program", "block@005-005", "loop@000-004", "block@004-004"])
+        listing = profile.heat_listing(["+2020", "+3121", "+2120", "+4205", "+4000", "+4300"]).splitlines()
+        self.assertEqual(len(listing), 6)
+        self.assertTrue(listing[4].startswith("004  +4000          49   98.0%"))
+
+    async def test_cpu_counts_cycles(self):
+        memory = Memory(250)
+        memory.load_program(["+2009", "+3309", "+3209", "+4300"])
+        memory.set_value(9, 3)
+        cpu = CPU(memory, CLIInputHandler(), output_callback=lambda message: None, cycle_costs={"MULTIPLY": 50, 43: 0})
+        while cpu.program_counter < memory.max_size:
+            await cpu.execute_instruction()
+        self.assertEqual(cpu.instruction_count, 4)
+        self.assertEqual(cpu.cycles, 1 + 50 + 20 + 0)
+        cpu.reset()
+        self.assertEqual((cpu.instruction_count, cpu.cycles), (0, 0))
+
+    async def test_invalid_instruction_not_counted(self):
+        memory = Memory(250)
+        cpu = CPU(memory, CLIInputHandler(), output_callback=print)
+        memory.load_program(["052232"])
+        with self.assertRaises(ValueError):
+            await cpu.execute_instruction()
+        self.assertEqual((cpu.instruction_count, cpu.cycles), (0, 0))
+
+    def test_build_cost_table_invalid(self):
+        with self.assertRaises(ValueError):
+            build_cost_table({"JUMP": 1})
+        with self.assertRaises(ValueError):
+            build_cost_table({10: -1})
+
+    async def test_cycle_report(self):
+        memory = Memory(250)
+        memory.load_program(["+2020", "+3121", "+2120", "+4205", "+4000", "+4300"])
+        memory.set_value(20, 3)
+        memory.set_value(21, 1)
+        cpu = CPU(memory, CLIInputHandler(), output_callback=lambda message: None)
+        report = CycleReport(cpu)
+        await report.run()
+        self.assertEqual(report.by_opcode()["SUBTRACT"], {"instructions": 3, "cycles": 3})
+        self.assertEqual(report.by_opcode()["BRANCHZERO"], {"instructions": 3, "cycles": 6})
+        self.assertEqual(report.by_pc()[4], {"instructions": 2, "cycles": 4})
+        self.assertEqual(sum(counts["cycles"] for counts in report.by_pc().values()), cpu.cycles)
+        self.assertTrue(report.format().startswith(f"{cpu.instruction_count} instructions, {cpu.cycles} cycles"))
+
+    async def test_cycle_report_includes_sync_opcodes(self):
+        memory = SharedWordMemory(250)
+        try:
+            memory.load_program(["+5199", "+5098", "+5299", "+4300"])
+            cpu = SharedCPU(memory, ScriptedInputHandler(()))
+            report = CycleReport(cpu, SYNC_OPCODE_NAMES)
+            await report.run()
+            summary = report.by_opcode()
+            self.assertEqual(summary["LOCK"], {"instructions": 1, "cycles": 4})
+            self.assertEqual(summary["FETCHADD"], {"instructions": 1, "cycles": 4})
+            self.assertEqual(sum(counts["cycles"] for counts in summary.values()), cpu.cycles)
+        finally:
+            memory.close()
+
+    def test_tracing_disabled_by_default(self):
+        self.assertIsNone(tracing._tracer)
+        self.assertIs(tracing.span("a"), tracing.span("b"))
+        memory = Memory(250)
+        memory.load_program(["+4300"])
+        self.assertIsNone(tracing.disable())
+
+    async def test_tracing_records_spans(self):
+        tracer = tracing.enable()
+        try:
+            memory = Memory(250)
+            memory.load_program(["+1009", "+1109", "+4300"])
+            cpu = CPU(memory, ScriptedInputHandler([7]), output_callback=lambda message: None)
+            while cpu.program_counter < memory.max_size:
+                await cpu.execute_instruction()
+        finally:
+            self.assertIs(tracing.disable(), tracer)
+        names = [event["name"] for event in tracer.events]
+        self.assertEqual(names, ["Memory.load_program", "READ wait"])
+        event = tracer.events[1]
+        self.assertEqual((event["ph"], event["args"]), ("X", {"address": 9}))
+        self.assertGreaterEqual(event["dur"], 0)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "trace.json")
+            tracer.save(path)
+            with open(path) as file:
+                self.assertEqual(len(json.load(file)["traceEvents"]), 2)
+
+    def test_tracing_event_limit_and_errors(self):
+        tracer = tracing.enable(max_events=1)
+        try:
+            with self.assertRaises(ValueError):
+                Memory(250).load_program(["+12"])
+            Memory(250).load_program(["+4300"])
+        finally:
+            tracing.disable()
+        self.assertEqual(len(tracer.events), 1)
+        self.assertIn("error", tracer.events[0]["args"])
+        self.assertEqual(tracer.to_json()["otherData"]["dropped_events"], 1)
+
+    @staticmethod
+    def shared_counter_program(body, iterations):
+        # Two CPUs, at 0 and 20, each run `body` then count down their own word at 40 or 41.
+        program = ["+0000"] * 100
+        for base, countdown in ((0, 40), (20, 41)):
+            code = body + [f"+20{countdown}", "+3199", f"+21{countdown}", f"+42{base + len(body) + 5:02}",
+                           f"+40{base:02}", "+4300"]
+            program[base:base + len(code)] = code
+            program[countdown] = f"+{iterations:04}"
+        program[98] = "+0001"
+        program[99] = "+0001"
+        return program
+
+    def test_run_parallel_fetch_add(self):
+        program = self.shared_counter_program(["+2098", "+5097"], 90)
+        results, words = run_parallel(program, [0, 20], max_steps=10000)
+        self.assertEqual(words[97], 180)
+        self.assertEqual([result.error for result in results], [None, None])
+        self.assertEqual([result.steps for result in results], [90 * 7, 90 * 7])
+        self.assertEqual(results[0].cycles, 90 * (1 + 4 + 1 + 1 + 1 + 2 + 2) - 2 + 1)
+
+    def test_run_parallel_lock(self):
+        program = self.shared_counter_program(["+5196", "+2097", "+3098", "+2197", "+5296"], 60)
+        results, words = run_parallel(program, [0, 20], max_steps=100000)
+        self.assertEqual(words[97], 120)
+        self.assertEqual(words[96], 0)
+        self.assertEqual([result.error for result in results], [None, None])
+
+    def test_run_parallel_halt_holding_lock(self):
+        # The CPU at 0 halts while holding the lock at 99; the CPU at 2 needs it to finish
+        program = ["+5199", "+4300", "+5199", "+5299", "+4300"]
+        results, words = run_parallel(program, [0, 2])
+        self.assertEqual(results[0].error, "Program halted while holding the lock at address 99")
+        self.assertIsNone(results[1].error)
+        self.assertEqual(words[99], 0)
+
+    def test_parallel_reentrant_lock_fails(self):
+        results, words = run_parallel(["+5199", "+5199", "+5299", "+4300"], [0])
+        self.assertEqual(results[0].error, "Re-entrant lock: the lock at address 99 is already held by this CPU")
+        self.assertEqual(words[99], 0)
+
+    def test_shared_word_memory_attach(self):
+        memory = SharedWordMemory(250)
+        try:
+            memory.load_program(["+2001", "-0005"])
+            other = SharedWordMemory(250, name=memory.name, lock=memory.lock)
+            self.assertEqual(other.get_value(1), -5)
+            other.set_value(2, 7)
+            self.assertEqual(memory.fetch_add(2, 5, Accumulator().fit), 7)
+            self.assertEqual(other.get_value(2), 12)
+            self.assertEqual(other.test_and_set(3), 0)
+            self.assertEqual(memory.test_and_set(3), 1)
+            other.close()
+        finally:
+            memory.close()
+        with self.assertRaises(ValueError):
+            SharedWordMemory(250, name="missing")
+
+    async def test_session_round_trip(self):
+        memory = Memory(250)
+        memory.load_program(["+1020", "+2020", "+3320", "+1120", "+4300"])
+        cpu = CPU(memory, ScriptedInputHandler([12]), output_callback=lambda message: None,
+                  overflow_policy="saturate", cycle_costs={"READ": 3})
+        await cpu.execute_instruction()
+        await cpu.execute_instruction()
+        blob = save_session(cpu)
+        self.assertLess(len(blob), 128)
+        outputs = []
+        restored = load_session(blob, ScriptedInputHandler(()), outputs.append)
+        self.assertEqual(list(restored.memory.memory), list(memory.memory))
+        self.assertEqual((restored.accumulator.value, restored.program_counter, restored.instruction_register,
+                          restored.instruction_count, restored.cycles, restored.accumulator.overflow_policy),
+                         (12, 2, 20020, 2, 4, "saturate"))
+        self.assertEqual(restored.cycle_costs, cpu.cycle_costs)
+        while restored.program_counter < restored.memory.max_size:
+            await restored.execute_instruction()
+        self.assertEqual((outputs, restored.accumulator.value), (["Output: 12", "Program finished"], 144))
+
+    def test_session_load_rejects_other_data(self):
+        with self.assertRaises(ValueError):
+            load_session(b"not a session", ScriptedInputHandler(()))
+        fresh = load_session(save_session(CPU(Memory(10), ScriptedInputHandler(()))), ScriptedInputHandler(()))
+        self.assertIsNone(fresh.instruction_register)
+        self.assertIs(fresh.cycle_costs, build_cost_table())
+
+    def test_session_footprint_target(self):
+        self.assertLess(session_footprint(200), SESSION_BYTES_TARGET)
+        with self.assertRaises(AttributeError):
+            CPU(Memory(10), ScriptedInputHandler(())).scratch = 1
+
+    def test_simulator_reset_in_place(self):
+        simulator = Simulator(250)
+        storage = simulator.memory.memory
+        simulator.load(["+1009", "+2009", "+3009", "+2109", "+1109", "+4300"])
+        first = simulator.run([21])
+        self.assertEqual((first.outputs, first.error), ([42], None))
+        simulator.reset()
+        self.assertIs(simulator.memory.memory, storage)
+        self.assertEqual(list(storage), [0] * 250)
+        self.assertEqual((simulator.cpu.program_counter, simulator.cpu.accumulator.value, simulator.cpu.cycles), (0, 0, 0))
+        self.assertEqual(first.outputs, [42])
+        simulator.close()
+
+    def test_simulator_pool_reuses_instances(self):
+        program = ["+1009", "+1109", "+4300"]
+        pool = SimulatorPool(max_idle=1)
+        memory = Memory(250)
+        memory.load_program(program)
+        expected = run_program(memory, [5])
+        for value in (5, 5, 5):
+            self.assertEqual(pool.run(program, [value]), expected)
+        self.assertEqual((pool.created, len(pool)), (1, 1))
+        with pool.checkout() as first, pool.checkout() as second:
+            self.assertIsNot(first, second)
+        self.assertEqual((pool.created, len(pool)), (2, 1))
+        with self.assertRaises(ValueError):
+            pool.run(["+12"])
+        self.assertEqual(pool.run(["+1009", "+4300"]).error, "Program requested more input than was provided")
+        pool.close()
+        self.assertEqual(len(pool), 0)
+
+    async def test_run_events(self):
+        memory = Memory(250)
+        memory.load_program(["+1009", "+2009", "+3009", "+2109", "+1109", "+4300"])
+        cpu = EventCPU(memory)
+        events = []
+        async for event in cpu.run_events():
+            events.append(event)
+            if isinstance(event, InputRequest):
+                event.provide(21)
+        self.assertEqual(events[1:], [OutputEvent(9, 42), HaltEvent(6, 10 + 1 + 1 + 1 + 10 + 1)])
+        self.assertEqual(events[0].to_dict(), {"type": "input", "address": 9})
+
+    async def test_run_events_off_the_end_of_memory(self):
+        memory = Memory(3)
+        memory.load_program(["+2001", "+2001", "+2001"])
+        cpu = EventCPU(memory)
+        events = [event async for event in cpu.run_events()]
+        self.assertEqual(events, [HaltEvent(3, 3, halted=False)])
+        self.assertFalse(cpu.stopped_at_halt())
+        memory.load_program(["+4300"])
+        cpu = EventCPU(memory)
+        self.assertTrue((await cpu.run_events().__anext__()).halted)
+
+    async def test_debugging_an_event_cpu(self):
+        memory = Memory(250)
+        memory.load_program(["+1009", "+2009", "+3009", "+2109", "+1109", "+4300"])
+        cpu = EventCPU(memory)
+        cpu.input_handler = ScriptedInputHandler([4])
+        debugger = Debugger(cpu)
+        debugger.add_breakpoint(4)
+        self.assertEqual((await debugger.step()).reason, "step")
+        self.assertIsNone(cpu.take_event())
+        event = await debugger.continue_execution()
+        self.assertEqual((event.reason, event.program_counter), ("breakpoint", 4))
+        await debugger.step()
+        self.assertEqual(cpu.take_event(), OutputEvent(9, 8))
+        self.assertIsNone(cpu.take_event())
+
+    async def test_run_events_input_from_another_task(self):
+        memory = Memory(250)
+        memory.load_program(["+1009", "+1109", "+4300"])
+        cpu = EventCPU(memory)
+        events = cpu.run_events()
+        request = await events.__anext__()
+        asyncio.get_running_loop().call_later(0.01, request.provide, "-7")
+        self.assertEqual(await events.__anext__(), OutputEvent(9, -7))
+        self.assertIsInstance(await events.__anext__(), HaltEvent)
+
+    async def test_run_events_errors(self):
+        memory = Memory(250)
+        memory.load_program(["+4000"])
+        events = [event async for event in EventCPU(memory).run_events(max_steps=5)]
+        self.assertEqual(events, [ErrorEvent("Step budget of 5 instructions exceeded", 0)])
+        memory.load_program(["+1009"])
+        cpu = EventCPU(memory)
+        events = cpu.run_events()
+        (await events.__anext__()).provide("abc")
+        error = await events.__anext__()
+        self.assertEqual(error.to_dict(), {"type": "error", "message": "Invalid input 'abc', expected an integer.", "program_counter": 0})
+
+    def test_cli_ndjson_results(self):
+        with tempfile.TemporaryDirectory() as directory:
+            good = os.path.join(directory, "good.txt")
+            looping = os.path.join(directory, "looping.txt")
+            with open(good, "w") as file:
+                file.write("+1009\n+2009\n+3009\n+2109\n+1109\n+4300\n")
+            with open(looping, "w") as file:
+                file.write("+4000\n")
+            for options in (["--engine", "batch"], ["--engine", "events"], ["--trace-memory"]):
+                completed = subprocess.run(
+                    [sys.executable, os.path.join(src_dir, "UVSim.py"), good, looping,
+                     "--inputs", "21", "--max-steps", "50"] + options,
+                    capture_output=True, text=True, timeout=60)
+                self.assertEqual(completed.returncode, 1)
+                first, second = [json.loads(line) for line in completed.stdout.splitlines()]
+                self.assertEqual((first["program"], first["outputs"], first["steps"], first["error"]), (good, [42], 6, None))
+                self.assertGreaterEqual(first["wall_time"], 0)
+                self.assertGreater(first["peak_memory"], 0)
+                self.assertEqual(second["error"], "Step budget of 50 instructions exceeded")
+
+            cache_path = os.path.join(directory, "results.sqlite")
+            for expected in (False, True):
+                completed = subprocess.run(
+                    [sys.executable, os.path.join(src_dir, "UVSim.py"), good, "--inputs", "21", "--cache", cache_path],
+                    capture_output=True, text=True, timeout=60)
+                record = json.loads(completed.stdout)
+                self.assertEqual((record["outputs"], record["cached"]), ([42], expected))
+
+    def test_golden_corpus(self):
+        golden_dir = os.path.join(current_dir, "golden")
+        results = run_corpus(golden_dir, workers=2, use_cache=False)
+        self.assertTrue(results)
+        self.assertEqual([result["problems"] for result in results if result["status"] != "pass"], [])
+        for engine in ("events", "simulator"):
+            differences = run_corpus(golden_dir, diff_engine=engine, workers=1, use_cache=False)
+            self.assertEqual({result["status"] for result in differences}, {"pass"})
+
+    def test_golden_corpus_cache_and_failures(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for name in ("echo.txt", "echo.json", "square.txt", "square.json"):
+                shutil.copy(os.path.join(current_dir, "golden", name), directory)
+            self.assertEqual([result["status"] for result in run_corpus(directory, workers=1)], ["pass", "pass"])
+            self.assertEqual([result["status"] for result in run_corpus(directory, workers=1)], ["cached", "cached"])
+            with open(os.path.join(directory, "square.json"), "w") as file:
+                json.dump({"inputs": [3], "outputs": [10], "memory": {"21": 9}}, file)
+            results = run_corpus(directory, workers=1)
+            self.assertEqual([result["status"] for result in results], ["cached", "fail"])
+            self.assertEqual(results[1]["problems"], ["outputs: expected [10], got [9]"])
+            self.assertEqual(run_corpus(directory, workers=1)[1]["status"], "fail")
+            self.assertEqual(run_corpus(directory, workers=1, memory_size=5)[0]["status"], "fail")
+            # A blank line between instructions fails to load, as it does in the CLI
+            with open(os.path.join(directory, "gap.txt"), "w") as file:
+                file.write("+1009\n\n+1109\n+4300\n")
+            shutil.copy(os.path.join(current_dir, "golden", "echo.json"), os.path.join(directory, "gap.json"))
+            gap = run_corpus(directory, workers=1)[1]
+            self.assertEqual((gap["name"], gap["status"]), ("gap", "fail"))
+            self.assertIn("error: expected None, got 'Program instructions must all be the same length'", gap["problems"])
+
+    def test_fuzzer_engines_agree(self):
+        case = generate_case(random.Random(7))
+        self.assertEqual(len(case.words), 100)
+        self.assertEqual(find_differences(case, ["events", "simulator"]), {})
+        self.assertEqual(fuzz(400, ["events", "simulator"], seed=1000, workers=2, max_steps=500), [])
+
+    def test_fuzzer_shrinks_divergence(self):
+        def negative_outputs_lost(program, inputs, max_steps, memory_size):
+            result, words = golden_corpus.ENGINES["cpu"](program, inputs, max_steps, memory_size)
+            result.outputs = [value for value in result.outputs if value >= 0]
+            return result, words
+
+        with patch.dict(golden_corpus.ENGINES, {"buggy": negative_outputs_lost}):
+            case = FuzzCase([10050, 20050, 30051, 11052, 11050, 43000] + [0] * 44 + [0, 3, -4] + [0] * 47, [-9, 5])
+            self.assertIn("buggy", find_differences(case, ["buggy"]))
+            small = shrink(case, ["buggy"])
+            self.assertTrue(find_differences(small, ["buggy"]))
+            self.assertEqual(small.inputs, [-9])
+            self.assertLessEqual(len(small.program()), 5)
+            self.assertTrue(all(word in (0, 43000) for word in small.words[5:]))
+
+    async def test_instruction_coverage(self):
+        # Reads n; if negative writes it, otherwise counts down to zero
+        program = ["+1020", "+2020", "+4106", "+4208", "+3121", "+4002", "+1120", "+4300", "+4300"]
+        coverages = []
+        for value in (2, -1):
+            memory = Memory(250)
+            memory.load_program(program)
+            memory.set_value(21, 1)
+            cpu = CPU(memory, ScriptedInputHandler([value]), output_callback=lambda message: None)
+            coverages.append(await run_with_coverage(cpu))
+        positive, negative = coverages
+        self.assertEqual(positive.executed_addresses(), [0, 1, 2, 3, 4, 5, 8])
+        self.assertEqual((positive.branch_directions(2), positive.branch_directions(3)), ((False, True), (True, True)))
+        self.assertEqual(negative.executed_addresses(), [0, 1, 2, 6, 7])
+
+        merged = Coverage.from_bytes(positive.to_bytes())
+        merged.merge(negative)
+        self.assertEqual(merged.executed_addresses(), [0, 1, 2, 3, 4, 5, 6, 7, 8])
+        self.assertEqual(merged.summary(memory.memory), {"instructions": 9, "executed": 9,
+                                                         "branch_directions": 4, "branch_directions_taken": 4})
+        report = positive.report(memory.memory, program).splitlines()
+        self.assertEqual(report[0], "7/9 instructions, 3/4 branch directions")
+        self.assertEqual(report[3], "002  +4106    x  -F")
+        self.assertEqual(report[7], "006  +1120    .")
+        with self.assertRaises(ValueError):
+            merged.merge(Coverage(100))
+
+    async def test_instruction_coverage_on_error(self):
+        memory = Memory(250)
+        memory.load_program(["+2009", "+3209", "+4300"])
+        cpu = CPU(memory, ScriptedInputHandler(()), output_callback=lambda message: None)
+        coverage = Coverage(250)
+        with self.assertRaises(ValueError):
+            await run_with_coverage(cpu, coverage)
+        self.assertEqual(coverage.executed_addresses(), [0, 1])
+        memory.load_program(["+4000"])
+        cpu.reset()
+        with self.assertRaises(RuntimeError):
+            await run_with_coverage(cpu, Coverage(250), max_steps=3)
+
+    def test_session_record_and_replay(self):
+        recorder = SessionRecorder(100)
+        recorder.record_input("1")
+        recorder.record_load(["+99999"])
+        recorder.record_load(["+1009", "+1109", "+4300"])
+        recorder.record_run()
+        recorder.record_input("5")
+        recorder.record_load(["+1009", "+2009", "+3009", "+2109", "+1109", "+4300"])
+        recorder.record_run()
+        recorder.record_input("7")
+        recorder.record_run()
+        data = recorder.to_bytes()
+        self.assertLess(len(data), 200)
+
+        session = load_log(data)
+        self.assertEqual(session.memory_size, 100)
+        self.assertEqual([event[1:] for event in session.events], [event[1:] for event in recorder.events])
+        runs = replay(session)
+        self.assertEqual([run["outputs"] for run in runs], [[5], [14], []])
+        self.assertEqual([run["steps"] for run in runs], [3, 6, 0])
+        self.assertEqual(runs[2]["error"], "Program requested more input than was provided")
+        self.assertTrue(all(run["wall_time"] >= 0 for run in runs))
+        with self.assertRaises(ValueError):
+            load_log(b"UVSS" + data[4:])
+
+    def test_session_replay_step_budget(self):
+        recorder = SessionRecorder(100)
+        recorder.record_load(["+4000"])
+        recorder.record_run()
+        recorder.record_run()
+        runs = replay(load_log(recorder.to_bytes()), max_steps=10)
+        self.assertEqual([run["steps"] for run in runs], [10, 10])
+        self.assertIn("Step budget", runs[1]["error"])
+        self.assertEqual(replay(recorder)[0]["steps"], DEFAULT_MAX_STEPS)
+
+    def test_session_replay_flags_overlapping_runs(self):
+        recorder = SessionRecorder(100)
+        recorder.record_load(["+1009", "+1109", "+4300"])
+        recorder.record_run()
+        recorder.record_input("5")
+        recorder.record_done()
+        recorder.record_run()
+        recorder.record_load(["+1009", "+1109", "+4300"])
+        recorder.record_run()
+        recorder.record_input("6")
+        recorder.record_done()
+        recorder.record_done()
+        recorder.record_run()
+        recorder.record_input("7")
+        recorder.record_done()
+        runs = replay(load_log(recorder.to_bytes()))
+        self.assertEqual([run["overlapped"] for run in runs], [False, True, True, False])
+        self.assertEqual([run["outputs"] for run in runs], [[5], [], [6], [7]])
+
+    def test_session_replay_debugger_runs(self):
+        recorder = SessionRecorder(100)
+        recorder.record_load(["+1009", "+1109", "+4300"])
+        recorder.record_debug(True)
+        recorder.record_input("5")
+        recorder.record_done(1)
+        recorder.record_debug(False)
+        recorder.record_done(1)
+        recorder.record_run()
+        recorder.record_input("6")
+        recorder.record_done()
+        recorder.record_debug(True)
+        recorder.record_input("x")
+        recorder.record_done(1)
+        recorder.record_debug(False)
+        runs = replay(load_log(recorder.to_bytes()))
+        self.assertEqual([run["kind"] for run in runs], ["debug", "debug", "run", "debug", "debug"])
+        self.assertEqual([run["outputs"] for run in runs], [[], [5], [6], [], []])
+        self.assertEqual([run["steps"] for run in runs], [1, 1, 3, 0, 0])
+        self.assertEqual(runs[3]["error"], "Invalid input 'x', expected an integer.")
+        self.assertEqual(runs[4]["error"], "Program requested more input than was provided")
+        self.assertFalse(any(run["overlapped"] for run in runs))
+
+    def test_device_ports_stream(self):
+        # Reads values from port 98 until a negative one, storing running totals to port 99
+        program = ["+2098", "+4106", "+3050", "+2150", "+2199", "+4000", "+4300"]
+        batches = [[4, 5, 6], [7]]
+        drained = []
+        memory = DeviceMemory(100, {98: InputPort([1, 2, 3], refill=lambda: batches.pop(0) if batches else [],
+                                                  end_value=-1),
+                                    99: OutputPort(drain=drained.append, capacity=3)})
+        memory.load_program(program)
+        result = run_program(memory)
+        self.assertIsNone(result.error)
+        self.assertEqual(result.outputs, [])
+        memory.flush()
+        self.assertEqual(drained, [[1, 3, 6], [10, 15, 21], [28]])
+        self.assertEqual(memory.ports[98].count, 7)
+        self.assertEqual((memory.get_value(50), memory.memory[98], memory.memory[99]), (28, -1, 28))
+
+    def test_device_ports_errors(self):
+        memory = DeviceMemory(100, {98: InputPort(), 99: OutputPort(capacity=2)})
+        memory.load_program(["+2198", "+4300"])
+        self.assertEqual(run_program(memory).error, "Cannot write to input port at address 98")
+        memory.load_program(["+2099", "+4300"])
+        self.assertEqual(run_program(memory).error, "Cannot read from output port at address 99")
+        memory.load_program(["+2098", "+4300"])
+        self.assertEqual(run_program(memory).error, "Input port is empty")
+        memory.load_program(["+2199", "+2199", "+2199", "+4300"])
+        self.assertEqual(run_program(memory).error, "Output port is full")
+        self.assertEqual(memory.ports[99].take(), [0, 0])
+        with self.assertRaises(ValueError):
+            InputPort([1000000])
+        with self.assertRaises(ValueError):
+            DeviceMemory(100, {100: InputPort()})
+
+    async def test_device_ports_are_not_touched_by_instruction_fetch(self):
+        # Branches into the input port's address, which branches into the output port's
+        for engine in ("batch", "events"):
+            memory = DeviceMemory(4, {2: InputPort([7]), 3: OutputPort()})
+            memory.load_program(["+4002", "+4300", "+4003", "+4300"])
+            if engine == "batch":
+                result = await asyncio.to_thread(run_program, memory)
+            else:
+                result = await run_scripted(memory)
+            self.assertEqual((result.error, result.steps), (None, 3))
+            self.assertEqual((list(memory.ports[2].buffer), memory.ports[3].count), ([7], 0))
+
+    async def test_concurrent_runner_overlaps_input_waits(self):
+        waiting = [0, 0]
+
+        class SlowInput(InputHandler):
+            async def get_input(self):
+                waiting[0] += 1
+                waiting[1] = max(waiting)
+                await asyncio.sleep(0.05)
+                waiting[0] -= 1
+                return "4"
+
+        # Reads two values and writes their sum
+        program = ["+1020", "+1021", "+2020", "+3021", "+2122", "+1122", "+4300"]
+        jobs = [ProgramJob(f"job{number}", program, SlowInput()) for number in range(6)]
+        finished = []
+        records = await run_concurrently(jobs, concurrency=6, on_result=finished.append)
+        self.assertEqual([record["program"] for record in records], [f"job{number}" for number in range(6)])
+        self.assertEqual({record["outputs"][0] for record in records}, {8})
+        self.assertEqual(waiting[1], 6)
+        self.assertEqual(len(finished), 6)
+        self.assertTrue(all(record["reads"] == 2 and record["input_wait"] >= 0.09 for record in records))
+
+        waiting[1] = 0
+        records = await run_concurrently(jobs[:4], concurrency=2)
+        self.assertEqual(waiting[1], 2)
+        self.assertGreater(max(record["queue_wait"] for record in records), 0.09)
+        with self.assertRaises(ValueError):
+            await run_concurrently(jobs, concurrency=0)
+
+    async def test_concurrent_runner_streams_and_errors(self):
+        reader = asyncio.StreamReader()
+        reader.feed_data(b"5\n")
+        reader.feed_eof()
+        jobs = [ProgramJob("echo", ["+1009", "+1109", "+1009", "+4300"], StreamInputHandler(reader)),
+                ProgramJob("loop", ["+4000"], ScriptedInputHandler(()), max_steps=2500),
+                ProgramJob("bad", ["+99999"], ScriptedInputHandler(()))]
+        echo, loop, bad = await run_concurrently(jobs)
+        self.assertEqual(echo["outputs"], [5])
+        self.assertEqual(echo["error"], "Input stream ended before the program finished reading")
+        self.assertEqual((loop["steps"], loop["error"]), (2500, "Step budget of 2500 instructions exceeded"))
+        self.assertEqual(bad["steps"], 0)
+        self.assertIsNotNone(bad["error"])
+
+    async def test_concurrent_runner_reads_fifos_without_threads(self):
+        if not hasattr(os, "mkfifo"):
+            self.skipTest("FIFOs need a POSIX system")
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=2))
+        with tempfile.TemporaryDirectory() as directory:
+            paths = [os.path.join(directory, f"{number}.in") for number in range(6)]
+            for path in paths:
+                os.mkfifo(path)
+
+            def write_all():
+                # Last FIFO first, so readers waiting on executor threads for the first ones would deadlock
+                for number in reversed(range(6)):
+                    with open(paths[number], "w") as file:
+                        file.write(f"{number}\n")
+
+            writer = threading.Thread(target=write_all, daemon=True)
+            writer.start()
+            jobs = [ProgramJob(path, ["+1009", "+1109", "+4300"], FileInputHandler(path)) for path in paths]
+            records = await asyncio.wait_for(run_concurrently(jobs), 10)
+            writer.join(10)
+            self.assertEqual([record["outputs"] for record in records], [[number] for number in range(6)])
+
+            # A FIFO nobody writes to is closed when its job is cancelled
+            silent = FileInputHandler(os.path.join(directory, "silent.in"))
+            os.mkfifo(silent.path)
+            task = asyncio.ensure_future(run_concurrently([ProgramJob("silent", ["+1009", "+4300"], silent, 10)]))
+            await asyncio.sleep(0.05)
+            self.assertIsNotNone(silent._transport)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            self.assertIsNone(silent._transport)
+
+    def test_cli_concurrent_input_files(self):
+        with tempfile.TemporaryDirectory() as directory:
+            program = os.path.join(directory, "sum.txt")
+            with open(program, "w") as file:
+                file.write("+1020\n+1021\n+2020\n+3021\n+2122\n+1122\n+4300\n")
+            with open(program + ".in", "w") as file:
+                file.write("3\n9\n")
+            completed = subprocess.run(
+                [sys.executable, os.path.join(src_dir, "UVSim.py"), program, os.path.join(directory, "missing.txt"),
+                 "--input-files"], capture_output=True, text=True, timeout=60)
+            self.assertEqual(completed.returncode, 1, completed.stderr)
+            records = {record["program"]: record for record in map(json.loads, completed.stdout.splitlines())}
+            self.assertEqual(records[program]["outputs"], [12])
+            self.assertEqual(records[program]["reads"], 2)
+            self.assertIsNotNone(records[os.path.join(directory, "missing.txt")]["error"])
+            self.assertEqual(set(records[program]), set(records[os.path.join(directory, "missing.txt")]))
+            self.assertGreater(records[program]["peak_memory"], 0)
+            for options in (["--engine", "events"], ["--trace-memory"], ["--inputs", "3"]):
+                completed = subprocess.run(
+                    [sys.executable, os.path.join(src_dir, "UVSim.py"), program, "--input-files"] + options,
+                    capture_output=True, text=True, timeout=60)
+                self.assertEqual(completed.returncode, 2)
+                self.assertIn("cannot be used with", completed.stderr)